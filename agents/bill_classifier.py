@@ -0,0 +1,309 @@
+"""
+Tiered bill classifier that answers obvious routing decisions without an LLM
+
+Tier 1 is a keyword and company-name index matched in a single pass with an
+Aho-Corasick automaton. Tier 2 is a TF-IDF plus softmax-regression model
+trained on labeled bills (seed examples and stored negotiations). When both
+abstain the orchestrator falls back to the LLM router.
+"""
+
+import json
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter, defaultdict, deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BILL_TYPES = ("UTILITY", "MEDICAL", "SUBSCRIPTION", "TELECOM")
+
+SEED_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bill_examples.jsonl")
+
+# Weights: 3 = company names and unambiguous terms, 2 = strong hints, 1 = weak hints
+KEYWORDS = {
+    "UTILITY": {
+        "electric": 2, "electricity": 3, "kwh": 3, "kilowatt": 3, "therms": 3, "natural gas": 3,
+        "gas service": 3, "water": 1, "sewer": 3, "wastewater": 3, "waste management": 3, "trash": 2,
+        "meter reading": 3, "meter number": 3, "utility": 2, "utilities": 2, "power": 1, "energy": 1,
+        "pg&e": 3, "con edison": 3, "duke energy": 3, "xcel energy": 3, "dominion energy": 3,
+        "national grid": 3, "southern california edison": 3, "georgia power": 3, "fpl": 3,
+        "consumers energy": 3, "ameren": 3, "entergy": 3, "peco": 3
+    },
+    "MEDICAL": {
+        "hospital": 2, "patient": 2, "medical": 2, "medical center": 3, "physician": 3, "doctor": 2,
+        "copay": 3, "co-pay": 3, "deductible": 1, "cpt": 3, "icd-10": 3, "emergency room": 3,
+        "radiology": 3, "laboratory": 2, "lab work": 3, "explanation of benefits": 3, "clinic": 2,
+        "dental": 3, "dds": 3, "urgent care": 3, "anesthesia": 3, "surgery": 3, "pharmacy": 2,
+        "date of service": 2, "health": 1, "healthcare": 2, "mri": 3, "x-ray": 3, "pediatrics": 3,
+        "kaiser permanente": 3, "mayo clinic": 3, "quest diagnostics": 3, "labcorp": 3
+    },
+    "SUBSCRIPTION": {
+        "netflix": 3, "spotify": 3, "hulu": 3, "disney+": 3, "youtube premium": 3, "amazon prime": 3,
+        "apple music": 3, "icloud": 3, "adobe": 3, "creative cloud": 3, "microsoft 365": 3,
+        "dropbox": 3, "audible": 3, "max": 1, "peacock": 3, "paramount+": 3, "subscription": 2,
+        "membership": 2, "streaming": 2, "renews on": 3, "auto-renew": 3, "auto renew": 3,
+        "next billing date": 2, "gym": 2, "planet fitness": 3, "premium plan": 2, "annual plan": 1,
+        "free trial": 3, "cancel anytime": 3
+    },
+    "TELECOM": {
+        "verizon": 3, "at&t": 3, "t-mobile": 3, "comcast": 3, "xfinity": 3, "spectrum": 3,
+        "cox communications": 3, "centurylink": 3, "frontier communications": 3, "sprint": 3,
+        "wireless": 2, "data usage": 3, "unlimited data": 3, "broadband": 3, "internet": 2,
+        "cable tv": 3, "phone line": 3, "minutes": 1, "roaming": 3, "fiber": 2, "5g": 2, "mbps": 3,
+        "cell phone": 3, "mobile plan": 3, "text messages": 3, "equipment rental": 2, "modem": 3,
+        "router rental": 3, "cricket wireless": 3, "mint mobile": 3, "boost mobile": 3
+    }
+}
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over lowercase patterns
+
+    Every pattern is found in one pass over the text regardless of how many
+    patterns there are. Matches must not be glued to surrounding letters,
+    so "max" does not fire inside "maximum" (digits are allowed, as in "1200kwh").
+    """
+
+    def __init__(self, patterns: Dict[str, object]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, object]]] = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            for char in pattern.lower():
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append((pattern.lower(), value))
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> Iterable[Tuple[str, object]]:
+        """Yield (pattern, value) for every whole-word occurrence in text"""
+        text = text.lower()
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern, value in self._out[state]:
+                start = end - len(pattern)
+                if (start == 0 or not text[start - 1].isalpha()) and (end == len(text) or not text[end].isalpha()):
+                    yield pattern, value
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word unigrams and bigrams; numbers are dropped"""
+    words = re.findall(r"[a-z][a-z0-9&+\-]*", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class TfidfLinearModel:
+    """TF-IDF features with a multinomial logistic-regression classifier
+
+    Pure Python over sparse dicts: routing vocabularies are small, so
+    training on a few thousand bills takes well under a second.
+    """
+
+    def __init__(self, epochs: int = 40, learning_rate: float = 0.5, l2: float = 1e-4, seed: int = 13):
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.seed = seed
+        self.idf: Dict[str, float] = {}
+        self.weights: Dict[str, Dict[str, float]] = {}
+        self.bias: Dict[str, float] = {}
+        self.trained_on = 0
+
+    def vectorize(self, text: str) -> Dict[str, float]:
+        """L2-normalized TF-IDF vector restricted to the training vocabulary"""
+        counts = Counter(token for token in tokenize(text) if token in self.idf)
+        vector = {token: (1 + math.log(count)) * self.idf[token] for token, count in counts.items()}
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        return {token: value / norm for token, value in vector.items()} if norm else {}
+
+    def fit(self, examples: List[Tuple[str, str]]):
+        """Train on (text, bill_type) pairs"""
+        document_frequency = Counter()
+        for text, _ in examples:
+            document_frequency.update(set(tokenize(text)))
+        total = len(examples)
+        self.idf = {token: math.log((1 + total) / (1 + df)) + 1 for token, df in document_frequency.items()}
+
+        labels = sorted({label for _, label in examples})
+        self.weights = {label: defaultdict(float) for label in labels}
+        self.bias = {label: 0.0 for label in labels}
+        vectors = [(self.vectorize(text), label) for text, label in examples]
+
+        rng = random.Random(self.seed)
+        for epoch in range(self.epochs):
+            rng.shuffle(vectors)
+            rate = self.learning_rate / (1 + epoch * 0.1)
+            for vector, label in vectors:
+                probabilities = self._probabilities(vector)
+                for candidate in labels:
+                    gradient = probabilities[candidate] - (candidate == label)
+                    weights = self.weights[candidate]
+                    for token, value in vector.items():
+                        weights[token] -= rate * (gradient * value + self.l2 * weights[token])
+                    self.bias[candidate] -= rate * gradient
+
+        self.weights = {label: dict(weights) for label, weights in self.weights.items()}
+        self.trained_on = total
+        return self
+
+    def _probabilities(self, vector: Dict[str, float]) -> Dict[str, float]:
+        scores = {
+            label: self.bias[label] + sum(weights.get(token, 0.0) * value for token, value in vector.items())
+            for label, weights in self.weights.items()
+        }
+        peak = max(scores.values())
+        exps = {label: math.exp(score - peak) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """(bill_type, probability), or None for text with no known features"""
+        if not self.weights:
+            return None
+        vector = self.vectorize(text)
+        if not vector:
+            return None
+        probabilities = self._probabilities(vector)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+def load_examples(path: str) -> List[Tuple[str, str]]:
+    """(text, bill_type) pairs from a JSONL file of {"text", "company", "bill_type"} records"""
+    examples = []
+    with open(path) as handle:
+        for line in handle:
+            if line.strip():
+                record = json.loads(line)
+                examples.append((bill_text(record["text"], record.get("company")), record["bill_type"]))
+    return examples
+
+def bill_text(text: str, company: str = None) -> str:
+    """Text the classifier sees: the company name (when known) plus the OCR text"""
+    if company and company.lower() != "unknown":
+        return f"{company}\n{text}"
+    return text
+
+def training_examples(job_db_path: str = None) -> List[Tuple[str, str]]:
+    """Seed examples plus bills the LLM router classified in previous negotiations"""
+    examples = load_examples(SEED_EXAMPLES_PATH)
+    path = job_db_path or os.getenv("JOB_DB_PATH", "./data/negotiations.sqlite3")
+    if os.getenv("ROUTER_TRAIN_FROM_JOBS", "true").lower() == "true" and path != ":memory:" and os.path.exists(path):
+        # Imported lazily so the agents do not depend on the API package at import time
+        from api.jobs import JobStore
+        store = JobStore(path)
+        try:
+            examples += [(bill_text(text, company), bill_type) for text, company, bill_type in store.routed_bills()]
+        finally:
+            store.close()
+    return examples
+
+class BillClassifier:
+    """Keyword tier, then model tier; None means "ask the LLM router"
+
+    The keyword tier decides when the best class scores at least
+    keyword_min_score and beats the runner-up by keyword_margin times.
+    The model tier decides when its probability reaches
+    model_min_confidence. Per-tier decision counts are kept for stats().
+    """
+
+    def __init__(self, keywords: Dict[str, Dict[str, int]] = None, model: TfidfLinearModel = None,
+                 keyword_min_score: int = 3, keyword_margin: float = 2.0, model_min_confidence: float = None):
+        keywords = KEYWORDS if keywords is None else keywords
+        self.matcher = KeywordMatcher({
+            pattern: (bill_type, weight)
+            for bill_type, patterns in keywords.items()
+            for pattern, weight in patterns.items()
+        })
+        self.model = model
+        self.keyword_min_score = keyword_min_score
+        self.keyword_margin = keyword_margin
+        self.model_min_confidence = (
+            model_min_confidence if model_min_confidence is not None
+            else float(os.getenv("ROUTER_MODEL_MIN_CONFIDENCE", 0.6))
+        )
+        self._lock = threading.Lock()
+        self._counts = {"keyword": 0, "model": 0, "llm": 0}
+
+    @classmethod
+    def trained(cls, examples: List[Tuple[str, str]] = None, **kwargs) -> "BillClassifier":
+        """Classifier whose model tier is trained on examples (default: training_examples())"""
+        examples = training_examples() if examples is None else examples
+        return cls(model=TfidfLinearModel().fit(examples) if examples else None, **kwargs)
+
+    def keyword_decision(self, text: str) -> Optional[Tuple[str, float]]:
+        scores = Counter()
+        for pattern, (bill_type, weight) in set(self.matcher.find(text)):
+            scores[bill_type] += weight
+        ranked = scores.most_common(2)
+        if not ranked or ranked[0][1] < self.keyword_min_score:
+            return None
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        if ranked[0][1] < self.keyword_margin * runner_up:
+            return None
+        return ranked[0][0], ranked[0][1] / (ranked[0][1] + runner_up)
+
+    def classify(self, text: str, company: str = None) -> Optional[Dict]:
+        """{"bill_type", "tier", "confidence"} from the first confident tier, else None"""
+        text = bill_text(text, company)
+        decision, tier = self.keyword_decision(text), "keyword"
+        if decision is None and self.model is not None:
+            prediction = self.model.predict(text)
+            if prediction is not None and prediction[1] >= self.model_min_confidence:
+                decision, tier = prediction, "model"
+        if decision is None:
+            tier = "llm"
+
+        with self._lock:
+            self._counts[tier] += 1
+        if decision is None:
+            return None
+        return {"bill_type": decision[0], "tier": tier, "confidence": round(decision[1], 4)}
+
+    def stats(self) -> Dict:
+        """Decisions per tier and the share of bills each tier handled"""
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            **counts,
+            "total": total,
+            "hit_rates": {tier: round(count / total, 4) if total else 0.0 for tier, count in counts.items()},
+            "model_trained_on": self.model.trained_on if self.model else 0
+        }
+
+_classifier: Optional[BillClassifier] = None
+_classifier_lock = threading.Lock()
+
+def get_bill_classifier(train: bool = True) -> Optional[BillClassifier]:
+    """Process-wide classifier, trained on first use (None if not yet trained and train is False)"""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None and train:
+            _classifier = BillClassifier.trained()
+        return _classifier
+
+def retrain_bill_classifier() -> BillClassifier:
+    """Retrain on the current seed examples and stored negotiations and install the result"""
+    global _classifier
+    classifier = BillClassifier.trained()
+    with _classifier_lock:
+        _classifier = classifier
+    return classifier
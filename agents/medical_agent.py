@@ -1,7 +1,11 @@
-from langgraph.graph import StateGraph, END
-from langchain_anthropic import ChatAnthropic
+from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
 
+from llm.clients import get_chat_model
+from llm.prompts import fill_prompt, prompt_budget
+from memory.strategies import StrategyRecall, get_strategy_recall
+from agents.nodes import llm_node, recall_node, compile_graph, specialist_max_concurrency
+
 class MedicalState(TypedDict):
     ocr_text: str
     company: str
@@ -9,20 +13,28 @@ class MedicalState(TypedDict):
     errors: str
     negotiation_plan: str
     settlement_options: str
+    bill_summary: str
+    past_strategies: str
+    reused_strategy: str
 
 class MedicalNegotiationGraph:
-    def __init__(self):
+    def __init__(self, llm=None, max_concurrency: int = None, token_budget: int = None,
+                 recall: StrategyRecall = None):
         # Use Claude for medical bills for better accuracy
-        self.llm = ChatAnthropic(model="claude-3-opus-20240229", temperature=0.2)
+        self.llm = llm or get_chat_model("anthropic", "claude-3-opus-20240229", 0.2)
+        self.max_concurrency = max_concurrency or specialist_max_concurrency("MEDICAL")
+        self.token_budget = token_budget if token_budget is not None else prompt_budget("MEDICAL")
+        self.recall = recall or get_strategy_recall()
     
     def build_graph(self):
         workflow = StateGraph(MedicalState)
+        budget = self.token_budget
         
         def check_errors(state):
             """Check for billing errors and discrepancies"""
-            prompt = f"""
+            return fill_prompt("""
             Analyze this medical bill for errors and discrepancies:
-            {state['ocr_text']}
+            {bill}
             
             Check for:
             1. Duplicate charges or services
@@ -34,10 +46,7 @@ class MedicalNegotiationGraph:
             7. Wrong provider information
             
             List all identified issues with specific details and line items.
-            """
-            response = self.llm.invoke(prompt)
-            state['errors'] = response.content
-            return state
+            """, budget, compact=["bill"], bill=state['ocr_text'])
         
         def negotiate_strategy(state):
             """Create comprehensive negotiation approach"""
@@ -50,14 +59,15 @@ class MedicalNegotiationGraph:
                 "What's the cash discount if I pay this in full today?"
             ]
             
-            prompt = f"""
+            return fill_prompt("""
             Create a comprehensive medical bill negotiation strategy:
             
-            Bill Amount: ${state['amount']}
-            Errors Found: {state.get('errors', 'None identified')}
-            
+            Bill Amount: ${amount}
+            Errors Found: {errors}
+            Baseline Settlement Options: {settlements}
+            {history}
             Use these proven medical negotiation approaches:
-            {chr(10).join(medical_scripts)}
+            {scripts}
             
             Generate a detailed negotiation plan including:
             1. Error dispute strategy (if applicable)
@@ -68,18 +78,20 @@ class MedicalNegotiationGraph:
             6. Insurance appeal processes
             
             Prioritize the most effective approach based on the bill analysis.
-            """
-            response = self.llm.invoke(prompt)
-            state['negotiation_plan'] = response.content
-            return state
+            """, budget,
+                amount=state['amount'],
+                errors=state.get('errors', 'None identified'),
+                settlements=state.get('settlement_options', 'Not calculated'),
+                history=state.get('past_strategies', ''),
+                scripts=chr(10).join(medical_scripts))
         
         def calculate_settlements(state):
-            """Calculate potential settlement amounts"""
-            prompt = f"""
-            Based on the negotiation plan and bill amount of ${state['amount']}, 
+            """Calculate baseline settlement amounts from the bill alone"""
+            return fill_prompt("""
+            Based on this medical bill and its amount of ${amount},
             calculate realistic settlement options:
             
-            Negotiation Plan: {state['negotiation_plan']}
+            Bill: {bill}
             
             Provide:
             1. Immediate cash settlement (typically 10-30% of original)
@@ -88,20 +100,23 @@ class MedicalNegotiationGraph:
             4. Charity care qualification thresholds
             
             Include specific dollar amounts and payment structures.
-            """
-            response = self.llm.invoke(prompt)
-            state['settlement_options'] = response.content
-            return state
+            """, budget, compact=["bill"], amount=state['amount'],
+                bill=state.get('bill_summary') or state['ocr_text'])
         
         # Add nodes
-        workflow.add_node("error_check", check_errors)
-        workflow.add_node("negotiate", negotiate_strategy)
-        workflow.add_node("settlements", calculate_settlements)
+        workflow.add_node("recall", recall_node(self.recall, "MEDICAL", reuse=False))
+        workflow.add_node("error_check", llm_node(self.llm, check_errors, "errors"))
+        workflow.add_node("negotiate", llm_node(self.llm, negotiate_strategy, "negotiation_plan"))
+        workflow.add_node("settlements", llm_node(self.llm, calculate_settlements, "settlement_options"))
         
-        # Define edges
-        workflow.add_edge("error_check", "negotiate")
-        workflow.add_edge("negotiate", "settlements")
-        workflow.add_edge("settlements", END)
-        workflow.set_entry_point("error_check")
+        # Error checking and the baseline settlement estimate both work from
+        # the raw bill, so they run in parallel and feed the negotiation plan.
+        # Errors are specific to each bill, so past strategies are only
+        # recalled (in parallel) as context for the plan, never reused
+        workflow.add_edge(START, "recall")
+        workflow.add_edge(START, "error_check")
+        workflow.add_edge(START, "settlements")
+        workflow.add_edge(["error_check", "settlements", "recall"], "negotiate")
+        workflow.add_edge("negotiate", END)
         
-        return workflow.compile()
\ No newline at end of file
+        return compile_graph(workflow, self.max_concurrency, "MEDICAL")
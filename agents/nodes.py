@@ -0,0 +1,220 @@
+import asyncio
+import os
+import time
+from langchain_core.runnables import RunnableLambda
+from typing import Callable, Optional
+
+from llm.cache import LLMResponseCache, describe_llm, get_llm_cache
+from llm.prompts import get_prompt_stats
+from memory.strategies import StrategyRecall
+from tools.competitor_rates import CompetitorRateStore, format_competitor_research
+from agents.scripts import ScriptTemplate, parse_personalization
+from tracing import get_tracer, usage_tokens
+
+def llm_node(llm, build_prompt: Callable[[dict], str], output_key: str,
+             parse: Optional[Callable[[str], object]] = None, name: str = None,
+             cache: Optional[LLMResponseCache] = None, recall: Optional[StrategyRecall] = None,
+             bill_type: str = None, max_tokens: int = None):
+    """Create a graph node that prompts the LLM and stores the reply in state
+
+    The node runs with llm.invoke under graph.invoke and with llm.ainvoke
+    under graph.ainvoke, so a single graph serves sync and async callers.
+    Deterministic calls are answered from the shared LLM response cache
+    (or the given cache) when the same model has seen the same prompt;
+    under graph.ainvoke its SQLite tier is read and written in a thread.
+    Prompts that are actually sent are counted per node in the prompt stats,
+    and every call (cache hits included) is reported to the tracer.
+    
+    With recall, a past strategy reused by recall_node (reused_strategy in
+    state) becomes the output without prompting, and the recall times the
+    calls that do run to estimate the latency reuse saves. max_tokens caps
+    the completion (and is part of the cache key).
+    """
+    cache = cache or get_llm_cache()
+    prompt_stats = get_prompt_stats()
+    tracer = get_tracer()
+    name = name or output_key
+    model, temperature = describe_llm(llm)
+    traced_model = model
+    cache_status = "miss" if cache.cacheable(temperature) else "off"
+    options = {}
+    if max_tokens:
+        options["max_tokens"] = max_tokens
+        model = f"{model}:max_tokens={max_tokens}"
+
+    def to_update(content):
+        return {output_key: parse(content) if parse else content}
+
+    def sent(prompt):
+        prompt_stats.record(name, prompt)
+        return time.perf_counter()
+
+    def finished(prompt, response, started, queued):
+        """Trace a completed call and return the cache entry it produced"""
+        latency = time.perf_counter() - started
+        prompt_tokens, completion_tokens = usage_tokens(prompt, response)
+        tracer.llm_call(traced_model, name, latency, prompt_tokens, completion_tokens, cache_status, queued[0])
+        return dict(model=model, temperature=temperature, prompt=prompt, content=response.content,
+                    latency=latency, tokens=prompt_tokens + completion_tokens)
+
+    def reused(state):
+        if recall is not None and state.get("reused_strategy"):
+            recall.record_reuse(bill_type)
+            return {output_key: state["reused_strategy"]}
+        return None
+
+    def timed(started):
+        if recall is not None:
+            recall.record_analysis(bill_type, time.perf_counter() - started)
+
+    # Passing the node's config through keeps the LLM run parented to the
+    # node, so callbacks and astream_events see its tokens
+    def node(state, config):
+        update = reused(state)
+        if update is not None:
+            return update
+        node_started = time.perf_counter()
+        prompt = build_prompt(state)
+        content = cache.get(model, temperature, prompt)
+        if content is None:
+            started = sent(prompt)
+            with tracer.measure_queue() as queued:
+                response = llm.invoke(prompt, config, **options)
+            cache.put(**finished(prompt, response, started, queued))
+            content = response.content
+        else:
+            tracer.llm_call(traced_model, name, cache="hit")
+        timed(node_started)
+        return to_update(content)
+
+    async def anode(state, config):
+        update = reused(state)
+        if update is not None:
+            return update
+        node_started = time.perf_counter()
+        prompt = build_prompt(state)
+        # The SQLite tier would block the event loop
+        if cache.persistent:
+            content = await asyncio.to_thread(cache.get, model, temperature, prompt)
+        else:
+            content = cache.get(model, temperature, prompt)
+        if content is None:
+            started = sent(prompt)
+            with tracer.measure_queue() as queued:
+                response = await llm.ainvoke(prompt, config, **options)
+            entry = finished(prompt, response, started, queued)
+            if cache.persistent:
+                await asyncio.to_thread(cache.put, **entry)
+            else:
+                cache.put(**entry)
+            content = response.content
+        else:
+            tracer.llm_call(traced_model, name, cache="hit")
+        timed(node_started)
+        return to_update(content)
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+def recall_node(recall: StrategyRecall, bill_type: str, reuse: bool = True, name: str = "recall"):
+    """Create a graph node that recalls the company's past successful strategies
+
+    Sets past_strategies (a compact prompt section, possibly empty) and,
+    with reuse, reused_strategy (a close enough past strategy, or empty). Under
+    graph.ainvoke a company missing from the recall cache is searched in a
+    worker thread, so the vector search does not block the event loop.
+    """
+    def node(state):
+        return recall.recall(bill_type, state["company"], state["amount"], reuse=reuse)
+
+    async def anode(state):
+        strategies = recall.cached(bill_type, state["company"])
+        if strategies is None:
+            strategies = await asyncio.to_thread(recall.search, bill_type, state["company"])
+        return recall.recall(bill_type, state["company"], state["amount"], strategies, reuse=reuse)
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+def competitor_context(rates: CompetitorRateStore, bill_type: str, state: dict) -> str:
+    """Competitor rates for the bill from the local store as a prompt section ("" without rates)"""
+    leverage = rates.leverage(bill_type, state["amount"], state.get("region"), text=state["ocr_text"],
+                              company=state["company"])
+    return format_competitor_research(leverage) if leverage else ""
+
+def competitor_node(rates: CompetitorRateStore, bill_type: str, output_key: str, fallback=None,
+                    name: str = "research"):
+    """Create a graph node that answers competitor research from the local rate store
+
+    The lookup takes microseconds instead of an LLM round trip. When the
+    store has no rates for the bill the fallback node (an llm_node) runs
+    instead, or the output is left empty without one. Under graph.ainvoke a
+    store that is not loaded yet (the API loads it at startup) is loaded in
+    a worker thread.
+    """
+    def node(state, config):
+        research = competitor_context(rates, bill_type, state)
+        if not research and fallback is not None:
+            return fallback.invoke(state, config)
+        return {output_key: research}
+
+    async def anode(state, config):
+        if not rates.loaded:
+            await asyncio.to_thread(rates.load)
+        research = competitor_context(rates, bill_type, state)
+        if not research and fallback is not None:
+            return await fallback.ainvoke(state, config)
+        return {output_key: research}
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+def script_node(llm, template: ScriptTemplate, fields: Callable[[dict], dict], output_key: str,
+                max_tokens: int = 0, budget: int = None, name: str = "script"):
+    """Create a graph node that renders a negotiation script from its template
+
+    fields builds the template fields from state. The LLM only writes the
+    opening and fallback lines, in one completion capped at max_tokens; with
+    max_tokens 0 the script is rendered from the stock lines without it.
+    """
+    personalize = None
+    if max_tokens:
+        personalize = llm_node(
+            llm, lambda state: template.personalization_prompt(state["script_fields"], budget),
+            "personalization", name=f"{name}_personalize", max_tokens=max_tokens
+        )
+
+    def render(values, reply):
+        opening, fallbacks = parse_personalization(reply)
+        return {output_key: template.render(values, opening, fallbacks)}
+
+    def node(state, config):
+        values = fields(state)
+        if personalize is None:
+            return render(values, "")
+        reply = personalize.invoke({**state, "script_fields": values}, config)["personalization"]
+        return render(values, reply)
+
+    async def anode(state, config):
+        values = fields(state)
+        if personalize is None:
+            return render(values, "")
+        reply = (await personalize.ainvoke({**state, "script_fields": values}, config))["personalization"]
+        return render(values, reply)
+
+    return RunnableLambda(node, afunc=anode, name=name)
+
+def specialist_max_concurrency(bill_type: str) -> Optional[int]:
+    """Parallel node limit from <BILL_TYPE>_MAX_CONCURRENCY or SPECIALIST_MAX_CONCURRENCY
+
+    None (unset or 0) lets every ready branch run at once.
+    """
+    value = os.getenv(f"{bill_type}_MAX_CONCURRENCY") or os.getenv("SPECIALIST_MAX_CONCURRENCY")
+    return (int(value) or None) if value else None
+
+def compile_graph(workflow, max_concurrency: Optional[int] = None, name: str = None):
+    """Compile a workflow, capping how many of its nodes may run concurrently
+
+    With a name, every node is timed by the process-wide tracer under that graph name.
+    """
+    if name:
+        get_tracer().trace_nodes(workflow, name)
+    graph = workflow.compile()
+    return graph.with_config(max_concurrency=max_concurrency) if max_concurrency else graph
@@ -1,7 +1,10 @@
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
 from typing import TypedDict, Literal
 
+from llm.clients import get_chat_model
+from llm.prompts import fill_prompt, prompt_budget
+from agents.nodes import llm_node, compile_graph
+
 class BillState(TypedDict):
     bill_type: str
     ocr_text: str
@@ -10,17 +13,21 @@ class BillState(TypedDict):
     negotiation_strategy: str
     conversation_history: list
 
-def create_router_graph():
+def create_router_graph(llm=None, token_budget: int = None):
     """Creates the bill routing agent that determines which specialist to use"""
     workflow = StateGraph(BillState)
     
+    # Shared pooled client rather than one per routed bill
+    if llm is None:
+        llm = get_chat_model("openai", "gpt-3.5-turbo", 0)
+    # Categorizing needs the bill's header and line items, not every page
+    budget = token_budget if token_budget is not None else prompt_budget("ROUTER")
+    
     def route_bill(state: BillState):
         """Routes bill to appropriate specialist agent"""
-        llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-        
-        prompt = f"""
+        return fill_prompt("""
         Analyze this bill and determine the specialist agent category:
-        Bill Data: {state['ocr_text']}
+        Bill Data: {bill}
         
         Categories:
         - UTILITY: Electric, gas, water, waste management bills
@@ -30,22 +37,22 @@ def create_router_graph():
         
         Look for company names, service types, and billing patterns.
         Return only the category name (UTILITY, MEDICAL, SUBSCRIPTION, or TELECOM).
-        """
-        
-        response = llm.invoke(prompt)
-        bill_type = response.content.strip().upper()
+        """, budget, compact=["bill"], bill=state['ocr_text'])
+    
+    def parse_bill_type(content: str) -> str:
+        """Validate the LLM's category answer"""
+        bill_type = content.strip().upper()
         
         # Validate response
         valid_types = ["UTILITY", "MEDICAL", "SUBSCRIPTION", "TELECOM"]
         if bill_type not in valid_types:
             bill_type = "UTILITY"  # Default fallback
             
-        state['bill_type'] = bill_type
-        return state
+        return bill_type
     
     # Add router node
-    workflow.add_node("router", route_bill)
+    workflow.add_node("router", llm_node(llm, route_bill, "bill_type", parse=parse_bill_type))
     workflow.set_entry_point("router")
     workflow.add_edge("router", END)
     
-    return workflow.compile()
\ No newline at end of file
+    return compile_graph(workflow, name="router")
\ No newline at end of file
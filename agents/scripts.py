@@ -0,0 +1,240 @@
+"""
+Negotiation scripts rendered from templates instead of written by the LLM
+
+A script is a fixed sequence of sections whose lines are str.format
+templates over the script fields (company, amount, competitor offer,
+target amount, talking points from the analysis, ...). Templates are
+compiled once at import: each line knows the fields it needs and is left
+out when one of them is missing, and lines over a list field repeat once
+per item. Only the opening and the fallback lines are personalized by the
+LLM, in one short completion capped at script_max_tokens tokens.
+"""
+
+import os
+import re
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from llm.prompts import fill_prompt
+
+# Output tokens for the personalized opening and fallbacks unless overridden
+# by <BILL_TYPE>_SCRIPT_MAX_TOKENS; 0 renders the script without the LLM
+DEFAULT_SCRIPT_MAX_TOKENS = 120
+
+# Share of the bill to ask off, per bill type
+TARGET_DISCOUNTS = {"UTILITY": 0.10, "TELECOM": 0.20, "SUBSCRIPTION": 0.30}
+DEFAULT_TARGET_DISCOUNT = 0.15
+
+FALLBACK_LINES = 2
+MAX_TALKING_POINTS = 3
+
+# Numbered, bulleted or bold-led lines of an analysis, without the marker
+LIST_ITEM = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+(?:\*\*)?(.+?)(?:\*\*)?\s*$")
+PERSONALIZED = re.compile(r"^\s*(OPENING|FALLBACK)\s*\d*\s*:\s*(.+?)\s*$", re.IGNORECASE)
+
+Section = Tuple[str, Sequence[str]]
+
+SECTIONS: Dict[str, List[Section]] = {
+    "UTILITY": [
+        ("Opening", ["{opening}"]),
+        ("Account", [
+            "I'm calling about my {company} account. My latest bill is ${amount}.",
+            "I've been a reliable customer and I'd like to find a way to lower what I pay."
+        ]),
+        ("Key points", ["{points}"]),
+        ("Competitor comparison", [
+            "{competitor} offers {competitor_plan} at {competitor_rate}. Can you match or beat that?",
+            "I've found {cheaper_offers} plans that would cost me less than I pay now."
+        ]),
+        ("Programs", [
+            "Are there any energy efficiency programs or budget billing options that could help reduce my costs?",
+            "My usage has been consistent - is there a loyalty discount available?"
+        ]),
+        ("Ask", ["I'd like to bring my bill down to about ${target} a month. What can you do?"]),
+        ("Fallback positions", ["{fallbacks}"]),
+        ("Closing", ["Thank you. Could you confirm the new rate, when it takes effect, and send it to me in writing?"])
+    ],
+    "TELECOM": [
+        ("Opening", ["{opening}"]),
+        ("Account", [
+            "I'm calling about my {company} bill of ${amount}. I've been a loyal customer and my bill keeps increasing.",
+            "Looking at my usage, I think I may be on the wrong plan."
+        ]),
+        ("Key points", ["{points}"]),
+        ("Competitor offers", [
+            "{competitor} is offering {competitor_plan} for {competitor_rate}. Can you match or beat that?",
+            "I found {cheaper_offers} comparable plans from other carriers that cost less than mine."
+        ]),
+        ("Fees and promotions", [
+            "These fees and charges seem excessive. Can we review them line by line?",
+            "What promotions do you have for existing customers?"
+        ]),
+        ("Ask", ["I'd like to get my monthly bill to about ${target}. If that's not possible here, "
+                 "please transfer me to the retention department."]),
+        ("Fallback positions", [
+            "{fallbacks}",
+            "If nothing else works, I'm considering switching to prepaid to save money."
+        ]),
+        ("Closing", ["Thank you. Please confirm the new monthly total and any contract changes in writing."])
+    ],
+    "SUBSCRIPTION": [
+        ("Opening", ["{opening}"]),
+        ("Cancellation request", [
+            "I'd like to cancel my {company} subscription. At ${amount} it no longer fits my budget.",
+            "I'm not using all the features I'm paying for."
+        ]),
+        ("Key points", ["{points}"]),
+        ("Competitor comparison", [
+            "I found {competitor} {competitor_plan} for {competitor_rate}, and I'm planning to switch."
+        ]),
+        ("Expected retention offers", ["{offers}"]),
+        ("Ask", ["I'd stay for about ${target} a month. What's your best retention offer?",
+                 "Could I downgrade, pause during months I don't use it, or get a student or senior rate?"]),
+        ("Fallback positions", ["{fallbacks}"]),
+        ("Closing", ["Thanks. Please confirm the new price, how long it lasts, and that no other terms changed."])
+    ],
+    "GENERAL": [
+        ("Opening", ["{opening}"]),
+        ("Account", ["I'm calling about my {company} bill of ${amount}. I've been a loyal customer and "
+                     "I'm hoping we can work together on a better rate."]),
+        ("Key points", ["{points}"]),
+        ("Competitor comparison", ["{competitor} offers {competitor_plan} at {competitor_rate}. Can you match that?"]),
+        ("Ask", ["I'd like to bring the bill down to about ${target}. What options do I have?"]),
+        ("Fallback positions", ["{fallbacks}"]),
+        ("Closing", ["Thank you for your help. Please confirm the changes in writing."])
+    ]
+}
+
+OPENINGS = {
+    "UTILITY": "Hi, I've been a loyal customer for years and I'm hoping we can work together to find a better rate.",
+    "TELECOM": "Hi, I've been with you for a long time, but my bill keeps going up and I'm reviewing my options.",
+    "SUBSCRIPTION": "Hi, I'm calling to cancel my subscription - it's become too expensive for how much I use it.",
+    "GENERAL": "Hi, I'm calling to review my bill and see what you can do to lower it."
+}
+
+FALLBACKS = {
+    "UTILITY": ["If you can't lower the rate, can you waive fees or credit my account this month?",
+                "Could you put me on budget billing so my payments stay predictable?"],
+    "TELECOM": ["If you can't lower the plan price, can you remove the fees or add a loyalty credit?",
+                "Could I switch to a cheaper plan without losing my current promotions?"],
+    "SUBSCRIPTION": ["If a discount isn't possible, could you give me a few free months?",
+                     "Otherwise I'd like to move to the cheapest tier or pause my subscription."],
+    "GENERAL": ["If the rate can't change, can you waive fees or offer a one-time credit?",
+                "Could you note my request so I can follow up with a supervisor?"]
+}
+
+def script_max_tokens(bill_type: str) -> int:
+    """Token cap from <BILL_TYPE>_SCRIPT_MAX_TOKENS or SCRIPT_MAX_TOKENS (0 = no LLM)"""
+    value = os.getenv(f"{bill_type.upper()}_SCRIPT_MAX_TOKENS") or os.getenv("SCRIPT_MAX_TOKENS")
+    return int(value) if value else DEFAULT_SCRIPT_MAX_TOKENS
+
+def talking_points(text: str, limit: int = MAX_TALKING_POINTS) -> List[str]:
+    """The first list items of an analysis, the talking points a script repeats"""
+    points = []
+    for line in (text or "").splitlines():
+        match = LIST_ITEM.match(line)
+        if match and 20 <= len(match.group(1)) <= 240:
+            points.append(match.group(1).rstrip(":"))
+            if len(points) == limit:
+                break
+    return points
+
+def script_fields(bill_type: str, company: str, amount: float, leverage: Dict = None,
+                  analysis: str = "", offers: str = "") -> Dict:
+    """Template fields for a bill: amounts, the cheapest competitor offer and talking points
+
+    leverage is a CompetitorRateStore.leverage result (or None); analysis and
+    offers are LLM outputs whose list items become talking points.
+    """
+    bill_type = bill_type.upper()
+    amount = float(amount or 0)
+    discount = TARGET_DISCOUNTS.get(bill_type, DEFAULT_TARGET_DISCOUNT)
+    fields = {
+        "bill_type": bill_type,
+        "company": company or "",
+        "amount": f"{amount:.2f}" if amount else "",
+        "target": f"{amount * (1 - discount):.2f}" if amount else "",
+        "points": talking_points(analysis),
+        "offers": talking_points(offers)
+    }
+    if leverage and leverage.get("offers"):
+        offer = leverage["offers"][0]
+        fields.update({
+            "competitor": offer["provider"],
+            "competitor_plan": offer["plan"],
+            "competitor_rate": f"${offer['price']:g}/{offer['unit']}",
+            "cheaper_offers": leverage.get("cheaper_offers") or ""
+        })
+    return fields
+
+def parse_personalization(text: str) -> Tuple[Optional[str], List[str]]:
+    """(opening, fallback lines) from an "OPENING: ..." / "FALLBACK: ..." reply
+
+    An untagged reply is taken as the opening (first line) and fallbacks
+    (following lines). Empty parts come back as None / [].
+    """
+    tagged = [PERSONALIZED.match(line) for line in (text or "").splitlines()]
+    tagged = [match for match in tagged if match]
+    if tagged:
+        openings = [match.group(2) for match in tagged if match.group(1).upper() == "OPENING"]
+        fallbacks = [match.group(2) for match in tagged if match.group(1).upper() == "FALLBACK"]
+        return (openings[0] if openings else None), fallbacks[:FALLBACK_LINES]
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    return (lines[0] if lines else None), lines[1:1 + FALLBACK_LINES]
+
+class ScriptTemplate:
+    """A bill type's script sections, compiled once into lines and the fields they need"""
+
+    def __init__(self, bill_type: str, sections: Iterable[Section] = None):
+        self.bill_type = bill_type.upper()
+        formatter = Formatter()
+        self.sections = [
+            (title, [(line, tuple(name for _, name, _, _ in formatter.parse(line) if name)) for line in lines])
+            for title, lines in (sections if sections is not None else
+                                 SECTIONS.get(self.bill_type, SECTIONS["GENERAL"]))
+        ]
+        self.opening = OPENINGS.get(self.bill_type, OPENINGS["GENERAL"])
+        self.fallbacks = FALLBACKS.get(self.bill_type, FALLBACKS["GENERAL"])
+
+    def render(self, fields: Dict, opening: str = None, fallbacks: Sequence[str] = None) -> str:
+        """The script for these fields; opening and fallbacks default to the bill type's stock lines"""
+        values = dict(fields, opening=opening or self.opening, fallbacks=list(fallbacks or self.fallbacks))
+        parts = []
+        for title, lines in self.sections:
+            rendered = []
+            for line, names in lines:
+                if not all(values.get(name) not in (None, "", []) for name in names):
+                    continue
+                repeated = [name for name in names if isinstance(values[name], list)]
+                if repeated:
+                    name = repeated[0]
+                    rendered.extend(line.format(**dict(values, **{name: item})) for item in values[name])
+                else:
+                    rendered.append(line.format(**values))
+            if rendered:
+                parts.append(f"{title}:\n" + "\n".join(f"- {line}" for line in rendered))
+        return "\n\n".join(parts)
+
+    def personalization_prompt(self, fields: Dict, budget: int = None):
+        """Short prompt asking only for the opening and fallback lines"""
+        leverage = list(fields.get("points") or [])[:2]
+        if fields.get("competitor"):
+            leverage.append(f"{fields['competitor']} offers {fields['competitor_plan']} at {fields['competitor_rate']}")
+        return fill_prompt("""
+            Write the personalized parts of a phone script negotiating a {bill_type} bill.
+            Company: {company}
+            Amount: ${amount}
+            Leverage: {leverage}
+
+            Reply with exactly these lines, one or two sentences each:
+            OPENING: a warm, specific opening for the call
+            FALLBACK: a fallback ask if the first offer is refused
+            FALLBACK: a last-resort ask before escalating
+            """, budget, bill_type=self.bill_type.lower(), company=fields.get("company") or "the provider",
+            amount=fields.get("amount") or "0.00", leverage="; ".join(leverage) or "long-term customer")
+
+_templates = {bill_type: ScriptTemplate(bill_type) for bill_type in SECTIONS}
+
+def get_script_template(bill_type: str) -> ScriptTemplate:
+    """The compiled template for a bill type (GENERAL for bill types without their own)"""
+    return _templates.get((bill_type or "").upper(), _templates["GENERAL"])
@@ -1,28 +1,47 @@
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
 
+from llm.clients import get_chat_model
+from llm.prompts import fill_prompt, prompt_budget
+from memory.strategies import StrategyRecall, get_strategy_recall
+from tools.competitor_rates import CompetitorRateStore, get_competitor_rate_store
+from agents.scripts import get_script_template, script_fields, script_max_tokens
+from agents.nodes import llm_node, recall_node, script_node, competitor_context, compile_graph, specialist_max_concurrency
+
 class SubscriptionState(TypedDict):
     ocr_text: str
     company: str
     amount: float
+    region: str
     service_analysis: str
     cancellation_strategy: str
     retention_offers: str
+    bill_summary: str
+    past_strategies: str
+    reused_strategy: str
 
 class SubscriptionNegotiationGraph:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4-turbo-preview", temperature=0.4)
+    def __init__(self, llm=None, max_concurrency: int = None, token_budget: int = None,
+                 recall: StrategyRecall = None, rates: CompetitorRateStore = None,
+                 script_tokens: int = None):
+        self.llm = llm or get_chat_model("openai", "gpt-4-turbo-preview", 0.4)
+        self.max_concurrency = max_concurrency or specialist_max_concurrency("SUBSCRIPTION")
+        self.token_budget = token_budget if token_budget is not None else prompt_budget("SUBSCRIPTION")
+        self.recall = recall or get_strategy_recall()
+        self.rates = rates or get_competitor_rate_store()
+        self.script_max_tokens = script_tokens if script_tokens is not None else script_max_tokens("SUBSCRIPTION")
     
     def build_graph(self):
         workflow = StateGraph(SubscriptionState)
+        budget = self.token_budget
         
         def analyze_service(state):
             """Analyze subscription service and usage patterns"""
-            prompt = f"""
+            return fill_prompt("""
             Analyze this subscription service for negotiation opportunities:
-            Bill: {state['ocr_text']}
-            
+            Bill: {bill}
+            {history}
+            {competitors}
             Evaluate:
             1. Service tier and features currently used
             2. Competitor pricing and offerings
@@ -32,51 +51,26 @@ class SubscriptionNegotiationGraph:
             6. Loyalty program benefits
             
             Identify the best negotiation angle based on usage and market alternatives.
-            """
-            response = self.llm.invoke(prompt)
-            state['service_analysis'] = response.content
-            return state
+            """, budget, compact=["bill"], bill=state['ocr_text'], history=state.get('past_strategies', ''),
+                competitors=competitor_context(self.rates, "SUBSCRIPTION", state))
         
-        def create_cancellation_strategy(state):
-            """Develop cancellation-based negotiation strategy"""
-            cancellation_scripts = [
-                "I need to cancel my subscription due to budget constraints.",
-                "I found a better deal with [competitor] and I'm planning to switch.",
-                "I'm not using all the features I'm paying for. Can we find a better plan?",
-                "I've been a loyal customer for X years. What can you do to keep my business?",
-                "I'm consolidating my subscriptions. What's your best retention offer?"
-            ]
-            
-            prompt = f"""
-            Create a cancellation-based negotiation strategy:
-            
-            Service Analysis: {state['service_analysis']}
-            Current Amount: ${state['amount']}
-            
-            Use these proven cancellation scripts:
-            {chr(10).join(cancellation_scripts)}
-            
-            Develop a strategy that includes:
-            1. Cancellation threat timing
-            2. Competitor comparison points
-            3. Usage-based downgrade options
-            4. Seasonal pause opportunities
-            5. Student/senior discounts
-            6. Bundle/unbundle strategies
-            
-            Focus on retention department tactics that typically yield 20-50% savings.
-            """
-            response = self.llm.invoke(prompt)
-            state['cancellation_strategy'] = response.content
-            return state
+        def script_values(state):
+            """Script fields from the bill, the service analysis, retention offers and competitor rates"""
+            return script_fields(
+                "SUBSCRIPTION", state['company'], state['amount'],
+                leverage=self.rates.leverage("SUBSCRIPTION", state['amount'], state.get('region'),
+                                             text=state['ocr_text'], company=state['company']),
+                analysis=state['service_analysis'], offers=state['retention_offers']
+            )
         
         def predict_retention_offers(state):
             """Predict likely retention offers from the company"""
-            prompt = f"""
-            Based on the cancellation strategy and service analysis, predict likely retention offers:
+            return fill_prompt("""
+            Predict the retention offers this company is likely to make to a customer who threatens to cancel:
             
-            Strategy: {state['cancellation_strategy']}
-            Service: {state['service_analysis']}
+            Company: {company}
+            Bill: {bill}
+            Current Amount: ${amount}
             
             Typical retention offers include:
             1. Percentage discounts (10-50% off)
@@ -87,20 +81,26 @@ class SubscriptionNegotiationGraph:
             6. Loyalty rewards or credits
             
             Rank these offers by likelihood and provide counter-negotiation tactics for each.
-            """
-            response = self.llm.invoke(prompt)
-            state['retention_offers'] = response.content
-            return state
+            """, budget, compact=["bill"], company=state['company'],
+                bill=state.get('bill_summary') or state['ocr_text'], amount=state['amount'])
         
         # Add nodes
-        workflow.add_node("analyze", analyze_service)
-        workflow.add_node("cancellation", create_cancellation_strategy)
-        workflow.add_node("retention", predict_retention_offers)
+        workflow.add_node("recall", recall_node(self.recall, "SUBSCRIPTION"))
+        workflow.add_node("analyze", llm_node(self.llm, analyze_service, "service_analysis",
+                                              recall=self.recall, bill_type="SUBSCRIPTION"))
+        workflow.add_node("cancellation", script_node(
+            self.llm, get_script_template("SUBSCRIPTION"), script_values, "cancellation_strategy",
+            max_tokens=self.script_max_tokens, budget=budget, name="cancellation"
+        ))
+        workflow.add_node("retention", llm_node(self.llm, predict_retention_offers, "retention_offers"))
         
-        # Define edges
-        workflow.add_edge("analyze", "cancellation")
-        workflow.add_edge("cancellation", "retention")
-        workflow.add_edge("retention", END)
-        workflow.set_entry_point("analyze")
+        # Service analysis and retention-offer prediction both work from the
+        # raw bill, so they run in parallel and feed the cancellation strategy;
+        # the service analysis waits for the recalled strategies, which may replace it
+        workflow.add_edge(START, "recall")
+        workflow.add_edge("recall", "analyze")
+        workflow.add_edge(START, "retention")
+        workflow.add_edge(["analyze", "retention"], "cancellation")
+        workflow.add_edge("cancellation", END)
         
-        return workflow.compile()
\ No newline at end of file
+        return compile_graph(workflow, self.max_concurrency, "SUBSCRIPTION")
\ No newline at end of file
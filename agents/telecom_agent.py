@@ -1,28 +1,46 @@
-from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
+from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
 
+from llm.clients import get_chat_model
+from llm.prompts import fill_prompt, prompt_budget
+from memory.strategies import StrategyRecall, get_strategy_recall
+from tools.competitor_rates import CompetitorRateStore, get_competitor_rate_store
+from agents.scripts import get_script_template, script_fields, script_max_tokens
+from agents.nodes import llm_node, recall_node, script_node, competitor_node, compile_graph, specialist_max_concurrency
+
 class TelecomState(TypedDict):
     ocr_text: str
     company: str
     amount: float
+    region: str
     plan_analysis: str
     competitor_research: str
     negotiation_script: str
+    bill_summary: str
+    past_strategies: str
+    reused_strategy: str
 
 class TelecomNegotiationGraph:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4-turbo-preview", temperature=0.3)
+    def __init__(self, llm=None, max_concurrency: int = None, token_budget: int = None,
+                 recall: StrategyRecall = None, rates: CompetitorRateStore = None,
+                 script_tokens: int = None):
+        self.llm = llm or get_chat_model("openai", "gpt-4-turbo-preview", 0.3)
+        self.max_concurrency = max_concurrency or specialist_max_concurrency("TELECOM")
+        self.token_budget = token_budget if token_budget is not None else prompt_budget("TELECOM")
+        self.recall = recall or get_strategy_recall()
+        self.rates = rates or get_competitor_rate_store()
+        self.script_max_tokens = script_tokens if script_tokens is not None else script_max_tokens("TELECOM")
     
     def build_graph(self):
         workflow = StateGraph(TelecomState)
+        budget = self.token_budget
         
         def analyze_plan(state):
             """Analyze current telecom plan and usage"""
-            prompt = f"""
+            return fill_prompt("""
             Analyze this telecom bill for optimization opportunities:
-            Bill: {state['ocr_text']}
-            
+            Bill: {bill}
+            {history}
             Examine:
             1. Data usage vs plan allowances
             2. Voice minutes and text usage
@@ -33,18 +51,16 @@ class TelecomNegotiationGraph:
             7. Multi-line discounts
             
             Identify areas where the customer is overpaying or underutilizing services.
-            """
-            response = self.llm.invoke(prompt)
-            state['plan_analysis'] = response.content
-            return state
+            """, budget, compact=["bill"], bill=state['ocr_text'], history=state.get('past_strategies', ''))
         
         def research_competitors(state):
-            """Research competitor offers and market rates"""
-            prompt = f"""
-            Based on the plan analysis, research competitive alternatives:
+            """Research competitor offers and market rates (when the rate store has none)"""
+            return fill_prompt("""
+            Research competitive alternatives to this telecom service:
             
-            Plan Analysis: {state['plan_analysis']}
-            Current Bill: ${state['amount']}
+            Provider: {company}
+            Bill: {bill}
+            Current Bill: ${amount}
             
             Consider major competitors and their:
             1. Comparable plan pricing
@@ -55,55 +71,40 @@ class TelecomNegotiationGraph:
             6. Prepaid vs postpaid options
             
             Provide specific competitor names, plans, and pricing for negotiation leverage.
-            """
-            response = self.llm.invoke(prompt)
-            state['competitor_research'] = response.content
-            return state
+            """, budget, compact=["bill"], company=state['company'],
+                bill=state.get('bill_summary') or state['ocr_text'], amount=state['amount'])
         
-        def create_negotiation_script(state):
-            """Generate comprehensive telecom negotiation script"""
-            telecom_scripts = [
-                "I've been a loyal customer for X years and my bill keeps increasing.",
-                "[Competitor] is offering me [specific deal]. Can you match or beat that?",
-                "I'm looking at my usage and I think I'm on the wrong plan.",
-                "These fees and charges seem excessive. Can we review them?",
-                "I'm considering switching to prepaid to save money.",
-                "What promotions do you have for existing customers?"
-            ]
-            
-            prompt = f"""
-            Create a comprehensive telecom negotiation script:
-            
-            Plan Analysis: {state['plan_analysis']}
-            Competitor Research: {state['competitor_research']}
-            
-            Use these proven telecom negotiation approaches:
-            {chr(10).join(telecom_scripts)}
-            
-            Generate a complete negotiation strategy including:
-            1. Opening with loyalty and payment history
-            2. Specific competitor offers to leverage
-            3. Plan optimization requests
-            4. Fee reduction negotiations
-            5. Promotional rate requests
-            6. Retention department escalation
-            7. Bundle/unbundle considerations
-            
-            Structure as a conversation flow with multiple negotiation paths.
+        def script_values(state):
+            """Script fields from the bill, the plan analysis and competitor rates
+
+            Without rates for the bill the LLM's competitor research leads the talking points.
             """
-            response = self.llm.invoke(prompt)
-            state['negotiation_script'] = response.content
-            return state
+            leverage = self.rates.leverage("TELECOM", state['amount'], state.get('region'),
+                                           text=state['ocr_text'], company=state['company'])
+            analysis = state['plan_analysis'] if leverage else f"{state['competitor_research']}\n{state['plan_analysis']}"
+            return script_fields("TELECOM", state['company'], state['amount'], leverage=leverage, analysis=analysis)
         
         # Add nodes
-        workflow.add_node("analyze_plan", analyze_plan)
-        workflow.add_node("research", research_competitors)
-        workflow.add_node("script", create_negotiation_script)
+        workflow.add_node("recall", recall_node(self.recall, "TELECOM"))
+        workflow.add_node("analyze_plan", llm_node(self.llm, analyze_plan, "plan_analysis",
+                                                   recall=self.recall, bill_type="TELECOM"))
+        workflow.add_node("research", competitor_node(
+            self.rates, "TELECOM", "competitor_research",
+            fallback=llm_node(self.llm, research_competitors, "competitor_research")
+        ))
+        workflow.add_node("script", script_node(
+            self.llm, get_script_template("TELECOM"), script_values, "negotiation_script",
+            max_tokens=self.script_max_tokens, budget=budget
+        ))
         
-        # Define edges
-        workflow.add_edge("analyze_plan", "research")
-        workflow.add_edge("research", "script")
+        # Plan analysis and competitor research both work from the raw bill,
+        # so they run in parallel and the script waits for both; the plan
+        # analysis waits for the recalled strategies, which may replace it,
+        # and the research is a local rate lookup unless the store has none
+        workflow.add_edge(START, "recall")
+        workflow.add_edge("recall", "analyze_plan")
+        workflow.add_edge(START, "research")
+        workflow.add_edge(["analyze_plan", "research"], "script")
         workflow.add_edge("script", END)
-        workflow.set_entry_point("analyze_plan")
         
-        return workflow.compile()
\ No newline at end of file
+        return compile_graph(workflow, self.max_concurrency, "TELECOM")
\ No newline at end of file
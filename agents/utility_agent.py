@@ -1,30 +1,48 @@
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
 from langchain.memory import ConversationBufferMemory
 from typing import TypedDict
 
+from llm.clients import get_chat_model
+from llm.prompts import fill_prompt, prompt_budget
+from memory.strategies import StrategyRecall, get_strategy_recall
+from tools.competitor_rates import CompetitorRateStore, get_competitor_rate_store
+from agents.scripts import get_script_template, script_fields, script_max_tokens
+from agents.nodes import llm_node, recall_node, script_node, competitor_context, compile_graph, specialist_max_concurrency
+
 class UtilityState(TypedDict):
     ocr_text: str
     company: str
     amount: float
+    region: str
     negotiation_strategy: str
     script: str
     usage_analysis: str
+    past_strategies: str
+    reused_strategy: str
 
 class UtilityNegotiationGraph:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4-turbo-preview", temperature=0.3)
+    def __init__(self, llm=None, max_concurrency: int = None, token_budget: int = None,
+                 recall: StrategyRecall = None, rates: CompetitorRateStore = None,
+                 script_tokens: int = None):
+        self.llm = llm or get_chat_model("openai", "gpt-4-turbo-preview", 0.3)
+        self.max_concurrency = max_concurrency or specialist_max_concurrency("UTILITY")
+        self.token_budget = token_budget if token_budget is not None else prompt_budget("UTILITY")
+        self.recall = recall or get_strategy_recall()
+        self.rates = rates or get_competitor_rate_store()
+        self.script_max_tokens = script_tokens if script_tokens is not None else script_max_tokens("UTILITY")
         self.memory = ConversationBufferMemory()
     
     def build_graph(self):
         workflow = StateGraph(UtilityState)
+        budget = self.token_budget
         
         def analyze_history(state):
             """Analyze usage patterns and historical data"""
-            prompt = f"""
+            return fill_prompt("""
             Analyze this utility bill for negotiation opportunities:
-            Bill: {state['ocr_text']}
-            
+            Bill: {bill}
+            {history}
+            {competitors}
             Focus on:
             1. Seasonal usage patterns and trends
             2. Competitor rates in the area
@@ -34,48 +52,33 @@ class UtilityNegotiationGraph:
             6. Budget billing options
             
             Provide a detailed negotiation strategy with specific talking points.
-            """
-            response = self.llm.invoke(prompt)
-            state['negotiation_strategy'] = response.content
-            return state
+            """, budget, compact=["bill"], bill=state['ocr_text'], history=state.get('past_strategies', ''),
+                competitors=competitor_context(self.rates, "UTILITY", state))
         
-        def generate_script(state):
-            """Generate negotiation script based on analysis"""
-            proven_scripts = [
-                "I've been a loyal customer for X years and I'm hoping we can work together to find a better rate.",
-                "I see that [competitor] is offering [specific deal]. Can you match or beat that offer?",
-                "I'm considering switching providers because the cost has become too high for my budget.",
-                "Are there any energy efficiency programs or budget billing options that could help reduce my costs?",
-                "I've noticed my usage has been consistent - is there a loyalty discount available?"
-            ]
-            
-            prompt = f"""
-            Create a comprehensive negotiation script for this utility bill:
-            Strategy: {state['negotiation_strategy']}
-            
-            Use these proven templates as inspiration:
-            {chr(10).join(proven_scripts)}
-            
-            Generate a complete negotiation dialogue with:
-            1. Opening statement
-            2. Key negotiation points
-            3. Competitor comparisons
-            4. Fallback positions
-            5. Closing statements
-            
-            Make it conversational and professional.
-            """
-            response = self.llm.invoke(prompt)
-            state['script'] = response.content
-            return state
+        def script_values(state):
+            """Script fields from the bill, the strategy's talking points and competitor rates"""
+            return script_fields(
+                "UTILITY", state['company'], state['amount'],
+                leverage=self.rates.leverage("UTILITY", state['amount'], state.get('region'),
+                                             text=state['ocr_text'], company=state['company']),
+                analysis=state['negotiation_strategy']
+            )
         
         # Add nodes to workflow
-        workflow.add_node("analyze", analyze_history)
-        workflow.add_node("script", generate_script)
+        workflow.add_node("recall", recall_node(self.recall, "UTILITY"))
+        workflow.add_node("analyze", llm_node(self.llm, analyze_history, "negotiation_strategy",
+                                              recall=self.recall, bill_type="UTILITY"))
+        workflow.add_node("script", script_node(
+            self.llm, get_script_template("UTILITY"), script_values, "script",
+            max_tokens=self.script_max_tokens, budget=budget
+        ))
         
         # Define edges
+        workflow.add_edge("recall", "analyze")
         workflow.add_edge("analyze", "script")
         workflow.add_edge("script", END)
-        workflow.set_entry_point("analyze")
+        workflow.set_entry_point("recall")
         
-        return workflow.compile()
\ No newline at end of file
+        # The script depends on the strategy, so this graph stays a chain;
+        # a close past strategy stands in for the analysis call
+        return compile_graph(workflow, self.max_concurrency, "UTILITY")
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+Concurrent processing of negotiation batches with NDJSON streaming
+"""
+
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from fastapi import HTTPException
+
+async def stream_batch(items: List, process: Callable[[int, object], Awaitable[dict]],
+                       concurrency: int) -> AsyncIterator[str]:
+    """Run process(index, item) concurrently and yield one NDJSON line per item
+
+    Lines are emitted in completion order, so a slow bill never holds back the
+    others; each line carries the item's index. Failures are reported per
+    item and do not abort the batch. A final summary line closes the stream.
+    If the client disconnects, outstanding items are cancelled.
+    """
+    started = time.perf_counter()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(index, item):
+        async with slots:
+            try:
+                return {"index": index, "status": "ok", "result": await process(index, item)}
+            except HTTPException as e:
+                return {"index": index, "status": "error", "status_code": e.status_code, "error": e.detail}
+            except Exception as e:
+                return {"index": index, "status": "error", "status_code": 500, "error": str(e)}
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            succeeded += line["status"] == "ok"
+            yield json.dumps(line) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield json.dumps({
+        "summary": {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }
+    }) + "\n"
@@ -0,0 +1,231 @@
+"""
+Background negotiation jobs with SQLite-persisted status and node progress
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+class JobStore:
+    """Persists negotiation status, per-node progress and final results
+
+    Every orchestrator node completion is appended as an event, so
+    GET /api/v1/negotiation/{id} can report real progress and clients can
+    reconnect to a long-running negotiation at any point.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("JOB_DB_PATH", "./data/negotiations.sqlite3")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS negotiations (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                user_id TEXT,
+                company TEXT,
+                current_node TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS negotiation_events (
+                negotiation_id TEXT NOT NULL,
+                node TEXT NOT NULL,
+                state TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS negotiation_events_id ON negotiation_events (negotiation_id);
+        """)
+        self._db.commit()
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def create(self, negotiation_id: str, user_id: str = None, company: str = None, status: str = "queued"):
+        now = time.time()
+        self._write(
+            "INSERT OR REPLACE INTO negotiations (id, status, user_id, company, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (negotiation_id, status, user_id, company, now, now)
+        )
+
+    def set_status(self, negotiation_id: str, status: str):
+        self._write(
+            "UPDATE negotiations SET status = ?, updated_at = ? WHERE id = ?",
+            (status, time.time(), negotiation_id)
+        )
+
+    def record_node(self, negotiation_id: str, node: str, state: Dict = None):
+        """Record that an orchestrator node finished, with its state update"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO negotiation_events (negotiation_id, node, state, created_at) VALUES (?, ?, ?, ?)",
+                (negotiation_id, node, json.dumps(state, default=str) if state is not None else None, now)
+            )
+            self._db.execute(
+                "UPDATE negotiations SET status = 'running', current_node = ?, updated_at = ? WHERE id = ?",
+                (node, now, negotiation_id)
+            )
+            self._db.commit()
+
+    def complete(self, negotiation_id: str, result: Dict):
+        self._write(
+            "UPDATE negotiations SET status = 'completed', result = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(result, default=str), time.time(), negotiation_id)
+        )
+
+    def fail(self, negotiation_id: str, error: str):
+        self._write(
+            "UPDATE negotiations SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+            (error, time.time(), negotiation_id)
+        )
+
+    def fail_interrupted(self):
+        """Mark jobs left queued/running by a previous process as failed"""
+        self._write(
+            "UPDATE negotiations SET status = 'failed', error = ?, updated_at = ? "
+            "WHERE status IN ('queued', 'running')",
+            ("Interrupted by server restart", time.time())
+        )
+
+    def get(self, negotiation_id: str, include_states: bool = False) -> Optional[Dict]:
+        """Current status, completed nodes and (when finished) the result"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, user_id, company, current_node, result, error, created_at, updated_at "
+                "FROM negotiations WHERE id = ?",
+                (negotiation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            events = self._db.execute(
+                "SELECT node, state, created_at FROM negotiation_events "
+                "WHERE negotiation_id = ? ORDER BY rowid",
+                (negotiation_id,)
+            ).fetchall()
+
+        progress: List[Dict] = []
+        for node, state, created_at in events:
+            event = {"node": node, "completed_at": created_at}
+            if include_states and state is not None:
+                event["state"] = json.loads(state)
+            progress.append(event)
+
+        return {
+            "negotiation_id": row[0],
+            "status": row[1],
+            "user_id": row[2],
+            "company": row[3],
+            "current_node": row[4],
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+            "progress": progress
+        }
+
+    def routed_bills(self, limit: int = 5000, tier: str = "llm") -> List[Tuple[str, str, str]]:
+        """(bill text, company, bill type) routed by the most recent completed negotiations
+
+        Only decisions made by the given routing tier are returned; by
+        default the LLM router's, so the local classifier is never trained
+        on its own (possibly wrong) answers. Negotiations recorded before
+        routing_tier existed were all routed by the LLM.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT e.state FROM negotiation_events e JOIN negotiations n ON n.id = e.negotiation_id "
+                "WHERE e.node = 'route' AND e.state IS NOT NULL AND n.status = 'completed' "
+                "AND COALESCE(json_extract(e.state, '$.routing_tier'), 'llm') = ? "
+                "ORDER BY e.created_at DESC LIMIT ?",
+                (tier, limit)
+            ).fetchall()
+
+        bills = []
+        for (state,) in rows:
+            state = json.loads(state)
+            bill_data = state.get("bill_data") or {}
+            if bill_data.get("text") and state.get("agent_decision"):
+                bills.append((bill_data["text"], bill_data.get("company"), state["agent_decision"]))
+        return bills
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue cannot accept more work"""
+
+class JobQueue:
+    """Bounded queue drained by a fixed pool of asyncio worker tasks
+
+    Submissions return immediately; workers run each job's coroutine and
+    record failures in the JobStore. A full queue raises JobQueueFullError
+    so the API can shed load with 503 instead of buffering without bound.
+    """
+
+    def __init__(self, store: JobStore, workers: int = None, max_size: int = None):
+        self.store = store
+        self.workers = workers or int(os.getenv("JOB_WORKERS", 8))
+        self.max_size = max_size or int(os.getenv("JOB_QUEUE_SIZE", 1000))
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._active = 0
+
+    async def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; unfinished jobs are failed on next startup"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, negotiation_id: str, run: Callable[[], Awaitable[None]]):
+        """Queue a job; run() is awaited later by a worker"""
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() has not been called")
+        try:
+            self._queue.put_nowait((negotiation_id, run))
+        except asyncio.QueueFull:
+            raise JobQueueFullError(f"Job queue is full ({self.max_size} jobs)")
+
+    async def _worker(self):
+        while True:
+            negotiation_id, run = await self._queue.get()
+            self._active += 1
+            try:
+                await run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                await asyncio.to_thread(self.store.fail, negotiation_id, str(detail))
+            finally:
+                self._active -= 1
+                self._queue.task_done()
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "active": self._active,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size
+        }
@@ -1,14 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Depends
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import base64
+import hmac
 import uuid
-from typing import Optional
-import pytesseract
-from PIL import Image
-import io
+from datetime import datetime, timezone
+from typing import List, Optional
+import os
+import asyncio
 
-from orchestrator import create_master_orchestrator
+from graph_registry import get_registry
+from agents.bill_classifier import BILL_TYPES, get_bill_classifier, retrain_bill_classifier
 from memory.vector_store import NegotiationMemory
+from memory.strategies import StrategyRecall, get_strategy_recall, set_strategy_recall
+from tools.competitor_rates import get_competitor_rate_store
+from ocr.executor import OCRExecutor, OCRBusyError, OCRTimeoutError
+from ocr.cache import OCRCache
+from ocr.extraction import EXTRACTION_VERSION, BillData, extract_bill_data
+from llm.cache import get_llm_cache
+from llm.clients import get_client_factory
+from llm.prompts import get_prompt_stats
+from tracing import get_tracer
+from api.uploads import UploadSizeLimitMiddleware, read_upload, MAX_UPLOAD_BYTES
+from api.batch import stream_batch
+from api.streaming import negotiation_events, sse_event
+from api.jobs import JobStore, JobQueue, JobQueueFullError
 
 app = FastAPI(
     title="Hagglz Negotiation API",
@@ -16,8 +32,91 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Batch endpoint limits
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 500))
+MAX_BATCH_BYTES = int(float(os.getenv("MAX_BATCH_MB", 100)) * 1024 * 1024)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 16))
+
+# Reject oversized uploads before their bodies are buffered
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=MAX_UPLOAD_BYTES,
+    paths=["/api/v1/negotiate/upload"]
+)
+# Batch bodies are bounded before pydantic decodes them and counts the bills
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=MAX_BATCH_BYTES,
+    paths=["/api/v1/negotiate/batch"]
+)
+
+# Token required in the X-Admin-Token header by /api/v1/admin endpoints,
+# which are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Rolling windows (days) reported by /api/v1/stats next to all-time figures
+STATS_WINDOWS = [int(days) for days in os.getenv("STATS_WINDOWS", "7,30").split(",") if days.strip()]
+
 # Initialize components
 memory = NegotiationMemory()
+# Specialist graphs recall past successful strategies from this memory
+set_strategy_recall(StrategyRecall(memory))
+graphs = get_registry()
+ocr_executor = OCRExecutor()
+ocr_cache = OCRCache()
+jobs = JobStore()
+job_queue = JobQueue(jobs)
+
+@app.on_event("startup")
+async def warm_up_graphs():
+    """Compile all negotiation graphs before serving traffic"""
+    graphs.warm_up()
+
+@app.on_event("startup")
+async def train_bill_classifier():
+    """Train the routing classifier on the seed examples and past LLM routing decisions"""
+    await asyncio.to_thread(get_bill_classifier)
+
+@app.on_event("startup")
+async def load_competitor_rates():
+    """Load the competitor rate table and start watching it for changes"""
+    await asyncio.to_thread(get_competitor_rate_store().load)
+
+@app.on_event("startup")
+async def start_job_workers():
+    """Start background negotiation workers"""
+    jobs.fail_interrupted()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_ocr_workers():
+    """Terminate the OCR worker processes"""
+    ocr_executor.shutdown()
+
+@app.on_event("shutdown")
+async def stop_competitor_rate_checks():
+    """Stop watching the competitor rate table"""
+    await asyncio.to_thread(get_competitor_rate_store().close)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    """Stop background negotiation workers"""
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+async def flush_negotiation_memory():
+    """Write buffered negotiations to the vector store"""
+    await asyncio.to_thread(memory.close)
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    """Close the pooled LLM HTTP connections"""
+    await get_client_factory().aclose()
+
+@app.on_event("shutdown")
+async def flush_traces():
+    """Export spans still buffered by the tracer"""
+    await asyncio.to_thread(get_tracer().close)
 
 class NegotiationRequest(BaseModel):
     bill_image: str  # Base64 encoded image
@@ -25,6 +124,9 @@ class NegotiationRequest(BaseModel):
     target_savings: Optional[float] = None
     company_name: Optional[str] = None
 
+class BatchNegotiationRequest(BaseModel):
+    bills: List[NegotiationRequest]
+
 class NegotiationResponse(BaseModel):
     negotiation_id: str
     status: str
@@ -35,37 +137,143 @@ class NegotiationResponse(BaseModel):
     execution_mode: str
     script: Optional[str] = None
 
-def process_ocr(image_data: bytes) -> str:
-    """Extract text from bill image using OCR"""
+async def process_ocr(image_data: bytes) -> str:
+    """Extract text from bill image using the OCR worker pool"""
     try:
-        image = Image.open(io.BytesIO(image_data))
-        # Use pytesseract to extract text
-        text = pytesseract.image_to_string(image)
-        return text.strip()
+        return await ocr_executor.submit(image_data)
+    except OCRBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="OCR service is at capacity, please retry",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except OCRTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"OCR processing failed: {str(e)}")
 
-def extract_bill_amount(ocr_text: str) -> float:
-    """Extract bill amount from OCR text"""
-    import re
+async def read_bill(image_data: bytes) -> tuple:
+    """OCR a bill image and parse its fields, reusing results for repeat uploads"""
+    # Hashing the image and the SQLite lookup stay off the event loop
+    cached = await asyncio.to_thread(ocr_cache.get, image_data)
+    if cached is not None:
+        # Entries parsed by an older extractor are re-parsed from the cached text
+        if cached.get("extraction") == EXTRACTION_VERSION:
+            return cached["text"], cached["bill"]
+        return cached["text"], extract_bill_data(cached["text"])
+    
+    ocr_text = await process_ocr(image_data)
+    bill = extract_bill_data(ocr_text)
+    
+    # Blank results are not cached so a better photo of the same bill is retried
+    if ocr_text:
+        await asyncio.to_thread(ocr_cache.put, image_data, {
+            "text": ocr_text, "amount": bill["amount"], "bill": bill, "extraction": EXTRACTION_VERSION
+        })
+    return ocr_text, bill
+
+async def negotiate_bill(image_data: bytes, user_id: str, company_name: Optional[str] = None) -> NegotiationResponse:
+    """Run OCR and the negotiation workflow for one bill image"""
+    # Process OCR on the worker pool (or the cache) and extract bill fields
+    ocr_text, bill = await read_bill(image_data)
+    return await negotiate_text(ocr_text, bill, user_id, company_name)
+
+async def run_workflow(negotiation_id: str, negotiation_input: dict) -> dict:
+    """Run the orchestrator, persisting each node's update as it completes"""
+    # Shared orchestrator compiled once per process
+    orchestrator = graphs.get("orchestrator")
+    
+    result = None
+    async for mode, chunk in orchestrator.astream(negotiation_input, stream_mode=["updates", "values"]):
+        if mode == "values":
+            result = chunk
+            continue
+        for node, update in chunk.items():
+            await asyncio.to_thread(jobs.record_node, negotiation_id, node, update)
+    return result
+
+def build_negotiation_input(ocr_text: str, bill: BillData, user_id: str,
+                            company_name: Optional[str] = None) -> dict:
+    """Initial orchestrator state for one bill
+    
+    bill_data carries the extracted fields next to the raw text; a company
+    name given by the user overrides the extracted one.
+    """
+    if not ocr_text:
+        raise HTTPException(status_code=400, detail="Could not extract text from image")
+    
+    confidence = dict(bill["confidence"])
+    if company_name:
+        confidence["company"] = 1.0
+    return {
+        "bill_data": {
+            **bill,
+            "text": ocr_text,
+            "user_id": user_id,
+            "company": company_name or bill["company"] or "Unknown",
+            "confidence": confidence
+        },
+        "messages": []
+    }
+
+async def finish_negotiation(negotiation_id: str, negotiation_input: dict, result: dict) -> NegotiationResponse:
+    """Learn from a finished workflow run and persist its response"""
+    outcome = {
+        "company": negotiation_input["bill_data"]["company"],
+        # The analysis is what recall reuses; telecom and subscription
+        # strategies are scripts quoting this bill's amount
+        "strategy": result["negotiation_result"].get("analysis", ""),
+        "bill_type": result.get("agent_decision", "UNKNOWN"),
+        "amount": negotiation_input["bill_data"]["amount"],
+        "savings": result["negotiation_result"].get("estimated_savings", 0),
+        "confidence": result.get("confidence_score", 0),
+        "success": result.get("confidence_score", 0) > 0.7,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    # Store successful negotiation in memory for learning; every outcome
+    # counts towards the statistics
+    if outcome["success"]:
+        await asyncio.to_thread(memory.store_negotiation, outcome)
+        get_strategy_recall().invalidate(outcome["bill_type"], outcome["company"])
+    else:
+        await asyncio.to_thread(memory.record_outcome, outcome)
     
-    # Look for common bill amount patterns
-    patterns = [
-        r'amount due[:\s]*\$?(\d+\.?\d*)',
-        r'total[:\s]*\$?(\d+\.?\d*)',
-        r'balance[:\s]*\$?(\d+\.?\d*)',
-        r'\$(\d+\.?\d*)'
-    ]
+    response = NegotiationResponse(
+        negotiation_id=negotiation_id,
+        status=result["negotiation_result"].get("status", "completed"),
+        agent_type=result.get("agent_decision", "UNKNOWN"),
+        strategy=result["negotiation_result"].get("strategy", ""),
+        estimated_savings=result["negotiation_result"].get("estimated_savings", 0),
+        confidence=result.get("confidence_score", 0),
+        execution_mode=result.get("execution_mode", "supervised"),
+        script=result["negotiation_result"].get("details", {}).get("script")
+    )
+    await asyncio.to_thread(jobs.complete, negotiation_id, response.model_dump())
+    return response
+
+async def negotiate_text(ocr_text: str, bill: BillData, user_id: str,
+                         company_name: Optional[str] = None,
+                         negotiation_id: Optional[str] = None) -> NegotiationResponse:
+    """Run the negotiation workflow on already extracted bill text
     
-    for pattern in patterns:
-        matches = re.findall(pattern, ocr_text.lower())
-        if matches:
-            try:
-                return float(matches[0])
-            except ValueError:
-                continue
+    Progress and the final result are persisted in the job store under
+    negotiation_id (a new ID is created for synchronous requests).
+    """
+    if negotiation_id is None:
+        # Generate unique negotiation ID
+        negotiation_id = str(uuid.uuid4())
+        await asyncio.to_thread(jobs.create, negotiation_id, user_id, company_name, "running")
     
-    return 0.0
+    try:
+        negotiation_input = build_negotiation_input(ocr_text, bill, user_id, company_name)
+        
+        # Execute negotiation workflow with async LLM calls
+        result = await run_workflow(negotiation_id, negotiation_input)
+        
+        return await finish_negotiation(negotiation_id, negotiation_input, result)
+    except Exception as e:
+        await asyncio.to_thread(jobs.fail, negotiation_id, str(getattr(e, "detail", None) or e))
+        raise
 
 @app.post("/api/v1/negotiate", response_model=NegotiationResponse)
 async def start_negotiation(request: NegotiationRequest):
@@ -74,90 +282,216 @@ async def start_negotiation(request: NegotiationRequest):
         # Decode base64 image
         image_data = base64.b64decode(request.bill_image)
         
-        # Process OCR
-        ocr_text = process_ocr(image_data)
-        
-        if not ocr_text:
-            raise HTTPException(status_code=400, detail="Could not extract text from image")
-        
-        # Extract bill amount
-        bill_amount = extract_bill_amount(ocr_text)
+        return await negotiate_bill(image_data, request.user_id, request.company_name)
         
-        # Initialize orchestrator
-        orchestrator = create_master_orchestrator()
-        
-        # Prepare negotiation input
-        negotiation_input = {
-            "bill_data": {
-                "text": ocr_text,
-                "user_id": request.user_id,
-                "amount": bill_amount,
-                "company": request.company_name or "Unknown"
-            },
-            "messages": []
-        }
-        
-        # Execute negotiation workflow
-        result = orchestrator.invoke(negotiation_input)
-        
-        # Generate unique negotiation ID
-        negotiation_id = str(uuid.uuid4())
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Negotiation failed: {str(e)}")
+
+@app.post("/api/v1/negotiate/upload", response_model=NegotiationResponse)
+async def upload_negotiation(
+    bill_image: UploadFile = File(...),
+    user_id: str = Form(...),
+    target_savings: Optional[float] = Form(None),
+    company_name: Optional[str] = Form(None)
+):
+    """Start a negotiation from a multipart image upload
+    
+    The image is spooled to a temporary file while the body is parsed
+    (oversized bodies are rejected by UploadSizeLimitMiddleware) and read
+    once into the bytes handed to OCR, avoiding the JSON + base64 copies.
+    """
+    try:
+        if bill_image.content_type and not bill_image.content_type.startswith("image/"):
+            raise HTTPException(status_code=415, detail="bill_image must be an image")
         
-        # Store successful negotiation in memory for learning
-        if result.get("confidence_score", 0) > 0.7:
-            memory.store_negotiation({
-                "company": negotiation_input["bill_data"]["company"],
-                "strategy": result["negotiation_result"].get("strategy", ""),
-                "bill_type": result.get("agent_decision", "UNKNOWN"),
-                "amount": bill_amount,
-                "confidence": result.get("confidence_score", 0),
-                "success": True,
-                "timestamp": str(uuid.uuid4())  # In production, use actual timestamp
-            })
+        image_data = await read_upload(bill_image, MAX_UPLOAD_BYTES)
         
-        return NegotiationResponse(
-            negotiation_id=negotiation_id,
-            status=result["negotiation_result"].get("status", "completed"),
-            agent_type=result.get("agent_decision", "UNKNOWN"),
-            strategy=result["negotiation_result"].get("strategy", ""),
-            estimated_savings=result["negotiation_result"].get("estimated_savings", 0),
-            confidence=result.get("confidence_score", 0),
-            execution_mode=result.get("execution_mode", "supervised"),
-            script=result["negotiation_result"].get("details", {}).get("script")
-        )
+        return await negotiate_bill(image_data, user_id, company_name)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Negotiation failed: {str(e)}")
+    finally:
+        await bill_image.close()
 
-@app.get("/api/v1/negotiation/{negotiation_id}")
-async def get_negotiation_status(negotiation_id: str):
-    """Get negotiation status and results"""
-    # In production, this would retrieve from a database
+@app.post("/api/v1/negotiate/batch")
+async def batch_negotiation(request: BatchNegotiationRequest):
+    """Negotiate many bills in one call, streaming NDJSON results as they complete
+    
+    OCR runs in parallel up to the OCR pool size and the LLM workflows
+    (router plus specialist) run concurrently up to BATCH_CONCURRENCY.
+    Bodies over MAX_BATCH_MB are refused by UploadSizeLimitMiddleware before
+    they are parsed.
+    """
+    if len(request.bills) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batches are limited to {MAX_BATCH_SIZE} bills")
+    
+    ocr_slots = asyncio.Semaphore(ocr_executor.max_workers)
+    llm_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def process(index: int, bill: NegotiationRequest) -> dict:
+        try:
+            image_data = base64.b64decode(bill.bill_image, validate=True)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bill_image is not valid base64")
+        async with ocr_slots:
+            ocr_text, bill_data = await read_bill(image_data)
+        async with llm_slots:
+            response = await negotiate_text(ocr_text, bill_data, bill.user_id, bill.company_name)
+        return response.model_dump()
+    
+    # Items wait on the OCR/LLM semaphores, so every bill can be scheduled at once
+    return StreamingResponse(
+        stream_batch(request.bills, process, concurrency=len(request.bills) or 1),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/api/v1/negotiate/stream")
+async def stream_negotiation(request: NegotiationRequest):
+    """Negotiate a bill, streaming progress as server-sent events
+    
+    After OCR the response opens immediately and emits: node_start/node_end
+    for each graph node, routing (the chosen specialist), token for each
+    strategy/script token as the LLM produces it, confidence (score and
+    execution mode) and finally result with the full NegotiationResponse.
+    A failure mid-stream is reported as an error event.
+    """
+    try:
+        image_data = base64.b64decode(request.bill_image, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bill_image is not valid base64")
+    
+    # OCR failures still map to proper HTTP status codes before the stream opens
+    ocr_text, bill = await read_bill(image_data)
+    negotiation_input = build_negotiation_input(ocr_text, bill, request.user_id, request.company_name)
+    
+    negotiation_id = str(uuid.uuid4())
+    await asyncio.to_thread(jobs.create, negotiation_id, request.user_id, request.company_name, "running")
+    
+    async def events():
+        yield sse_event("negotiation", {"negotiation_id": negotiation_id})
+        try:
+            async for event, data in negotiation_events(graphs.get("orchestrator"), negotiation_input):
+                if event == "state":
+                    response = await finish_negotiation(negotiation_id, negotiation_input, data)
+                    yield sse_event("result", response.model_dump())
+                    continue
+                if event == "node_end" and len(data["path"]) == 1:
+                    await asyncio.to_thread(jobs.record_node, negotiation_id, data["node"])
+                yield sse_event(event, data)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(jobs.fail, negotiation_id, "Client disconnected")
+            raise
+        except Exception as e:
+            await asyncio.to_thread(jobs.fail, negotiation_id, str(e))
+            yield sse_event("error", {"error": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/v1/negotiate/async", status_code=202)
+async def submit_negotiation(request: NegotiationRequest):
+    """Queue a bill negotiation and return its ID without waiting for the result
+    
+    Poll GET /api/v1/negotiation/{negotiation_id} for progress and results.
+    """
+    try:
+        image_data = base64.b64decode(request.bill_image, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bill_image is not valid base64")
+    
+    negotiation_id = str(uuid.uuid4())
+    await asyncio.to_thread(jobs.create, negotiation_id, request.user_id, request.company_name)
+    
+    async def run():
+        ocr_text, bill = await read_bill(image_data)
+        await asyncio.to_thread(jobs.record_node, negotiation_id, "ocr", {"amount": bill["amount"]})
+        await negotiate_text(ocr_text, bill, request.user_id, request.company_name,
+                             negotiation_id=negotiation_id)
+    
+    try:
+        job_queue.submit(negotiation_id, run)
+    except JobQueueFullError as e:
+        await asyncio.to_thread(jobs.fail, negotiation_id, str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
     return {
         "negotiation_id": negotiation_id,
-        "status": "completed",
-        "message": "Negotiation results available"
+        "status": "queued",
+        "status_url": f"/api/v1/negotiation/{negotiation_id}"
     }
 
+@app.get("/api/v1/negotiation/{negotiation_id}")
+async def get_negotiation_status(negotiation_id: str, include_states: bool = False):
+    """Get negotiation status, node-by-node progress and results"""
+    record = await asyncio.to_thread(jobs.get, negotiation_id, include_states)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Negotiation not found")
+    return record
+
 @app.get("/api/v1/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "hagglz-negotiation-api"}
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject admin requests without the configured ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.post("/api/v1/admin/graphs/reload", dependencies=[Depends(require_admin)])
+def reload_graphs():
+    """Recompile the negotiation graphs without restarting the process
+    
+    The bill classifier is retrained too, picking up bills routed since startup,
+    and the competitor rate table is reloaded without waiting for its next check.
+    Agent modules are not re-imported over HTTP; that is GraphRegistry.reload's
+    reload_modules option, for in-process use only.
+    """
+    result = graphs.reload()
+    result["classifier_trained_on"] = retrain_bill_classifier().stats()["model_trained_on"]
+    result["competitor_rates"] = get_competitor_rate_store().reload()
+    return result
+
 @app.get("/api/v1/stats")
 async def get_stats():
-    """Get negotiation statistics"""
+    """Get negotiation statistics
+    
+    Totals, success rates and savings are read from running aggregates
+    (all time and per STATS_WINDOWS window), never by scanning the memory.
+    """
     return {
-        "total_negotiations": 1000,  # Placeholder
-        "average_savings": {
-            "UTILITY": memory.get_average_savings("UTILITY"),
-            "MEDICAL": memory.get_average_savings("MEDICAL"),
-            "SUBSCRIPTION": memory.get_average_savings("SUBSCRIPTION"),
-            "TELECOM": memory.get_average_savings("TELECOM")
-        },
-        "success_rate": memory.get_success_rate()
+        "total_negotiations": memory.aggregates.totals()["negotiations"],
+        "average_savings": {bill_type: memory.get_average_savings(bill_type) for bill_type in BILL_TYPES},
+        "success_rate": memory.get_success_rate(),
+        "negotiation_stats": memory.aggregates.stats(windows=STATS_WINDOWS, bill_types=BILL_TYPES),
+        "memory_writes": memory.write_stats(),
+        "strategy_recall": get_strategy_recall().stats(),
+        "competitor_rates": get_competitor_rate_store().stats(),
+        "graphs": graphs.stats(),
+        "ocr": ocr_executor.metrics(),
+        "ocr_cache": ocr_cache.stats(),
+        "llm_cache": get_llm_cache().stats(),
+        "llm_clients": get_client_factory().metrics(),
+        "prompt_tokens": get_prompt_stats().stats(),
+        "routing": get_bill_classifier().stats(),
+        "jobs": job_queue.stats(),
+        "tracing": get_tracer().stats()
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-node and per-LLM-call latency, token and cost metrics in the Prometheus text format"""
+    return PlainTextResponse(get_tracer().prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
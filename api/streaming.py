@@ -0,0 +1,74 @@
+"""
+Server-sent-events streaming of a negotiation run
+"""
+
+import json
+from typing import AsyncIterator, Tuple
+
+# Top-level orchestrator node whose completion carries the routing decision
+ROUTE_NODE = "route"
+# Top-level orchestrator node whose completion carries confidence and mode
+EVALUATE_NODE = "evaluate"
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def node_path(metadata: dict) -> list:
+    """Graph nodes from the orchestrator down to the current node, e.g. ["execute", "script"]"""
+    namespace = metadata.get("langgraph_checkpoint_ns") or ""
+    return [part.split(":")[0] for part in namespace.split("|") if part]
+
+async def negotiation_events(orchestrator, negotiation_input: dict) -> AsyncIterator[Tuple[str, dict]]:
+    """Translate a LangGraph event stream into negotiation events
+
+    Yields (event, data) pairs: node_start/node_end for every graph node
+    (including specialist subgraph nodes), routing once the router has
+    decided, token for each specialist LLM token as it arrives, and
+    confidence once the result has been scored. The last pair is
+    ("state", final_state) for the caller to persist; it is not meant to
+    be forwarded to clients.
+    """
+    final_state = None
+    async for event in orchestrator.astream_events(negotiation_input, version="v2"):
+        kind = event["event"]
+        metadata = event.get("metadata", {})
+        node = metadata.get("langgraph_node")
+
+        if not event.get("parent_ids"):
+            if kind == "on_chain_end":
+                final_state = event["data"].get("output")
+            continue
+
+        path = node_path(metadata)
+        if kind == "on_chat_model_stream":
+            # Router tokens are a single label; the routing event replaces them
+            if path and path[0] != ROUTE_NODE:
+                text = event["data"]["chunk"].content
+                if text:
+                    yield "token", {"node": node, "path": path, "text": text}
+            continue
+
+        # Only node runs themselves, not the runnables and subgraphs inside them
+        if event["name"] != node or kind not in ("on_chain_start", "on_chain_end"):
+            continue
+
+        if kind == "on_chain_start":
+            yield "node_start", {"node": node, "path": path}
+            continue
+
+        yield "node_end", {"node": node, "path": path}
+        if len(path) == 1:
+            output = event["data"].get("output") or {}
+            if node == ROUTE_NODE:
+                yield "routing", {
+                    "agent_type": output.get("agent_decision", "UNKNOWN"),
+                    "tier": output.get("routing_tier", "llm")
+                }
+            elif node == EVALUATE_NODE:
+                yield "confidence", {
+                    "confidence": output.get("confidence_score", 0),
+                    "execution_mode": output.get("execution_mode", "supervised")
+                }
+
+    yield "state", final_state
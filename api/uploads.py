@@ -0,0 +1,84 @@
+"""
+Size-limited handling of multipart bill uploads
+"""
+
+import os
+from typing import Iterable
+
+from fastapi import HTTPException, UploadFile
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", 10)) * 1024 * 1024)
+
+# Room for multipart boundaries and the small form fields around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the {max_bytes // (1024 * 1024)}MB limit"
+    )
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware that stops oversized request bodies early
+
+    A declared Content-Length over the limit is refused before any of the
+    body is read; chunked bodies are counted as they stream in and aborted
+    as soon as they cross the limit, so the multipart parser never spools
+    more than max_bytes to disk.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_body_bytes = max_bytes + MULTIPART_OVERHEAD_BYTES
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and int(content_length) > self.max_body_bytes:
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"connection", b"close")]
+            })
+            await send({"type": "http.response.body", "body": b'{"detail":"Upload too large"}'})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Raised inside the request handler, so FastAPI renders it
+                    raise too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+async def read_upload(upload: UploadFile, max_bytes: int) -> bytes:
+    """Read an uploaded file into a single bytes object, enforcing max_bytes"""
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large(max_bytes)
+
+    # Known size: one read straight from the spooled file, no extra copies
+    if upload.size is not None:
+        return await upload.read()
+
+    chunks = []
+    total = 0
+    while chunk := await upload.read(READ_CHUNK_BYTES):
+        total += len(chunk)
+        if total > max_bytes:
+            raise too_large(max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
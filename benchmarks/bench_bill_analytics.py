@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Bill-history analytics at 1M bill rows: the previous analyze_bill_patterns
+(mean and first-versus-last trend, one customer at a time), the new
+single-customer analyze_bill_patterns called per account, and one
+vectorized analyze_bill_histories call over every account.
+
+Accounts get a bill type with its own month-of-year seasonality, a linear
+trend, noise and occasional one-off spikes, so the batch results can be
+checked: the share of injected spikes flagged as anomalies, and how close
+the recovered seasonal indices are to the true ones.
+
+Usage: python benchmarks/bench_bill_analytics.py [--rows 1000000] [--months 40] [--per-account-sample 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.bill_analytics import analyze_bill_histories, analyze_bill_patterns, month_label
+
+BILL_TYPES = np.array(["UTILITY", "TELECOM", "SUBSCRIPTION", "MEDICAL"], dtype=object)
+SEASONS = np.array([
+    [1.3, 1.2, 1.0, 0.85, 0.8, 0.95, 1.25, 1.3, 1.0, 0.8, 0.85, 1.2],  # heating and cooling
+    [1.0] * 12,
+    [1.0] * 11 + [1.15],                                                # holiday upgrades
+    [1.0, 1.2, 1.1, 1.0, 1.0, 0.9, 0.9, 1.0, 1.0, 1.0, 0.9, 1.0]        # deductible resets
+])
+
+def legacy_analyze(bill_history: list) -> dict:
+    """The previous analyze_bill_patterns"""
+    amounts = [bill.get('amount', 0) for bill in bill_history]
+    avg_amount = sum(amounts) / len(amounts) if amounts else 0
+    return {
+        "average_monthly": round(avg_amount, 2),
+        "trend": "increasing" if amounts[-1] > amounts[0] else "stable",
+        "seasonal_patterns": "Higher usage in summer/winter months"
+    }
+
+def generate(rows: int, months: int, rng: np.random.Generator):
+    accounts = rows // months
+    account = np.repeat(np.arange(accounts), months)
+    kind = rng.integers(0, len(BILL_TYPES), accounts)
+    start = 2020 * 12 + rng.integers(0, 24, accounts)
+    month = start[account] + np.tile(np.arange(months), accounts)
+    base = rng.uniform(30, 300, accounts)
+    trend = rng.normal(0.004, 0.006, accounts)
+    step = np.tile(np.arange(months), accounts)
+    amount = (base[account] * (1 + trend[account] * step) * SEASONS[kind[account], month % 12]
+              * rng.normal(1, 0.03, len(account)))
+    spiked = rng.random(len(account)) < 0.005
+    amount[spiked] *= 3
+    return account, BILL_TYPES[kind][account], month, amount, spiked, kind
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--months", type=int, default=40)
+    parser.add_argument("--per-account-sample", type=int, default=2000,
+                        help="accounts timed one by one; the per-account times are extrapolated")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(9)
+    account, bill_types, month, amount, spiked, kind = generate(args.rows, args.months, rng)
+    accounts = int(account.max()) + 1
+    print(f"{len(amount):,} bill rows, {accounts:,} accounts, {args.months} months each\n")
+
+    histories = defaultdict(list)
+    sample = set(range(min(args.per_account_sample, accounts)))
+    for i in np.flatnonzero(account < len(sample)):
+        histories[int(account[i])].append({"month": month_label(int(month[i])), "amount": float(amount[i])})
+
+    print(f"{'method':<34} {'total':>9} {'per account':>12}")
+    for label, analyze in (("previous, per account", legacy_analyze),
+                           ("analyze_bill_patterns, per account", analyze_bill_patterns)):
+        started = time.perf_counter()
+        for history in histories.values():
+            analyze(history)
+        per_account = (time.perf_counter() - started) / len(histories)
+        print(f"{label:<34} {per_account * accounts:>8.2f}s {per_account * 1e6:>10.1f}us  (extrapolated)")
+
+    started = time.perf_counter()
+    result = analyze_bill_histories(account, month, amount, bill_types)
+    elapsed = time.perf_counter() - started
+    print(f"{'analyze_bill_histories, batch':<34} {elapsed:>8.2f}s {elapsed / accounts * 1e6:>10.1f}us")
+
+    rows = result["rows"]
+    flagged = rows["anomaly"][np.argsort(np.lexsort((month, account)))]
+    caught = (flagged & spiked).sum() / spiked.sum()
+    false_alarms = (flagged & ~spiked).sum() / (~spiked).sum()
+    error = np.nanmean(np.abs(result["seasonal_index"] - SEASONS[kind] / SEASONS[kind].mean(axis=1, keepdims=True)))
+    print(f"\nspikes flagged {caught:.1%}, false alarms {false_alarms:.2%} of other bills, "
+          f"mean seasonal index error {error:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the tiered bill classifier against the labeled fixture set:
+per-tier hit rates and accuracy, per-tier latency, the expected routing
+latency once LLM fallbacks are included, and the single-pass Aho-Corasick
+keyword index versus repeated `any(word in text ...)` scans.
+
+Usage: python benchmarks/bench_bill_classifier.py [--llm-latency 0.4] [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.bill_classifier import KEYWORDS, BillClassifier, load_examples, training_examples
+
+FIXTURE_PATH = os.path.join(ROOT, "tests", "fixtures", "labeled_bills.jsonl")
+
+def naive_keyword_scan(text: str) -> Counter:
+    """The previous approach: one substring scan per keyword"""
+    text = text.lower()
+    scores = Counter()
+    for bill_type, patterns in KEYWORDS.items():
+        for pattern, weight in patterns.items():
+            if pattern in text:
+                scores[bill_type] += weight
+    return scores
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="assumed seconds per LLM routing call")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    examples = training_examples()
+    started = time.perf_counter()
+    classifier = BillClassifier.trained(examples)
+    train_ms = (time.perf_counter() - started) * 1000
+    fixture = load_examples(FIXTURE_PATH)
+    print(f"model trained on {len(examples)} bills in {train_ms:.1f}ms; {len(fixture)} labeled fixture bills\n")
+
+    hits, correct, seconds = Counter(), Counter(), Counter()
+    for text, label in fixture:
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            decision = classifier.classify(text)
+        elapsed = (time.perf_counter() - started) / args.repeat
+        tier = decision["tier"] if decision else "llm"
+        hits[tier] += 1
+        seconds[tier] += elapsed
+        correct[tier] += bool(decision) and decision["bill_type"] == label
+
+    print(f"{'tier':<8} {'hit rate':>9} {'accuracy':>9} {'avg latency':>12}")
+    for tier in ("keyword", "model", "llm"):
+        if tier == "llm":
+            accuracy, latency = "n/a", f"{args.llm_latency * 1000:.0f}ms*"
+        else:
+            accuracy = f"{correct[tier] / hits[tier]:.1%}" if hits[tier] else "n/a"
+            latency = f"{seconds[tier] / hits[tier] * 1e6:.0f}us" if hits[tier] else "n/a"
+        print(f"{tier:<8} {hits[tier] / len(fixture):>9.1%} {accuracy:>9} {latency:>12}")
+
+    fast = sum(hits[tier] for tier in ("keyword", "model"))
+    expected = (seconds["keyword"] + seconds["model"] + hits["llm"] * args.llm_latency) / len(fixture)
+    print(f"\nfast-path accuracy {(correct['keyword'] + correct['model']) / max(fast, 1):.1%} on {fast} bills")
+    print(f"expected routing latency {expected * 1000:.1f}ms vs {args.llm_latency * 1000:.0f}ms LLM-only "
+          f"(*assumed LLM latency)")
+
+    texts = [text for text, _ in fixture]
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            list(classifier.matcher.find(text))
+    automaton = (time.perf_counter() - started) / (args.repeat * len(texts))
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            naive_keyword_scan(text)
+    naive = (time.perf_counter() - started) / (args.repeat * len(texts))
+    patterns = sum(len(patterns) for patterns in KEYWORDS.values())
+    print(f"\nkeyword index ({patterns} patterns): Aho-Corasick {automaton * 1e6:.1f}us/bill, "
+          f"substring scans {naive * 1e6:.1f}us/bill")
+
+if __name__ == "__main__":
+    main()
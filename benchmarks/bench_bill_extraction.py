@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark bill field extraction on the labeled extraction fixtures:
+bills per second and amount accuracy for the previous four-regex amount
+scraper versus the single-pass BillData engine, plus the engine's
+per-field accuracy and mean confidence.
+
+Usage: python benchmarks/bench_bill_extraction.py [--repeat 500]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ocr.extraction import extract_bill_data
+
+FIXTURE_PATH = os.path.join(ROOT, "tests", "fixtures", "extraction_bills.jsonl")
+FIELDS = ("amount", "due_date", "account_number", "service_period", "company", "line_items")
+
+def regex_amount(ocr_text: str) -> float:
+    """The previous approach: four patterns, first match wins"""
+    patterns = [
+        r'amount due[:\s]*\$?(\d+\.?\d*)',
+        r'total[:\s]*\$?(\d+\.?\d*)',
+        r'balance[:\s]*\$?(\d+\.?\d*)',
+        r'\$(\d+\.?\d*)'
+    ]
+    for pattern in patterns:
+        matches = re.findall(pattern, ocr_text.lower())
+        if matches:
+            try:
+                return float(matches[0])
+            except ValueError:
+                continue
+    return 0.0
+
+def comparable(bill: dict) -> dict:
+    """Extracted fields in the fixture's expected format"""
+    period = bill["service_period"]
+    return {
+        "amount": bill["amount"],
+        "due_date": bill["due_date"],
+        "account_number": bill["account_number"],
+        "service_period": [period["start"], period["end"]] if period else None,
+        "company": bill["company"],
+        "line_items": len(bill["line_items"])
+    }
+
+def throughput(extract, texts, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            extract(text)
+    return repeat * len(texts) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(FIXTURE_PATH) as f:
+        fixtures = [json.loads(line) for line in f if line.strip()]
+    texts = [fixture["text"] for fixture in fixtures]
+
+    regex_correct = sum(abs(regex_amount(f["text"]) - f["expected"]["amount"]) < 0.005 for f in fixtures)
+    correct = {field: 0 for field in FIELDS}
+    confidence = {field: 0.0 for field in FIELDS}
+    for fixture in fixtures:
+        bill = extract_bill_data(fixture["text"])
+        extracted = comparable(bill)
+        for field in FIELDS:
+            correct[field] += extracted[field] == fixture["expected"][field]
+            confidence[field] += bill["confidence"][field]
+
+    print(f"{len(fixtures)} labeled bills, {args.repeat} passes\n")
+    print(f"{'extractor':<22} {'bills/s':>10} {'amount accuracy':>16}")
+    print(f"{'four regexes':<22} {throughput(regex_amount, texts, args.repeat):>10,.0f} "
+          f"{regex_correct / len(fixtures):>16.1%}")
+    print(f"{'single-pass BillData':<22} {throughput(extract_bill_data, texts, args.repeat):>10,.0f} "
+          f"{correct['amount'] / len(fixtures):>16.1%}")
+
+    print(f"\n{'field':<16} {'accuracy':>9} {'mean confidence':>16}")
+    for field in FIELDS:
+        print(f"{field:<16} {correct[field] / len(fixtures):>9.1%} {confidence[field] / len(fixtures):>16.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Competitor rate lookups over a large rate table: a linear scan of the rows
+(what a list of dicts or the old per-call research amounts to) versus the
+indexed RateIndex and the CompetitorRateStore.leverage path the agents use,
+plus how long the table takes to open from CSV and from a memory-mapped
+save_index directory.
+
+Each query picks a (service type, region, tier) key and a current bill
+amount and asks for the five cheapest plans and the number of plans cheaper
+than the bill.
+
+Usage: python benchmarks/bench_competitor_rates.py [--rates 1000000] [--queries 5000] [--scan-queries 50]
+"""
+
+import argparse
+import csv
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.competitor_rates import COLUMNS, CompetitorRateStore, RateIndex, load_rates, save_index
+
+SERVICES = {
+    "TELECOM": {"mobile": 55, "family": 140, "internet": 60, "gigabit": 85},
+    "UTILITY": {"electric": 0.16, "gas": 1.3},
+    "SUBSCRIPTION": {"streaming": 11, "music": 11, "software": 12, "fitness": 25}
+}
+REGIONS = ["US"] + [f"R{i:02d}" for i in range(49)]
+
+def generate(count: int, rng: np.random.Generator) -> dict:
+    keys = [(service, region, tier, typical) for service, tiers in SERVICES.items()
+            for region in REGIONS for tier, typical in tiers.items()]
+    key = rng.integers(0, len(keys), count)
+    typical = np.array([typical for *_, typical in keys])[key]
+    price = np.round(typical * rng.lognormal(0, 0.35, count), 3)
+    promo = np.where(rng.random(count) < 0.3, np.round(price * 0.7, 3), np.nan)
+    return {
+        "service_type": [keys[k][0] for k in key],
+        "region": [keys[k][1] for k in key],
+        "tier": [keys[k][2] for k in key],
+        "provider": [f"Provider {p}" for p in rng.integers(0, 300, count)],
+        "plan": [f"Plan {p}" for p in rng.integers(0, 2000, count)],
+        "price": price,
+        "promo_price": promo,
+        "unit": ["kWh" if keys[k][2] == "electric" else "therm" if keys[k][2] == "gas" else "month" for k in key]
+    }
+
+def scan(rows: list, service_type: str, region: str, tier: str, amount: float) -> tuple:
+    matches = sorted((row for row in rows if row["service_type"] == service_type and row["region"] == region
+                      and row["tier"] == tier), key=lambda row: row["price"])
+    return matches[:5], sum(row["price"] < amount for row in matches)
+
+def timed_queries(run, queries: list) -> list:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        run(*query)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def report(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+    print(f"{label:<30} {statistics.median(latencies) * 1e6:>11.1f}us {p99 * 1e6:>11.1f}us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rates", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--scan-queries", type=int, default=50, help="queries timed for the linear scan")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(5)
+    columns = generate(args.rates, rng)
+    directory = tempfile.mkdtemp(prefix="competitor_rates_")
+    try:
+        csv_path = os.path.join(directory, "rates.csv")
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(zip(*(columns[column] for column in COLUMNS)))
+
+        started = time.perf_counter()
+        index = load_rates(csv_path)
+        csv_seconds = time.perf_counter() - started
+        index_path = os.path.join(directory, "index")
+        save_index(index, index_path)
+        started = time.perf_counter()
+        mapped = load_rates(index_path)
+        mapped.query("TELECOM", "US", "mobile", limit=5)
+        mmap_seconds = time.perf_counter() - started
+        print(f"{len(index):,} rates in {len(index.keys)} keys: CSV load {csv_seconds:.2f}s, "
+              f"memory-mapped load + first query {mmap_seconds * 1e3:.1f}ms\n")
+
+        picker = random.Random(11)
+        queries = []
+        for _ in range(args.queries):
+            service = picker.choice(list(SERVICES))
+            tier, typical = picker.choice(list(SERVICES[service].items()))
+            queries.append((service, picker.choice(REGIONS), tier, typical * picker.uniform(0.8, 1.6)))
+
+        rows = [dict(zip(COLUMNS, values)) for values in zip(*(columns[column] for column in COLUMNS))]
+        store = CompetitorRateStore(index_path, check_seconds=0)
+
+        def indexed(service, region, tier, amount):
+            return index.query(service, region, tier, limit=5), index.count(service, region, tier, max_price=amount)
+
+        print(f"{'lookup':<30} {'p50':>13} {'p99':>13}")
+        report("linear scan", timed_queries(lambda *q: scan(rows, *q), queries[:args.scan_queries]))
+        report("RateIndex, in memory", timed_queries(indexed, queries))
+        report("RateIndex, memory-mapped", timed_queries(
+            lambda s, r, t, a: (mapped.query(s, r, t, limit=5), mapped.count(s, r, t, max_price=a)), queries))
+        report("store.leverage (agents)", timed_queries(
+            lambda s, r, t, a: store.leverage(s, a, r, t, company="Provider 1"), queries))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
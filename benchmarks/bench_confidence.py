@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Confidence scoring cost and calibration: the previous keyword scorer
+(str() of the whole result, searched twice) versus the shared feature
+extractor and logistic model in confidence.py, scored one result at a time
+and as a batch, with the prior weights and with weights fitted on half of
+the labeled outcomes.
+
+Results carry specialist details of several kilobytes, like real runs.
+Outcomes are synthetic: each result succeeds with a probability driven by
+the same signals plus noise, so calibration (Brier score and expected
+calibration error over 10 bins, on the held-out half) shows how well each
+scorer's output reads as a probability.
+
+Usage: python benchmarks/bench_confidence.py [--results 20000] [--detail-chars 6000]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from confidence import ConfidenceModel, extract_features, get_confidence_model, score_results
+
+WORDS = ("negotiate loyalty discount retention plan payment customer rate offer balance fee review "
+         "account service monthly promotion settlement hardship program usage").split()
+
+def legacy_confidence(negotiation_result: dict) -> float:
+    """The scorer previously copied into every orchestrator"""
+    score = 0.0
+    if negotiation_result.get('strategy') and len(negotiation_result['strategy']) > 200:
+        score += 0.3
+    if 'competitor' in str(negotiation_result).lower():
+        score += 0.2
+    if 'error' in str(negotiation_result).lower():
+        score += 0.2
+    score += 0.3
+    return min(score, 1.0)
+
+def prose(rng: random.Random, chars: int) -> str:
+    # Words average about 7 characters plus a space
+    return " ".join(rng.choices(WORDS, k=max(chars // 8, 1)))
+
+def labeled(count: int, detail_chars: int, rng: random.Random) -> list:
+    items = []
+    for _ in range(count):
+        strategy = prose(rng, rng.choice([60, 150, 300, 600]))
+        competitor = rng.random() < 0.5
+        errors = rng.random() < 0.3
+        history = rng.betavariate(4, 2)
+        completeness = rng.choice([0.2, 0.6, 0.8, 1.0])
+        if competitor:
+            strategy += " Competitor rates are lower."
+        details = {
+            "negotiation_strategy": strategy,
+            "script": prose(rng, detail_chars // 2),
+            "usage_analysis": prose(rng, detail_chars // 2) + " no error in meter readings"
+        }
+        if errors:
+            details["errors"] = "Duplicate charge on line 4"
+        result = {"agent_type": "UTILITY", "strategy": strategy, "details": details, "estimated_savings": 30.0,
+                  "historical_success_rate": history}
+        bill = {"confidence": {"company": completeness, "amount": 1.0, "due_date": completeness,
+                               "account_number": completeness, "service_period": completeness}}
+        logit = (-2.2 + 1.2 * min(len(strategy) / 200, 1) + 0.7 * competitor + 1.4 * errors
+                 + 2.0 * history ** 2 + 0.6 * completeness + rng.gauss(0, 0.4))
+        items.append((result, bill, int(rng.random() < 1 / (1 + math.exp(-logit)))))
+    return items
+
+def calibration(scores: list, outcomes: list, bins: int = 10) -> tuple:
+    brier = sum((score - outcome) ** 2 for score, outcome in zip(scores, outcomes)) / len(scores)
+    ece = 0.0
+    for b in range(bins):
+        members = [(s, o) for s, o in zip(scores, outcomes) if min(int(s * bins), bins - 1) == b]
+        if members:
+            mean_score = sum(s for s, _ in members) / len(members)
+            rate = sum(o for _, o in members) / len(members)
+            ece += len(members) / len(scores) * abs(mean_score - rate)
+    return brier, ece
+
+def timed(score_all) -> tuple:
+    started = time.perf_counter()
+    scores = score_all()
+    return scores, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--results", type=int, default=20000)
+    parser.add_argument("--detail-chars", type=int, default=6000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    items = labeled(args.results, args.detail_chars, rng)
+    half = len(items) // 2
+    train, test = items[:half], items[half:]
+    results = [result for result, _, _ in test]
+    bills = [bill for _, bill, _ in test]
+    outcomes = [outcome for _, _, outcome in test]
+
+    fitted = ConfidenceModel().fit([extract_features(result, bill) for result, bill, _ in train],
+                                   [outcome for _, _, outcome in train])
+    prior = get_confidence_model()
+
+    runs = [
+        ("legacy keywords", lambda: [legacy_confidence(result) for result in results]),
+        ("prior, per result", lambda: [prior.score(extract_features(r, b)) for r, b in zip(results, bills)]),
+        ("prior, batch", lambda: score_results(results, bills)),
+        ("fitted, batch", lambda: fitted.score_batch([extract_features(r, b) for r, b in zip(results, bills)]))
+    ]
+    print(f"{len(test)} held-out results (~{args.detail_chars} chars of details each), "
+          f"success rate {sum(outcomes) / len(outcomes):.1%}\n")
+    print(f"{'scorer':<20} {'per result':>11} {'brier':>7} {'ece':>7}")
+    for label, score_all in runs:
+        scores, elapsed = timed(score_all)
+        brier, ece = calibration(scores, outcomes)
+        print(f"{label:<20} {elapsed / len(test) * 1e6:>9.1f}us {brier:>7.4f} {ece:>7.4f}")
+    features = [extract_features(result, bill) for result, bill in zip(results, bills)]
+    for label, score_all in (("model only, loop", lambda: [prior.score(row) for row in features]),
+                             ("model only, batch", lambda: prior.score_batch(features))):
+        _, elapsed = timed(score_all)
+        print(f"{label:<20} {elapsed / len(test) * 1e6:>9.2f}us")
+    print(f"\nfitted weights {[round(weight, 2) for weight in fitted.weights]}, bias {fitted.bias:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-request graph setup cost: rebuilding the orchestrator on every
+request versus fetching it from the process-level GraphRegistry.
+
+No LLM calls are made; only graph construction and compilation is timed.
+
+Usage: python benchmarks/bench_graph_registry.py [--requests 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Client construction needs keys to be present, not valid
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-benchmark")
+
+from orchestrator import create_master_orchestrator
+from graph_registry import GraphRegistry
+
+def measure(label, setup, requests):
+    """Time and trace allocations of `setup` once per simulated request"""
+    timings = []
+    tracemalloc.start()
+    for _ in range(requests):
+        start = time.perf_counter()
+        setup()
+        timings.append((time.perf_counter() - start) * 1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    print(
+        f"{label:<28} p50={statistics.median(timings):9.3f}ms "
+        f"p95={timings[int(len(timings) * 0.95) - 1]:9.3f}ms "
+        f"peak_alloc={peak / 1024:9.1f}KiB"
+    )
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"Simulating {args.requests} requests\n")
+
+    before = measure("per-request compile", create_master_orchestrator, args.requests)
+
+    registry = GraphRegistry()
+    start = time.perf_counter()
+    registry.warm_up()
+    print(f"{'registry warm-up (once)':<28} {(time.perf_counter() - start) * 1000:9.3f}ms")
+
+    after = measure("registry lookup", lambda: registry.get("orchestrator"), args.requests)
+
+    print(f"\nPer-request setup cost reduced {before / max(after, 1e-6):,.0f}x")
+
+if __name__ == "__main__":
+    main()
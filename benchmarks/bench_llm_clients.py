@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-call ChatOpenAI construction (what the orchestrators and the
+script tool used to do) against the shared pooled client from
+llm.clients: connections opened, client construction cost and latency.
+
+A local OpenAI-compatible server answers /chat/completions over keep-alive
+HTTP/1.1 after a fixed delay and counts the TCP connections it accepts, so
+no API key or network access is needed.
+
+Usage: python benchmarks/bench_llm_clients.py [--calls 50] [--latency 0.02] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+class CompletionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    latency = 0.0
+    connections = 0
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.latency)
+        payload = json.dumps({
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "UTILITY"}}],
+            "usage": {"prompt_tokens": 12, "completion_tokens": 1, "total_tokens": 13}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def run(label: str, server: CompletionServer, call, calls: int) -> dict:
+    server.connections = 0
+    started = time.perf_counter()
+    call(calls)
+    elapsed = time.perf_counter() - started
+    return {"label": label, "connections": server.connections, "seconds": elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="server seconds per completion")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel async callers")
+    args = parser.parse_args()
+
+    server = CompletionServer(("127.0.0.1", 0), CompletionHandler)
+    server.latency = args.latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["LLM_BACKEND"] = "live"
+
+    from langchain_openai import ChatOpenAI
+    from llm.clients import ClientFactory
+
+    prompt = "Classify this bill: ELECTRIC BILL Amount Due: $124.58"
+    factory = ClientFactory()
+
+    def per_call(calls):
+        for _ in range(calls):
+            ChatOpenAI(model="gpt-3.5-turbo", temperature=0).invoke(prompt)
+
+    def pooled(calls):
+        for _ in range(calls):
+            factory.get("openai", "gpt-3.5-turbo", 0).invoke(prompt)
+
+    async def gather(make_llm, calls):
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            async with slots:
+                await make_llm().ainvoke(prompt)
+
+        await asyncio.gather(*(one() for _ in range(calls)))
+
+    # Warm up imports and both clients before timing
+    per_call(2)
+    pooled(2)
+    results = [
+        run("sync, new client per call", server, per_call, args.calls),
+        run("sync, pooled client", server, pooled, args.calls),
+        run("async, new client per call", server,
+            lambda calls: asyncio.run(gather(lambda: ChatOpenAI(model="gpt-3.5-turbo", temperature=0), calls)),
+            args.calls),
+        run("async, pooled client", server,
+            lambda calls: asyncio.run(gather(lambda: factory.get("openai", "gpt-3.5-turbo", 0), calls)),
+            args.calls)
+    ]
+
+    started = time.perf_counter()
+    for _ in range(args.calls):
+        ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    construct = (time.perf_counter() - started) / args.calls
+
+    print(f"{args.calls} calls, {args.latency * 1000:.0f}ms server latency, "
+          f"{args.concurrency} async callers\n")
+    print(f"{'client':<28} {'connections':>12} {'per call':>10}")
+    for result in results:
+        print(f"{result['label']:<28} {result['connections']:>12} "
+              f"{result['seconds'] / args.calls * 1000:>8.1f}ms")
+    print(f"\nChatOpenAI construction alone: {construct * 1000:.2f}ms")
+    print(json.dumps(factory.metrics()["providers"]["openai"], indent=2))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Negotiation memory lookup latency per embeddings backend: a simulated
+remote API (a fixed round trip per request, standing in for OpenAI), the
+zero-dependency hashing backend and, when installed, a local
+sentence-transformers model.
+
+Each backend fills its own store with the same negotiations, then answers
+a stream of retrieve_similar queries in which repeat questions hit the
+embedding cache. Runs fully offline (the sentence-transformers model is
+used only if it is already installed).
+
+Usage: python benchmarks/bench_memory_lookup.py [--negotiations 2000] [--queries 500] [--latency 0.15]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.stub import SimulatedEmbeddings
+from memory.embeddings import CachedEmbeddings, HashingEmbeddings, SentenceTransformerEmbeddings
+from memory.vector_store import NegotiationMemory
+
+COMPANIES = {
+    "UTILITY": ["City Power", "Duke Energy", "PG&E", "Metro Water"],
+    "MEDICAL": ["General Hospital", "Quest Diagnostics", "Urgent Care Plus", "Mercy Clinic"],
+    "SUBSCRIPTION": ["Netflix", "Spotify", "Adobe", "Planet Fitness"],
+    "TELECOM": ["Comcast", "Verizon", "T-Mobile", "Spectrum"]
+}
+TACTICS = [
+    "loyalty discount", "competitor offer", "retention department", "itemized bill review",
+    "duplicate charge dispute", "financial hardship program", "cash settlement", "plan downgrade",
+    "promotional rate extension", "late fee waiver", "payment plan", "charity care application"
+]
+
+def negotiations(count: int, rng: random.Random) -> list:
+    items = []
+    for i in range(count):
+        bill_type = rng.choice(list(COMPANIES))
+        tactics = rng.sample(TACTICS, 2)
+        items.append({
+            "company": rng.choice(COMPANIES[bill_type]),
+            "strategy": f"Asked for a {tactics[0]} and mentioned a {tactics[1]}",
+            "bill_type": bill_type,
+            "amount": round(rng.uniform(20, 3000), 2),
+            "confidence": 0.8,
+            "success": True
+        })
+    return items
+
+def queries(count: int, distinct: int, rng: random.Random) -> list:
+    pool = [f"{rng.choice(sum(COMPANIES.values(), []))} {rng.choice(TACTICS)}" for _ in range(distinct)]
+    return [rng.choice(pool) for _ in range(count)]
+
+def run(label: str, embeddings, items: list, stream: list):
+    directory = tempfile.mkdtemp(prefix="bench_lookup_")
+    memory = NegotiationMemory(persist_directory=directory, embeddings=embeddings,
+                               batch_size=len(items), flush_interval=3600, fsync=False)
+    started = time.perf_counter()
+    for item in items:
+        memory.store_negotiation(item)
+    memory.flush()
+    load = time.perf_counter() - started
+
+    before = embeddings.stats()
+    latencies = []
+    for query in stream:
+        started = time.perf_counter()
+        memory.retrieve_similar(query, k=5)
+        latencies.append(time.perf_counter() - started)
+    memory.close()
+    latencies.sort()
+
+    stats = embeddings.stats()
+    hits = stats["hits"] - before["hits"]
+    print(f"{label:<24} {load:>7.2f}s {statistics.median(latencies) * 1000:>9.2f}ms "
+          f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>9.2f}ms "
+          f"{len(stream) / sum(latencies):>9.0f}/s {hits / len(stream):>9.1%}")
+    shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--negotiations", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--distinct-queries", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.15, help="simulated seconds per remote embeddings request")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    items = negotiations(args.negotiations, rng)
+    stream = queries(args.queries, args.distinct_queries, rng)
+
+    print(f"{args.negotiations} stored negotiations, {args.queries} queries "
+          f"({args.distinct_queries} distinct), k=5\n")
+    print(f"{'backend':<24} {'load':>8} {'p50 lookup':>11} {'p99 lookup':>11} {'lookups':>10} {'query hits':>10}")
+    run(f"remote ({args.latency * 1000:.0f}ms round trip)",
+        CachedEmbeddings(SimulatedEmbeddings(latency=args.latency, per_text_latency=0), "simulated"), items, stream)
+    run("hashing (local)", CachedEmbeddings(HashingEmbeddings(), "hashing-384"), items, stream)
+    try:
+        model = SentenceTransformerEmbeddings()
+    except ImportError:
+        print(f"{'sentence-transformers':<24} skipped (package not installed)")
+    else:
+        run("sentence-transformers", CachedEmbeddings(model, "st"), items, stream)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Sustained NegotiationMemory store rate: writing every negotiation through
+before store_negotiation returns (batch size 0, the previous behaviour
+except that stores arriving during a write share the next one) versus the
+write-behind buffer that embeds and adds in batches.
+
+Several threads store negotiations concurrently, as the API's worker
+threads do. Embeddings are simulated with a fixed latency per request plus
+a small one per text. The buffered run's wall time includes the final
+flush, so both runs end with every negotiation in the vector store.
+
+Then the read side: retrieve_similar latency right after a burst of
+stores, when searches used to flush the buffer first, versus searching
+the buffered negotiations in memory (embeddings cached, as in the app).
+
+Usage: python benchmarks/bench_memory_writes.py [--negotiations 400] [--threads 8] [--latency 0.05] [--reads 40]
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.stub import SimulatedEmbeddings
+from memory.embeddings import CachedEmbeddings
+from memory.vector_store import NegotiationMemory
+
+BILL_TYPES = ["UTILITY", "MEDICAL", "SUBSCRIPTION", "TELECOM"]
+
+def negotiation(i: int) -> dict:
+    return {
+        "company": f"Provider {i % 50}",
+        "strategy": f"Loyalty discount with competitor offer #{i}",
+        "bill_type": BILL_TYPES[i % len(BILL_TYPES)],
+        "amount": 100.0 + i,
+        "confidence": 0.85,
+        "success": True,
+        "timestamp": str(i)
+    }
+
+def run(label: str, batch_size: int, args):
+    directory = tempfile.mkdtemp(prefix="bench_memory_")
+    embeddings = SimulatedEmbeddings(latency=args.latency, per_text_latency=args.per_text_latency)
+    memory = NegotiationMemory(persist_directory=directory, embeddings=embeddings,
+                               batch_size=batch_size, flush_interval=args.flush_interval)
+
+    def store(i: int) -> float:
+        started = time.perf_counter()
+        memory.store_negotiation(negotiation(i))
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        latencies = sorted(pool.map(store, range(args.negotiations)))
+    accepted = time.perf_counter() - started
+    memory.close()
+    elapsed = time.perf_counter() - started
+
+    stored = memory.vector_store._collection.count()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<22} {args.negotiations / elapsed:>9.0f}/s {accepted:>9.2f}s {elapsed:>8.2f}s "
+          f"{statistics.median(latencies) * 1000:>8.2f}ms {p99 * 1000:>8.2f}ms "
+          f"{embeddings.calls:>6} {stored:>7}")
+    shutil.rmtree(directory, ignore_errors=True)
+
+def read_latency(label: str, flush_first: bool, args):
+    """retrieve_similar latency with --batch-size - 1 negotiations stored since the last search"""
+    directory = tempfile.mkdtemp(prefix="bench_memory_")
+    embeddings = CachedEmbeddings(SimulatedEmbeddings(latency=args.latency, per_text_latency=args.per_text_latency),
+                                  "simulated")
+    memory = NegotiationMemory(persist_directory=directory, embeddings=embeddings,
+                               batch_size=args.batch_size, flush_interval=3600)
+    latencies = []
+    for round_ in range(args.reads):
+        for i in range(args.batch_size - 1):
+            memory.store_negotiation(negotiation(round_ * args.batch_size + i))
+        started = time.perf_counter()
+        if flush_first:
+            # What retrieve_similar did before it searched the buffer
+            memory.flush()
+        memory.retrieve_similar(f"loyalty discount #{round_}", k=5, bill_type="UTILITY")
+        latencies.append(time.perf_counter() - started)
+    memory.close()
+    latencies.sort()
+    print(f"{label:<34} {statistics.median(latencies) * 1000:>8.2f}ms "
+          f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>8.2f}ms")
+    shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--negotiations", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per embeddings request")
+    parser.add_argument("--per-text-latency", type=float, default=0.0005, help="simulated seconds per embedded text")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    parser.add_argument("--reads", type=int, default=40, help="searches, each after batch size - 1 stores")
+    args = parser.parse_args()
+
+    print(f"{args.negotiations} negotiations from {args.threads} threads, "
+          f"{args.latency * 1000:.0f}ms per embeddings request\n")
+    print(f"{'mode':<22} {'sustained':>11} {'accepted':>9} {'durable':>8} "
+          f"{'p50 store':>10} {'p99 store':>9} {'embeds':>6} {'stored':>7}")
+    run("write-through", 0, args)
+    run(f"buffered (batch {args.batch_size})", args.batch_size, args)
+
+    print(f"\n{'search after {0} stores'.format(args.batch_size - 1):<34} {'p50':>10} {'p99':>10}")
+    read_latency("flush, then search (previous)", True, args)
+    read_latency("search the buffer in memory", False, args)
+
+if __name__ == "__main__":
+    main()
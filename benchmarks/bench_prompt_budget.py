@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Prompt tokens per LLM node on a multi-page medical bill: the prompts as
+pasted verbatim, after OCR compaction alone and after compaction plus the
+per-node token budgets, with the prefill time those tokens imply.
+
+Every node runs through the real router and specialist graphs with a
+simulated model whose long replies stand in for the upstream analyses
+that later nodes re-embed.
+
+Usage: python benchmarks/bench_prompt_budget.py [--pages 6] [--reply-words 450] [--tokens-per-second 2500]
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.router_agent import create_router_graph
+from llm.cache import LLMResponseCache, set_llm_cache
+from llm.prompts import count_tokens, get_prompt_stats, prompt_budget
+from llm.stub import SimulatedChatModel
+from orchestrator import build_specialist_graphs
+
+CHARGES = [
+    ("Emergency room visit level 4", "99284", 1, 1850.00),
+    ("Comprehensive metabolic panel", "80053", 1, 212.40),
+    ("CBC with differential", "85025", 1, 96.10),
+    ("CT head without contrast", "70450", 1, 2410.00),
+    ("IV infusion first hour", "96365", 1, 640.00),
+    ("IV infusion each additional hour", "96366", 2, 310.00),
+    ("Ondansetron injection 1mg", "J2405", 4, 38.75),
+    ("Normal saline 1000cc", "J7030", 2, 125.00),
+    ("Pulse oximetry", "94760", 1, 85.00),
+    ("Venipuncture", "36415", 1, 42.00),
+    ("Urinalysis automated", "81003", 1, 64.20),
+    ("ECG 12 lead interpretation", "93010", 1, 220.00),
+    ("Observation per hour", "G0378", 6, 195.00)
+]
+
+def multipage_bill(pages: int) -> str:
+    """OCR-style text with page headers, tables, footers and remittance stubs"""
+    lines = []
+    for page in range(1, pages + 1):
+        lines += [
+            "   ST. MARY'S REGIONAL MEDICAL CENTER        1200 Harbor Blvd, Suite 300",
+            "   Patient: JORDAN A. RIVERA                 Account No: 4471-20931",
+            "   Statement Date: 04/02/2024                Guarantor: JORDAN A. RIVERA",
+            f"   Page {page} of {pages}",
+            "   ----------------------------------------------------------------------",
+            "   Date        Description                          CPT      Qty     Charge",
+            "   ----------------------------------------------------------------------"
+        ]
+        for description, cpt, qty, charge in CHARGES:
+            lines.append(f"   03/{page:02d}/24    {description:<36} {cpt:<8} {qty:<5} ${charge * qty:>9.2f}")
+        lines += [
+            "",
+            "   Insurance Adjustments ....................................... $0.00",
+            "   Questions? Call Patient Financial Services at 1-800-555-0199",
+            "   This statement reflects charges processed through 04/01/2024",
+            "   Please detach and return this portion with your payment",
+            "   Thank you for choosing St. Mary's Regional Medical Center",
+            "   Printed on recycled paper",
+            "   ======================================================================",
+            "   (continued on next page)" if page < pages else "   Amount Due: $48,310.20",
+            ""
+        ]
+    return "\n".join(lines)
+
+def run(bill: str, reply: str, token_budget) -> dict:
+    """Route and negotiate the bill with every specialist, returning prompt stats"""
+    stats = get_prompt_stats()
+    stats.clear()
+    llm = SimulatedChatModel(reply=reply, latency=0)
+    # No response cache, so every node sends its prompt
+    set_llm_cache(LLMResponseCache(max_entries=0, path=""))
+
+    router = create_router_graph(SimulatedChatModel(reply="MEDICAL", latency=0), token_budget=token_budget)
+    router.invoke({"ocr_text": bill, "company": "", "amount": 0.0, "bill_type": "",
+                   "negotiation_strategy": "", "conversation_history": []})
+    for graph in build_specialist_graphs(llm, token_budget=token_budget).values():
+        graph.invoke({"ocr_text": bill, "company": "St. Mary's Regional Medical Center", "amount": 48310.20})
+    return stats.stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--reply-words", type=int, default=450, help="words in each simulated analysis")
+    parser.add_argument("--tokens-per-second", type=float, default=2500, help="assumed prefill throughput")
+    args = parser.parse_args()
+
+    bill = multipage_bill(args.pages)
+    reply = " ".join(
+        f"{i + 1}. Dispute the duplicate observation hours and request an itemized review of ${i * 37 % 900}.00"
+        if i % 12 == 0 else "negotiate"
+        for i in range(args.reply_words)
+    )
+    compact_only = run(bill, reply, token_budget=0)
+    budgeted = run(bill, reply, token_budget=None)
+
+    print(f"{args.pages}-page bill: {count_tokens(bill)} tokens of OCR text; "
+          f"budgets: ROUTER {prompt_budget('ROUTER')}, specialists {prompt_budget('MEDICAL')}\n")
+    print(f"{'node':<22} {'verbatim':>9} {'compacted':>10} {'budgeted':>9}")
+    for node, stats in budgeted["nodes"].items():
+        print(f"{node:<22} {stats['raw_tokens']:>9} {compact_only['nodes'][node]['tokens']:>10} {stats['tokens']:>9}")
+    print(f"{'total':<22} {budgeted['raw_tokens']:>9} {compact_only['tokens']:>10} {budgeted['tokens']:>9}")
+
+    seconds = [total / args.tokens_per_second
+               for total in (budgeted["raw_tokens"], compact_only["tokens"], budgeted["tokens"])]
+    print(f"\nprefill at {args.tokens_per_second:.0f} tokens/s: verbatim {seconds[0]:.2f}s, "
+          f"compacted {seconds[1]:.2f}s, budgeted {seconds[2]:.2f}s "
+          f"({budgeted['reduction']:.1%} fewer tokens than verbatim)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Negotiation script latency and output tokens: the previous script node (the
+LLM writes the whole dialogue) versus script_node (the script is rendered
+from its template and the LLM writes only the opening and fallback lines,
+capped at --max-tokens).
+
+The chat model streams output at --token-ms per token after a fixed
+time to first token, and honors max_tokens like the real clients, so
+latency follows the output tokens: the dominant cost of a long completion.
+
+Usage: python benchmarks/bench_script_templates.py [--bills 10] [--dialogue-tokens 650] [--max-tokens 120] [--token-ms 4]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.nodes import llm_node, script_node
+from agents.scripts import get_script_template, script_fields
+from llm.prompts import fill_prompt
+
+ANALYSIS = """Negotiation strategy:
+1. Usage has been flat for 18 months at about 900 kWh, so the rate increase is not usage driven
+2. Two competitors advertise fixed rates 15-20% below the current one
+3. Customer is eligible for budget billing and the efficiency rebate program
+"""
+
+PERSONALIZED = ("OPENING: Hi, I've been a City Power customer for eight years and I'd like to stay.\n"
+                "FALLBACK: Could you waive this month's fees if the rate can't change?\n"
+                "FALLBACK: Otherwise please enroll me in budget billing and the rebate program.")
+
+class TokenRateChatModel(BaseChatModel):
+    """Chat model whose latency grows with the tokens it outputs"""
+
+    natural_tokens: int = 650
+    first_token_seconds: float = 0.4
+    seconds_per_token: float = 0.004
+    reply: str = ""
+    output_tokens: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "token-rate-chat-model"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, max_tokens: int = None, **kwargs: Any) -> ChatResult:
+        tokens = min(self.natural_tokens, max_tokens or self.natural_tokens)
+        time.sleep(self.first_token_seconds + tokens * self.seconds_per_token)
+        self.output_tokens += tokens
+        # About four characters per token
+        content = (self.reply or "Well, ") * (tokens * 4 // max(len(self.reply or "Well, "), 1) + 1)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content[:tokens * 4]))])
+
+def legacy_script(state):
+    """The previous utility generate_script prompt"""
+    proven_scripts = [
+        "I've been a loyal customer for X years and I'm hoping we can work together to find a better rate.",
+        "I see that [competitor] is offering [specific deal]. Can you match or beat that offer?",
+        "I'm considering switching providers because the cost has become too high for my budget.",
+        "Are there any energy efficiency programs or budget billing options that could help reduce my costs?",
+        "I've noticed my usage has been consistent - is there a loyalty discount available?"
+    ]
+    return fill_prompt("""
+    Create a comprehensive negotiation script for this utility bill:
+    Strategy: {strategy}
+
+    Use these proven templates as inspiration:
+    {scripts}
+
+    Generate a complete negotiation dialogue with:
+    1. Opening statement
+    2. Key negotiation points
+    3. Competitor comparisons
+    4. Fallback positions
+    5. Closing statements
+
+    Make it conversational and professional.
+    """, 1500, strategy=state["negotiation_strategy"], scripts=chr(10).join(proven_scripts))
+
+def run(label: str, node, model: TokenRateChatModel, bills: List[dict]):
+    latencies = []
+    for state in bills:
+        started = time.perf_counter()
+        script = node.invoke(state)["script"]
+        latencies.append(time.perf_counter() - started)
+    print(f"{label:<34} {statistics.mean(latencies) * 1e3:>9.0f}ms {model.output_tokens / len(bills):>9.0f} "
+          f"{len(script):>9,}")
+    return statistics.mean(latencies), model.output_tokens / len(bills)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bills", type=int, default=10)
+    parser.add_argument("--dialogue-tokens", type=int, default=650, help="tokens of a full LLM-written dialogue")
+    parser.add_argument("--max-tokens", type=int, default=120)
+    parser.add_argument("--token-ms", type=float, default=4.0)
+    parser.add_argument("--first-token-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    timing = dict(first_token_seconds=args.first_token_ms / 1e3, seconds_per_token=args.token_ms / 1e3)
+    bills = [{"ocr_text": "ELECTRIC BILL\nCity Power\nUsage: 902 kWh", "company": "City Power",
+              "amount": 100.0 + i, "region": "", "negotiation_strategy": ANALYSIS} for i in range(args.bills)]
+    template = get_script_template("UTILITY")
+
+    def fields(state):
+        return script_fields("UTILITY", state["company"], state["amount"], analysis=state["negotiation_strategy"])
+
+    print(f"{args.bills} utility scripts, {args.first_token_ms:.0f}ms to first token + {args.token_ms}ms/token\n")
+    print(f"{'script node':<34} {'latency':>11} {'out tok':>9} {'chars':>9}")
+    full = TokenRateChatModel(natural_tokens=args.dialogue_tokens, **timing)
+    legacy_latency, legacy_tokens = run("LLM writes the dialogue", llm_node(full, legacy_script, "script"), full, bills)
+    short = TokenRateChatModel(natural_tokens=args.dialogue_tokens, reply=PERSONALIZED + "\n", **timing)
+    latency, tokens = run(f"template + {args.max_tokens}-token personalization",
+                          script_node(short, template, fields, "script", max_tokens=args.max_tokens), short, bills)
+    local = TokenRateChatModel(**timing)
+    run("template only (max tokens 0)", script_node(local, template, fields, "script"), local, bills)
+
+    started = time.perf_counter()
+    for state in bills * 100:
+        template.render(fields(state))
+    render = (time.perf_counter() - started) / (len(bills) * 100)
+    print(f"\noutput tokens -{1 - tokens / legacy_tokens:.0%}, latency -{1 - latency / legacy_latency:.0%}; "
+          f"local render {render * 1e6:.0f}us per script")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-bill-type specialist latency with independent nodes fanned
+out in parallel versus the same graphs limited to one node at a time
+(equivalent to the former linear chains).
+
+Every LLM call is simulated with a fixed latency, so wall time reflects the
+number of LLM calls on the critical path.
+
+Usage: python benchmarks/bench_specialist_parallel.py [--latency 0.3] [--runs 3]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.stub import SimulatedChatModel
+from orchestrator import build_specialist_graphs
+
+BILL = {
+    "ocr_text": "Monthly statement\\nAmount Due: $89.99",
+    "company": "Example Co",
+    "amount": 89.99
+}
+
+async def time_graph(graph, runs: int) -> float:
+    """Average seconds per specialist run"""
+    started = time.perf_counter()
+    for _ in range(runs):
+        await graph.ainvoke(dict(BILL))
+    return (time.perf_counter() - started) / runs
+
+async def main_async(latency: float, runs: int):
+    llm = SimulatedChatModel(reply="analysis", latency=latency)
+    sequential = build_specialist_graphs(llm=llm, max_concurrency=1)
+    parallel = build_specialist_graphs(llm=llm)
+
+    print(f"{runs} runs per graph, {latency}s per simulated LLM call\n")
+    print(f"{'bill type':<14} {'one at a time':>14} {'parallel':>10} {'saved':>8}")
+    for bill_type in parallel:
+        before = await time_graph(sequential[bill_type], runs)
+        after = await time_graph(parallel[bill_type], runs)
+        print(f"{bill_type:<14} {before:>13.2f}s {after:>9.2f}s {1 - after / before:>7.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per LLM call")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.latency, args.runs))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark: time to first byte, first strategy token and full result
+for the blocking endpoint (/api/v1/negotiate) versus the server-sent-events
+endpoint (/api/v1/negotiate/stream).
+
+The API runs in a uvicorn subprocess with OCR replaced by an instant fake
+and every LLM call replaced by a simulated model that streams its reply word
+by word over a fixed latency, so the numbers reflect the pipeline shape
+rather than any provider.
+
+Usage: python benchmarks/bench_sse_ttfb.py [--latency 0.5] [--requests 5]
+"""
+
+import argparse
+import base64
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STRATEGY = ("Reference the competitor rate of eleven cents per kWh, ask for the "
+            "loyalty discount and request a twelve month rate lock")
+
+def serve(port: int, latency: float):
+    """Run the API with OCR, LLMs and memory writes faked out"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-benchmark")
+    os.environ.setdefault("JOB_DB_PATH", ":memory:")
+    import uvicorn
+    import api.main as api_main
+    from agents.router_agent import create_router_graph
+    from llm.stub import SimulatedChatModel
+    from ocr.extraction import extract_bill_data
+    from orchestrator import build_specialist_graphs, create_master_orchestrator
+
+    async def read_bill(image_data):
+        text = "ELECTRIC BILL\nAmount Due: $124.58"
+        return text, extract_bill_data(text)
+
+    orchestrator = create_master_orchestrator(
+        router=create_router_graph(llm=SimulatedChatModel(reply="UTILITY", latency=latency)),
+        specialists=build_specialist_graphs(llm=SimulatedChatModel(reply=STRATEGY, latency=latency))
+    )
+    api_main.read_bill = read_bill
+    api_main.graphs.get = lambda name="orchestrator": orchestrator
+    api_main.graphs.warm_up = lambda: None
+    api_main.memory.store_negotiation = lambda data: None
+    uvicorn.run(api_main.app, host="127.0.0.1", port=port, log_level="warning")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure(client, endpoint: str) -> dict:
+    """Seconds until the first byte, first strategy token and full response"""
+    body = {"bill_image": base64.b64encode(b"bill").decode(), "user_id": "bench"}
+    timings = {"first_byte": None, "first_token": None}
+    started = time.perf_counter()
+    with client.stream("POST", endpoint, json=body, timeout=60) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            now = time.perf_counter() - started
+            if timings["first_byte"] is None:
+                timings["first_byte"] = now
+            if timings["first_token"] is None and line == "event: token":
+                timings["first_token"] = now
+    timings["total"] = time.perf_counter() - started
+    # The blocking endpoint delivers the strategy only with the full response
+    timings["first_token"] = timings["first_token"] or timings["total"]
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per LLM call")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.latency)
+        return
+
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port), "--latency", str(args.latency)], cwd=ROOT
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(200):
+                try:
+                    client.get("/api/v1/health", timeout=1)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+
+            print(f"{args.requests} sequential requests, {args.latency}s per simulated LLM call\n")
+            print(f"{'endpoint':<26} {'first byte':>11} {'first token':>12} {'total':>8}")
+            for endpoint in ("/api/v1/negotiate", "/api/v1/negotiate/stream"):
+                runs = [measure(client, endpoint) for _ in range(args.requests)]
+                avg = {key: sum(run[key] for run in runs) / len(runs) for key in runs[0]}
+                print(f"{endpoint:<26} {avg['first_byte']:>10.2f}s {avg['first_token']:>11.2f}s {avg['total']:>7.2f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Specialist latency with and without past strategy recall: every bill runs
+its full specialist graph, versus the recall node reusing a close past
+strategy in place of the first analysis call (and otherwise adding the
+company's past strategies to the analysis prompt).
+
+The memory is filled with successful negotiations for a pool of companies
+and bills arrive with a skewed company mix, so a few hot companies are
+served from the recall cache. LLM calls are simulated with a fixed
+latency; embeddings use the offline hashing backend.
+
+Usage: python benchmarks/bench_strategy_reuse.py [--bills 200] [--companies 40] [--latency 0.3]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.stub import SimulatedChatModel
+from memory.embeddings import create_embeddings
+from memory.strategies import StrategyRecall
+from memory.vector_store import NegotiationMemory
+from orchestrator import build_specialist_graphs
+
+BILL_TYPES = ["UTILITY", "SUBSCRIPTION", "TELECOM", "MEDICAL"]
+STRATEGIES = [
+    "Loyalty discount after years of on-time payments",
+    "Competitor promotional rate matched by the retention department",
+    "Budget billing with a late fee waiver",
+    "Downgrade to a cheaper tier with a free month"
+]
+
+def fill(memory: NegotiationMemory, companies: list, rng: random.Random):
+    for bill_type, company in companies:
+        for _ in range(3):
+            memory.store_negotiation({
+                "company": company,
+                "bill_type": bill_type,
+                "strategy": rng.choice(STRATEGIES),
+                "amount": round(rng.uniform(50, 500), 2),
+                "confidence": rng.choice([0.8, 0.9, 1.0]),
+                "success": True
+            })
+    memory.flush()
+
+def bills(count: int, companies: list, rng: random.Random) -> list:
+    weights = [1 / (rank + 1) for rank in range(len(companies))]
+    return [
+        (bill_type, {"ocr_text": f"{company} statement", "company": company, "amount": round(rng.uniform(50, 500), 2)})
+        for bill_type, company in rng.choices(companies, weights=weights, k=count)
+    ]
+
+async def run(label: str, graphs: dict, stream: list, recall: StrategyRecall = None):
+    latencies = []
+    for bill_type, bill in stream:
+        started = time.perf_counter()
+        await graphs[bill_type].ainvoke(dict(bill))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    stats = recall.stats() if recall else {}
+    print(f"{label:<18} {statistics.mean(latencies) * 1000:>8.0f}ms {statistics.median(latencies) * 1000:>8.0f}ms "
+          f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>8.0f}ms {stats.get('reuse_rate', 0):>8.1%} "
+          f"{stats.get('cache_hit_ratio', 0):>10.1%} {stats.get('saved_seconds', 0):>8.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bills", type=int, default=200)
+    parser.add_argument("--companies", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated seconds per LLM call")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    companies = [(BILL_TYPES[i % len(BILL_TYPES)], f"Provider {i}") for i in range(args.companies)]
+    directory = tempfile.mkdtemp(prefix="bench_recall_")
+    memory = NegotiationMemory(persist_directory=directory, embeddings=create_embeddings("hashing"),
+                               batch_size=1000, flush_interval=3600, fsync=False)
+    fill(memory, companies, rng)
+    stream = bills(args.bills, companies, rng)
+    llm = SimulatedChatModel(reply="analysis", latency=args.latency)
+
+    print(f"{args.bills} bills from {args.companies} companies, {args.latency * 1000:.0f}ms per LLM call\n")
+    print(f"{'mode':<18} {'mean':>10} {'p50':>10} {'p99':>10} {'reused':>8} {'cache hits':>10} {'saved':>9}")
+    asyncio.run(run("no recall", build_specialist_graphs(llm, recall=StrategyRecall()), stream))
+    recall = StrategyRecall(memory)
+    asyncio.run(run("recall + reuse", build_specialist_graphs(llm, recall=recall), stream, recall))
+
+    memory.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tracing overhead per negotiation: the orchestrator and specialist graphs
+built with tracing disabled, with the in-process metrics only (the default),
+and with OpenTelemetry spans exported to a file.
+
+LLM calls answer instantly, so the measured time is the graph machinery
+alone and the difference is the tracing cost per request. That cost is also
+reported as a share of a request whose LLM calls take --llm-latency seconds
+each, the request time tracing has to stay under 1% of.
+
+Usage: python benchmarks/bench_tracing.py [--bills 400] [--rounds 5] [--llm-latency 1.0]
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.bill_classifier import get_bill_classifier
+from agents.router_agent import create_router_graph
+from llm.stub import SimulatedChatModel
+from memory.strategies import StrategyRecall
+from orchestrator import build_specialist_graphs, create_master_orchestrator
+from tracing import Tracer, set_tracer
+
+BILLS = [
+    ("ELECTRIC BILL\nCity Power\nUsage: 902 kWh\nAmount Due: $150.00", "City Power", 150.0),
+    ("VERIZON WIRELESS\nUnlimited data, 3 lines\nAmount Due: $189.99", "Verizon", 189.99),
+    ("NETFLIX\nPremium subscription, monthly\nAmount: $22.99", "Netflix", 22.99),
+    ("GENERAL HOSPITAL\nPatient statement\nCPT 99213 office visit\nAmount Due: $1,200.00", "General Hospital", 1200.0)
+]
+
+def build(tracer: Tracer):
+    """An orchestrator whose graphs report to tracer"""
+    set_tracer(tracer)
+    # Trained up front as at API startup; async routing never trains it
+    get_bill_classifier()
+    llm = SimulatedChatModel(reply="1. Usage has been flat for a year, ask for the loyalty rate", latency=0)
+    specialists = build_specialist_graphs(llm=llm, recall=StrategyRecall())
+    return create_master_orchestrator(router=create_router_graph(llm=llm), specialists=specialists)
+
+async def run(orchestrator, bills: int) -> float:
+    """Mean seconds per negotiation, one bill at a time"""
+    started = time.perf_counter()
+    for i in range(bills):
+        text, company, amount = BILLS[i % len(BILLS)]
+        await orchestrator.ainvoke({
+            "bill_data": {"text": text, "company": company, "amount": amount + i, "confidence": {}},
+            "messages": []
+        })
+    return (time.perf_counter() - started) / bills
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bills", type=int, default=400)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="seconds per LLM call in a real request")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="traces_")
+    try:
+        tracers = {
+            "tracing disabled": Tracer(enabled=False),
+            "metrics (default)": Tracer(enabled=True, exporter=""),
+            "metrics + spans to file": Tracer(enabled=True, exporter="file",
+                                              span_file=os.path.join(directory, "traces.jsonl"))
+        }
+        graphs = {label: build(tracer) for label, tracer in tracers.items()}
+        for orchestrator in graphs.values():
+            asyncio.run(run(orchestrator, len(BILLS)))
+
+        # Interleaved rounds; the fastest round of each variant is the least disturbed
+        times = {label: [] for label in graphs}
+        for _ in range(args.rounds):
+            for label, orchestrator in graphs.items():
+                times[label].append(asyncio.run(run(orchestrator, args.bills)))
+        best = {label: min(samples) for label, samples in times.items()}
+
+        tracer = tracers["metrics (default)"]
+        stats = tracer.stats()
+        runs = args.rounds * args.bills + len(BILLS)
+        calls = sum(llm["calls"] for llm in stats["llm"].values()) / runs
+        nodes = sum(node["runs"] for node in stats["nodes"].values()) / runs
+        baseline = best["tracing disabled"]
+        request = baseline + calls * args.llm_latency
+        print(f"{args.bills} negotiations x {args.rounds} rounds, {nodes:.1f} nodes and {calls:.1f} LLM calls each\n")
+        print(f"{'variant':<26} {'per request':>12} {'overhead':>10} {'of request':>11}")
+        for label, seconds in best.items():
+            overhead = seconds - baseline
+            print(f"{label:<26} {seconds * 1e3:>10.2f}ms {overhead * 1e6:>8.0f}us "
+                  f"{overhead / request:>10.3%}")
+        tracers["metrics + spans to file"].close()
+        with open(os.path.join(directory, "traces.jsonl")) as f:
+            spans = sum(1 for _ in f)
+
+        # The recording itself, without the scheduling noise of whole runs
+        started = time.perf_counter()
+        for _ in range(100000):
+            tracer.node_finished("UTILITY", "analyze", 0.01)
+        node_cost = (time.perf_counter() - started) / 100000
+        started = time.perf_counter()
+        for _ in range(100000):
+            tracer.llm_call("openai-chat:gpt-4", "analyze", 1.0, 500, 200, "miss", 0.0)
+        call_cost = (time.perf_counter() - started) / 100000
+        recorded = nodes * node_cost + calls * call_cost
+        print(f"\nrecording: {node_cost * 1e6:.2f}us per node, {call_cost * 1e6:.2f}us per LLM call, "
+              f"{recorded * 1e6:.0f}us ({recorded / request:.4%}) per request")
+        print(f"request time with {args.llm_latency:g}s LLM calls: {request:.2f}s; spans exported: {spans:,}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: peak server RSS per request for the base64 JSON endpoint
+(/api/v1/negotiate) versus the multipart upload endpoint
+(/api/v1/negotiate/upload).
+
+Each endpoint is measured against a fresh uvicorn process. OCR and the LLM
+workflow are replaced with instant fakes inside the server so that only the
+request ingestion path is measured. Peak RSS is read from /proc (Linux).
+
+Usage: python benchmarks/bench_upload_memory.py [--image-mb 5] [--requests 5]
+"""
+
+import argparse
+import base64
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def serve(port: int):
+    """Run the API with OCR, LLMs and memory writes faked out"""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-benchmark")
+    import uvicorn
+    import api.main as api_main
+    from agents.router_agent import create_router_graph
+    from llm.stub import SimulatedChatModel
+    from ocr.extraction import extract_bill_data
+    from orchestrator import build_specialist_graphs, create_master_orchestrator
+
+    async def read_bill(image_data):
+        text = "ELECTRIC BILL\nAmount Due: $124.58"
+        return text, extract_bill_data(text)
+
+    llm = SimulatedChatModel(reply="UTILITY", latency=0)
+    orchestrator = create_master_orchestrator(
+        router=create_router_graph(llm=llm),
+        specialists=build_specialist_graphs(llm=llm)
+    )
+    api_main.read_bill = read_bill
+    api_main.graphs.get = lambda name="orchestrator": orchestrator
+    api_main.graphs.warm_up = lambda: None
+    api_main.memory.store_negotiation = lambda data: None
+    uvicorn.run(api_main.app, host="127.0.0.1", port=port, log_level="warning")
+
+def proc_memory_kib(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} not found")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure(endpoint: str, image: bytes, requests: int) -> tuple:
+    """Start a server, send `requests` uploads; return (baseline MiB, peak growth MiB)"""
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, __file__, "--serve", str(port)], cwd=ROOT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            try:
+                httpx.get(f"{base_url}/api/v1/health", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+
+        # One small request first so lazy imports do not count as upload cost
+        send(base_url, endpoint, b"warm-up")
+        baseline = proc_memory_kib(server.pid, "VmRSS")
+        for _ in range(requests):
+            send(base_url, endpoint, image)
+        peak = proc_memory_kib(server.pid, "VmHWM")
+        return baseline / 1024, (peak - baseline) / 1024
+    finally:
+        server.terminate()
+        server.wait()
+
+def send(base_url: str, endpoint: str, image: bytes):
+    import httpx
+
+    if endpoint == "json":
+        response = httpx.post(f"{base_url}/api/v1/negotiate", timeout=60, json={
+            "bill_image": base64.b64encode(image).decode(),
+            "user_id": "bench"
+        })
+    else:
+        response = httpx.post(
+            f"{base_url}/api/v1/negotiate/upload",
+            timeout=60,
+            data={"user_id": "bench"},
+            files={"bill_image": ("bill.jpg", image, "image/jpeg")}
+        )
+    response.raise_for_status()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image-mb", type=float, default=5)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    image = os.urandom(int(args.image_mb * 1024 * 1024))
+    print(f"{args.requests} sequential requests with a {args.image_mb}MB image\n")
+    print(f"{'endpoint':<10} {'baseline RSS':>13} {'peak growth':>12}")
+    for endpoint in ("json", "multipart"):
+        baseline, growth = measure(endpoint, image, args.requests)
+        print(f"{endpoint:<10} {baseline:>10.1f}MiB {growth:>9.1f}MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Load test: negotiation throughput on a single event loop (one uvicorn worker)
+with the old blocking `orchestrator.invoke` handler versus `await ainvoke`.
+
+LLM calls are simulated with a fixed latency so the test runs offline and
+measures only how well the worker overlaps concurrent requests.
+
+Usage: python benchmarks/load_test_async.py [--latency 0.05] [--requests 64]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.bill_classifier import get_bill_classifier
+from agents.router_agent import create_router_graph
+from orchestrator import build_specialist_graphs, create_master_orchestrator
+from llm.stub import SimulatedChatModel
+
+def build_orchestrator(latency: float):
+    """Compile the real orchestrator wired to simulated LLMs"""
+    # Trained up front as at API startup; async routing never trains it
+    get_bill_classifier()
+    router = create_router_graph(llm=SimulatedChatModel(reply="TELECOM", latency=latency))
+    specialist_llm = SimulatedChatModel(reply="Competitor offer strategy " * 20, latency=latency)
+    return create_master_orchestrator(
+        router=router,
+        specialists=build_specialist_graphs(llm=specialist_llm)
+    )
+
+def negotiation_input(i: int) -> dict:
+    return {
+        "bill_data": {
+            "text": f"VERIZON WIRELESS\nAccount: {i}\nMonthly Charges: $89.99",
+            "user_id": f"load_{i}",
+            "amount": 89.99,
+            "company": "Verizon"
+        },
+        "messages": []
+    }
+
+async def run(handler, requests: int, concurrency: int) -> float:
+    """Issue `requests` calls with at most `concurrency` in flight; return req/s"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await handler(negotiation_input(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per LLM call")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    orchestrator = build_orchestrator(args.latency)
+
+    async def blocking_handler(payload):
+        # Previous behaviour: sync invoke inside an async endpoint
+        orchestrator.invoke(payload)
+
+    async def async_handler(payload):
+        await orchestrator.ainvoke(payload)
+
+    print(f"{'concurrency':>11} {'blocking req/s':>15} {'async req/s':>12}")
+    for concurrency in args.concurrency:
+        blocking = asyncio.run(run(blocking_handler, args.requests, concurrency))
+        non_blocking = asyncio.run(run(async_handler, args.requests, concurrency))
+        print(f"{concurrency:>11} {blocking:>15.2f} {non_blocking:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Confidence scoring for negotiation results, shared by every orchestrator
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # batches are scored one result at a time without numpy
+    np = None
+
+from memory.aggregates import DEFAULT_SUCCESS_RATE
+
+AUTO_EXECUTE_THRESHOLD = float(os.getenv("AUTO_EXECUTE_THRESHOLD", 0.8))
+HUMAN_HANDOFF_THRESHOLD = float(os.getenv("HUMAN_HANDOFF_THRESHOLD", 0.5))
+
+FEATURES = ("strategy", "competitor", "errors", "history", "completeness")
+# Prior logistic weights (per feature, then the intercept) until a model
+# fitted on labeled outcomes is loaded from CONFIDENCE_MODEL_PATH
+DEFAULT_WEIGHTS = (1.6, 1.0, 0.9, 1.2, 0.8)
+DEFAULT_BIAS = -2.4
+
+# A strategy this long (characters) counts as comprehensive
+STRATEGY_FULL_CHARS = 200
+# Bill fields whose extraction confidence makes up completeness
+BILL_FIELDS = ("company", "amount", "due_date", "account_number", "service_period")
+# Fields of a result or of its specialist details that carry each feature
+COMPETITOR_FIELDS = ("competitor_data", "competitor_research")
+ERROR_FIELDS = ("error_identification", "errors")
+NO_FINDINGS = re.compile(r"^\W*(no|none|n/a|not)\b", re.IGNORECASE)
+
+def _field(result: Dict, details: Dict, names: Sequence[str]) -> str:
+    for name in names:
+        value = result.get(name) or details.get(name)
+        if value:
+            return str(value)
+    return ""
+
+def extract_features(negotiation_result: Dict, bill_data: Dict = None,
+                     success_rate: float = None) -> Tuple[float, ...]:
+    """Structured features of one result, each in [0, 1], in FEATURES order
+
+    strategy is the strategy length relative to STRATEGY_FULL_CHARS;
+    competitor and errors are 1 when the result (or its specialist
+    details) carries competitor data or billing errors that were found,
+    else when the strategy mentions them; history is the company's
+    historical success rate; completeness the mean extraction confidence
+    of the bill fields (0.5 when unknown). Only the strategy is scanned,
+    never the whole specialist output.
+    """
+    details = negotiation_result.get("details") or {}
+    strategy = str(negotiation_result.get("strategy") or "")
+    lowered = strategy.lower()
+
+    competitor = bool(_field(negotiation_result, details, COMPETITOR_FIELDS)) or "competitor" in lowered
+    errors = _field(negotiation_result, details, ERROR_FIELDS)
+    found_errors = not NO_FINDINGS.match(errors) if errors else "error" in lowered
+
+    if success_rate is None:
+        success_rate = negotiation_result.get("historical_success_rate", DEFAULT_SUCCESS_RATE)
+    completeness = 0.5
+    if bill_data and bill_data.get("confidence"):
+        confidence = bill_data["confidence"]
+        completeness = sum(min(float(confidence.get(field, 0)), 1.0) for field in BILL_FIELDS) / len(BILL_FIELDS)
+
+    return (
+        min(len(strategy) / STRATEGY_FULL_CHARS, 1.0),
+        float(competitor),
+        float(found_errors),
+        min(max(float(success_rate), 0.0), 1.0),
+        completeness
+    )
+
+class ConfidenceModel:
+    """Logistic model over extract_features, scoring one result or a batch
+
+    score_batch scores a whole batch with a single NumPy matrix product.
+    fit calibrates the weights on labeled outcomes (1 = the negotiation
+    succeeded) by L2-regularized gradient descent on the log loss.
+    """
+
+    def __init__(self, weights: Sequence[float] = DEFAULT_WEIGHTS, bias: float = DEFAULT_BIAS):
+        self.weights = tuple(float(weight) for weight in weights)
+        self.bias = float(bias)
+
+    def score(self, features: Sequence[float]) -> float:
+        logit = self.bias + sum(weight * value for weight, value in zip(self.weights, features))
+        return 1 / (1 + math.exp(-logit))
+
+    def score_batch(self, features: Sequence[Sequence[float]]) -> List[float]:
+        if np is None:
+            return [self.score(row) for row in features]
+        matrix = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURES))
+        logits = matrix @ np.asarray(self.weights) + self.bias
+        return (1 / (1 + np.exp(-logits))).tolist()
+
+    def fit(self, features: Sequence[Sequence[float]], outcomes: Sequence[float],
+            epochs: int = 2000, learning_rate: float = 0.5, l2: float = 1e-3) -> "ConfidenceModel":
+        if np is None:
+            raise ImportError("ConfidenceModel.fit needs numpy")
+        matrix = np.asarray(features, dtype=np.float64)
+        labels = np.asarray(outcomes, dtype=np.float64)
+        weights, bias = np.asarray(self.weights), self.bias
+        for _ in range(epochs):
+            error = 1 / (1 + np.exp(-(matrix @ weights + bias))) - labels
+            weights = weights - learning_rate * (matrix.T @ error / len(labels) + l2 * weights)
+            bias -= learning_rate * error.mean()
+        self.weights, self.bias = tuple(weights.tolist()), float(bias)
+        return self
+
+    def to_dict(self) -> Dict:
+        return {"features": list(FEATURES), "weights": list(self.weights), "bias": self.bias}
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "ConfidenceModel":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if tuple(data.get("features", FEATURES)) != FEATURES:
+            raise ValueError(f"{path} was fitted on features {data['features']}, not {list(FEATURES)}")
+        return cls(data["weights"], data["bias"])
+
+_model: Optional[ConfidenceModel] = None
+_model_lock = threading.Lock()
+
+def get_confidence_model() -> ConfidenceModel:
+    """Process-wide model: fitted weights from CONFIDENCE_MODEL_PATH, else the priors"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            path = os.getenv("CONFIDENCE_MODEL_PATH")
+            _model = ConfidenceModel.load(path) if path else ConfidenceModel()
+        return _model
+
+def set_confidence_model(model: ConfidenceModel):
+    """Replace the process-wide model"""
+    global _model
+    with _model_lock:
+        _model = model
+
+def calculate_confidence(negotiation_result: Dict, bill_data: Dict = None, success_rate: float = None) -> float:
+    """Calibrated probability that a negotiation result succeeds"""
+    return get_confidence_model().score(extract_features(negotiation_result, bill_data, success_rate))
+
+def score_results(results: Sequence[Dict], bills: Sequence[Dict] = None,
+                  success_rates: Sequence[float] = None) -> List[float]:
+    """calculate_confidence for a batch of results in one model call"""
+    bills = bills or [None] * len(results)
+    success_rates = success_rates or [None] * len(results)
+    features = [extract_features(*row) for row in zip(results, bills, success_rates)]
+    return get_confidence_model().score_batch(features)
+
+def execution_mode(confidence: float) -> str:
+    """auto_execute above AUTO_EXECUTE_THRESHOLD, human_handoff at or below HUMAN_HANDOFF_THRESHOLD"""
+    if confidence > AUTO_EXECUTE_THRESHOLD:
+        return "auto_execute"
+    if confidence > HUMAN_HANDOFF_THRESHOLD:
+        return "supervised"
+    return "human_handoff"
@@ -0,0 +1,109 @@
+"""
+Process-level registry of compiled Hagglz negotiation graphs
+"""
+
+import importlib
+import threading
+import time
+from typing import Dict
+
+GRAPH_NAMES = ("orchestrator", "router", "UTILITY", "MEDICAL", "SUBSCRIPTION", "TELECOM")
+
+# Modules re-imported by reload(reload_modules=True), in dependency order
+AGENT_MODULES = (
+    "agents.router_agent",
+    "agents.utility_agent",
+    "agents.medical_agent",
+    "agents.subscription_agent",
+    "agents.telecom_agent",
+    "orchestrator",
+)
+
+class GraphRegistry:
+    """Compiles the orchestrator, router and specialist graphs once per process
+
+    Compiled graphs hold no per-run state, so a single instance is shared by
+    every concurrent request. Reloads build a complete new set of graphs
+    before swapping it in, so in-flight runs keep the graphs they started with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._graphs: Dict[str, object] = {}
+        self.version = 0
+        self.loaded_at = None
+        self.build_seconds = 0.0
+
+    def _build(self) -> Dict[str, object]:
+        """Compile a fresh, complete set of graphs"""
+        # Resolve builders through the modules so reloaded code is picked up
+        orchestrator = importlib.import_module("orchestrator")
+        router_agent = importlib.import_module("agents.router_agent")
+
+        specialists = orchestrator.build_specialist_graphs()
+        router = router_agent.create_router_graph()
+
+        graphs = dict(specialists)
+        graphs["router"] = router
+        graphs["orchestrator"] = orchestrator.create_master_orchestrator(
+            router=router,
+            specialists=specialists
+        )
+        return graphs
+
+    def _swap(self, graphs: Dict[str, object], started: float):
+        """Install a newly built set of graphs; caller must hold the lock"""
+        self._graphs = graphs
+        self.version += 1
+        self.loaded_at = time.time()
+        self.build_seconds = time.perf_counter() - started
+
+    def warm_up(self):
+        """Compile all graphs now instead of on the first request"""
+        if self._graphs:
+            return
+        with self._lock:
+            if not self._graphs:
+                started = time.perf_counter()
+                self._swap(self._build(), started)
+
+    def get(self, name: str = "orchestrator"):
+        """Return a compiled graph by name, compiling everything on first use"""
+        if name not in GRAPH_NAMES:
+            raise KeyError(f"Unknown graph: {name}")
+        graphs = self._graphs
+        if not graphs:
+            self.warm_up()
+            graphs = self._graphs
+        return graphs[name]
+
+    def reload(self, reload_modules: bool = False):
+        """Rebuild every graph and atomically replace the current set
+
+        With reload_modules=True the agent and orchestrator modules are
+        re-imported first so edited prompts and node code take effect.
+        """
+        with self._lock:
+            started = time.perf_counter()
+            if reload_modules:
+                for module_name in AGENT_MODULES:
+                    importlib.reload(importlib.import_module(module_name))
+            self._swap(self._build(), started)
+        return self.stats()
+
+    def stats(self) -> Dict:
+        """Describe the currently loaded graphs"""
+        return {
+            "loaded": bool(self._graphs),
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "build_seconds": round(self.build_seconds, 4),
+            "graphs": sorted(self._graphs)
+        }
+
+# Shared registry for the API process
+registry = GraphRegistry()
+
+def get_registry() -> GraphRegistry:
+    """Return the process-wide graph registry"""
+    return registry
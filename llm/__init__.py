@@ -0,0 +1 @@
+# LLM package for Hagglz agent
@@ -0,0 +1,137 @@
+"""
+Deterministic LLM response cache shared by the router and specialist agents
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from tiered_cache import TieredCache
+
+def describe_llm(llm) -> Tuple[str, Optional[float]]:
+    """(model identifier, temperature) of a chat model, as used in cache keys
+
+    Temperature is None when the client does not expose one, which the
+    cache treats as non-deterministic.
+    """
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or "default"
+    provider = getattr(llm, "_llm_type", type(llm).__name__)
+    temperature = getattr(llm, "temperature", None)
+    return f"{provider}:{model}", temperature
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+class LLMResponseCache:
+    """Two-tier cache of LLM completions keyed by model, temperature and prompt
+
+    Only deterministic calls are cached: temperature 0, or any temperature
+    when cache_nonzero_temperature is set. Completions are kept in a
+    TieredCache: an LRU bounded by entry count and an optional SQLite tier
+    bounded by total stored bytes. Entries older than ttl seconds are
+    treated as misses (0 disables expiry).
+
+    Each entry remembers the tokens and latency of the call that produced
+    it, so stats() can estimate what the hits saved.
+    """
+
+    def __init__(self, max_entries: int = None, path: str = None, max_bytes: int = None,
+                 ttl: float = None, cache_nonzero_temperature: bool = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_SIZE", 1024))
+        self.path = path if path is not None else os.getenv("LLM_CACHE_PATH", "")
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LLM_CACHE_MAX_MB", 64)) * 1024 * 1024
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL_SECONDS", 86400))
+        self.cache_nonzero_temperature = (
+            cache_nonzero_temperature if cache_nonzero_temperature is not None
+            else os.getenv("LLM_CACHE_NONZERO_TEMPERATURE", "false").lower() == "true"
+        )
+
+        self._store = TieredCache("llm_cache", self.max_entries, self.path, self.max_bytes, self.ttl)
+        self._lock = threading.Lock()
+        self._counters = {"skipped": 0, "saved_tokens": 0, "saved_seconds": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._store.enabled
+
+    @property
+    def persistent(self) -> bool:
+        """Whether get/put may query SQLite (async callers run them in a thread)"""
+        return self._store.persistent
+
+    def cacheable(self, temperature: Optional[float]) -> bool:
+        """Whether calls at this temperature may be served from the cache"""
+        if not self.enabled or temperature is None:
+            return False
+        return temperature == 0 or self.cache_nonzero_temperature
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], prompt: str) -> str:
+        """Hash of the model, temperature and prompt text"""
+        return hashlib.sha256(json.dumps([model, temperature, prompt]).encode()).hexdigest()
+
+    def get(self, model: str, temperature: Optional[float], prompt: str) -> Optional[str]:
+        """Return the cached completion for this call, if any"""
+        if not self.cacheable(temperature):
+            with self._lock:
+                self._counters["skipped"] += 1
+            return None
+
+        entry = self._store.get(self.make_key(model, temperature, prompt))
+        if entry is None:
+            return None
+        # Account for the call the hit avoided
+        with self._lock:
+            self._counters["saved_tokens"] += entry["tokens"]
+            self._counters["saved_seconds"] += entry["latency"]
+        return entry["content"]
+
+    def put(self, model: str, temperature: Optional[float], prompt: str, content: str,
+            latency: float = 0.0, tokens: int = None):
+        """Cache a completion along with the tokens and seconds it cost"""
+        if not self.cacheable(temperature):
+            return
+
+        self._store.put(self.make_key(model, temperature, prompt), {
+            "content": content,
+            "tokens": tokens if tokens is not None else estimate_tokens(prompt) + estimate_tokens(content),
+            "latency": latency
+        })
+
+    def clear(self):
+        """Drop every cached completion (counters are kept)"""
+        self._store.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters, tier sizes and estimated savings"""
+        stats = self._store.stats()
+        with self._lock:
+            stats.update(self._counters)
+            stats["saved_seconds"] = round(self._counters["saved_seconds"], 3)
+        stats["ttl_seconds"] = self.ttl
+        stats["cache_nonzero_temperature"] = self.cache_nonzero_temperature
+        return stats
+
+    def close(self):
+        """Close the disk tier"""
+        self._store.close()
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> LLMResponseCache:
+    """Process-wide cache shared by every llm_node, configured from the environment"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+        return _cache
+
+def set_llm_cache(cache: LLMResponseCache):
+    """Replace the process-wide cache (affects graphs built afterwards)"""
+    global _cache
+    with _cache_lock:
+        _cache = cache
@@ -0,0 +1,373 @@
+"""
+Shared, pooled chat model clients for every agent, orchestrator and tool
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from tracing import note_queue_wait
+
+PROVIDERS = ("openai", "anthropic", "stub")
+
+# A PooledChatModel's own run reports each call to callbacks and tracers; the
+# wrapped client runs without callbacks so tokens are not reported twice
+INNER_CONFIG = {"callbacks": []}
+
+class LoopTransport(httpx.AsyncBaseTransport):
+    """Async transport that keeps a separate connection pool per event loop
+
+    httpx connections belong to the loop that opened them, so a single
+    shared pool breaks once a second loop (a worker thread, asyncio.run in
+    a script or test) uses it. The client stays shared; each running loop
+    gets its own pool, dropped with the loop.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._transports: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        """Close the pool of the running loop (the others cannot be closed from it)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+            self._transports.clear()
+        if transport is not None:
+            await transport.aclose()
+
+class ProviderPool:
+    """Keep-alive HTTP clients, a concurrency limit and counters for one provider
+
+    One sync and one async httpx client are shared by every model of the
+    provider, so TCP connections and TLS sessions are reused across agents
+    (the async client keeps one connection pool per event loop).
+    Request and connection counts come from httpcore trace events, which
+    makes connection reuse observable. max_concurrency (0 = unlimited) caps
+    in-flight calls; sync callers share a thread semaphore and each event
+    loop gets its own asyncio semaphore. Time spent waiting for a slot is
+    reported to the tracer as the call's queue time.
+    """
+
+    def __init__(self, provider: str, max_concurrency: int = None):
+        self.provider = provider
+        self.max_concurrency = (
+            max_concurrency if max_concurrency is not None
+            else int(os.getenv(f"LLM_MAX_CONCURRENCY_{provider.upper()}", 0))
+        )
+        self._lock = threading.Lock()
+        self._thread_slots = threading.BoundedSemaphore(self.max_concurrency) if self.max_concurrency else None
+        self._loop_slots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._sync_client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._counters = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "waiting": 0}
+        self._in_flight: Dict[str, int] = {}
+        self._peak_in_flight: Dict[str, int] = {}
+        self._calls: Dict[str, int] = {}
+        self._peak_total = 0
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 100)),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE", 20)),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_SECONDS", 30))
+        )
+
+    def _count(self, event_name: str):
+        """Tally one httpcore trace event"""
+        key = {
+            "connection.connect_tcp.complete": "connections_opened",
+            "connection.start_tls.complete": "tls_handshakes"
+        }.get(event_name)
+        if key:
+            with self._lock:
+                self._counters[key] += 1
+
+    def sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None:
+                def trace(event_name, info):
+                    self._count(event_name)
+
+                def on_request(request):
+                    with self._lock:
+                        self._counters["requests"] += 1
+                    request.extensions["trace"] = trace
+
+                self._sync_client = httpx.Client(
+                    limits=self._limits(), timeout=httpx.Timeout(600, connect=10),
+                    event_hooks={"request": [on_request]}
+                )
+            return self._sync_client
+
+    def async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_client is None:
+                async def trace(event_name, info):
+                    self._count(event_name)
+
+                async def on_request(request):
+                    with self._lock:
+                        self._counters["requests"] += 1
+                    request.extensions["trace"] = trace
+
+                self._async_client = httpx.AsyncClient(
+                    transport=LoopTransport(self._limits()), timeout=httpx.Timeout(600, connect=10),
+                    event_hooks={"request": [on_request]}
+                )
+            return self._async_client
+
+    def _enter(self, model: str):
+        with self._lock:
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+            self._peak_in_flight[model] = max(self._peak_in_flight.get(model, 0), self._in_flight[model])
+            self._calls[model] = self._calls.get(model, 0) + 1
+            self._peak_total = max(self._peak_total, sum(self._in_flight.values()))
+
+    def _exit(self, model: str):
+        with self._lock:
+            self._in_flight[model] -= 1
+
+    @contextmanager
+    def slot(self, model: str):
+        """Hold one of the provider's concurrency slots for a blocking call"""
+        if self._thread_slots is not None:
+            with self._lock:
+                self._counters["waiting"] += 1
+            started = time.perf_counter()
+            self._thread_slots.acquire()
+            note_queue_wait(time.perf_counter() - started)
+            with self._lock:
+                self._counters["waiting"] -= 1
+        self._enter(model)
+        try:
+            yield
+        finally:
+            self._exit(model)
+            if self._thread_slots is not None:
+                self._thread_slots.release()
+
+    @asynccontextmanager
+    async def aslot(self, model: str):
+        """Hold one of the provider's concurrency slots for an async call"""
+        slots = None
+        if self.max_concurrency:
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                slots = self._loop_slots.get(loop)
+                if slots is None:
+                    slots = self._loop_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+                self._counters["waiting"] += 1
+            started = time.perf_counter()
+            try:
+                await slots.acquire()
+                note_queue_wait(time.perf_counter() - started)
+            finally:
+                with self._lock:
+                    self._counters["waiting"] -= 1
+        self._enter(model)
+        try:
+            yield
+        finally:
+            self._exit(model)
+            if slots is not None:
+                slots.release()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            requests = self._counters["requests"]
+            opened = self._counters["connections_opened"]
+            return {
+                **self._counters,
+                "max_concurrency": self.max_concurrency,
+                "connection_reuse_ratio": round(1 - opened / requests, 4) if requests else 0.0,
+                "in_flight": sum(self._in_flight.values()),
+                "peak_in_flight": self._peak_total,
+                "models": {
+                    model: {
+                        "calls": self._calls[model],
+                        "in_flight": self._in_flight[model],
+                        "peak_in_flight": self._peak_in_flight[model]
+                    }
+                    for model in self._calls
+                }
+            }
+
+    def close(self):
+        """Close the sync client; the async client is closed by aclose()"""
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+    async def aclose(self):
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
+
+class PooledChatModel(BaseChatModel):
+    """Chat model that runs a provider client inside its pool's concurrency limit
+
+    model_name and temperature mirror the wrapped client so the LLM response
+    cache keys pooled and unpooled clients the same way.
+    """
+
+    client: BaseChatModel
+    pool: Any
+    provider: str
+    model_name: str
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return self.client._llm_type
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        with self.pool.slot(self.model_name):
+            message = self.client.invoke(messages, INNER_CONFIG, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        async with self.pool.aslot(self.model_name):
+            message = await self.client.ainvoke(messages, INNER_CONFIG, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        with self.pool.slot(self.model_name):
+            for message in self.client.stream(messages, INNER_CONFIG, stop=stop, **kwargs):
+                chunk = ChatGenerationChunk(message=message)
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async with self.pool.aslot(self.model_name):
+            async for message in self.client.astream(messages, INNER_CONFIG, stop=stop, **kwargs):
+                chunk = ChatGenerationChunk(message=message)
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+class ClientFactory:
+    """Hands out one shared chat model per (provider, model, temperature)
+
+    LLM_BACKEND=stub swaps every provider for the offline SimulatedChatModel
+    (reply LLM_STUB_REPLY after LLM_STUB_LATENCY seconds), keeping the same
+    pooling, limits and metrics, for benchmarking without API access.
+    """
+
+    def __init__(self, backend: str = None):
+        self.backend = backend or os.getenv("LLM_BACKEND", "live")
+        self._lock = threading.Lock()
+        self._models: Dict[tuple, PooledChatModel] = {}
+        self._pools: Dict[str, ProviderPool] = {}
+        self._lookups = 0
+
+    def pool(self, provider: str) -> ProviderPool:
+        with self._lock:
+            if provider not in self._pools:
+                self._pools[provider] = ProviderPool(provider)
+            return self._pools[provider]
+
+    def get(self, provider: str, model: str, temperature: float = 0.0) -> PooledChatModel:
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider: {provider}")
+        if self.backend == "stub":
+            provider = "stub"
+
+        key = (provider, model, temperature)
+        with self._lock:
+            self._lookups += 1
+            chat_model = self._models.get(key)
+        if chat_model is not None:
+            return chat_model
+
+        pool = self.pool(provider)
+        chat_model = PooledChatModel(
+            client=self._build(provider, model, temperature, pool),
+            pool=pool, provider=provider, model_name=model, temperature=temperature
+        )
+        with self._lock:
+            # Another thread may have built the same client meanwhile; keep the first
+            return self._models.setdefault(key, chat_model)
+
+    def _build(self, provider: str, model: str, temperature: float, pool: ProviderPool) -> BaseChatModel:
+        if provider == "openai":
+            from langchain_openai import ChatOpenAI
+            return ChatOpenAI(
+                model=model, temperature=temperature,
+                http_client=pool.sync_client(), http_async_client=pool.async_client()
+            )
+        if provider == "anthropic":
+            from langchain_anthropic import ChatAnthropic
+            # ChatAnthropic takes no http_client; it already shares one
+            # keep-alive client per API URL across instances, so only the
+            # concurrency limit and call counts come from the pool
+            return ChatAnthropic(model=model, temperature=temperature)
+
+        from llm.stub import SimulatedChatModel
+        return SimulatedChatModel(
+            reply=os.getenv("LLM_STUB_REPLY", "UTILITY"),
+            latency=float(os.getenv("LLM_STUB_LATENCY", 0.2)),
+            temperature=temperature
+        )
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            pools = dict(self._pools)
+            clients, lookups = len(self._models), self._lookups
+        return {
+            "backend": self.backend,
+            "clients": clients,
+            "lookups": lookups,
+            "client_reuse_ratio": round(1 - clients / lookups, 4) if lookups else 0.0,
+            "providers": {provider: pool.metrics() for provider, pool in pools.items()}
+        }
+
+    async def aclose(self):
+        """Close every pooled HTTP client"""
+        for pool in list(self._pools.values()):
+            pool.close()
+            await pool.aclose()
+
+_factory: Optional[ClientFactory] = None
+_factory_lock = threading.Lock()
+
+def get_client_factory() -> ClientFactory:
+    """Process-wide factory configured from the environment"""
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = ClientFactory()
+        return _factory
+
+def get_chat_model(provider: str, model: str, temperature: float = 0.0) -> PooledChatModel:
+    """Shared client for (provider, model, temperature) from the process-wide factory"""
+    return get_client_factory().get(provider, model, temperature)
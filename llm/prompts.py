@@ -0,0 +1,258 @@
+"""
+Token-budgeted prompt construction and OCR text compaction for LLM nodes
+"""
+
+import math
+import os
+import re
+import textwrap
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+# Tokens per prompt for each scope (router or bill type) unless overridden
+# by <SCOPE>_PROMPT_BUDGET; PROMPT_TOKEN_BUDGET covers every other scope
+DEFAULT_PROMPT_BUDGETS = {"ROUTER": 600}
+DEFAULT_PROMPT_BUDGET = 1500
+
+# Lines that carry no negotiation value: page furniture, separators and
+# remittance instructions
+BOILERPLATE = re.compile("|".join([
+    r"^page \d+ (of|/) \d+$",
+    r"^\(?(continued|cont'?d?\.?)( on (the )?(next|reverse) (page|side))?\)?$",
+    r"^[-=_*.~#|+\s]+$",
+    r"please (detach|tear off|return this portion)",
+    r"thank you for (your (business|payment)|choosing)",
+    r"printed on recycled paper",
+    r"this (page|side) (is )?(intentionally )?left blank",
+    r"see (the )?reverse (side )?for"
+]), re.IGNORECASE)
+AMOUNT = re.compile(r"\$?\d[\d,]*\.\d{2}\b")
+TOTALS = re.compile(r"amount due|total|balance|due date|minimum payment", re.IGNORECASE)
+TOKEN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+OMITTED = "[...]"
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken encoding when PROMPT_TOKENIZER=tiktoken and it is available"""
+    if os.getenv("PROMPT_TOKENIZER", "approx") != "tiktoken":
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(os.getenv("PROMPT_TOKEN_ENCODING", "cl100k_base"))
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """Count prompt tokens locally
+
+    The default approximation follows BPE tokenizers closely enough for
+    budgeting: one token per short word or punctuation mark, more for long
+    words, one per three digits. PROMPT_TOKENIZER=tiktoken counts exactly
+    when the tiktoken encoding is installed or cached.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    tokens = 0
+    for piece in TOKEN.findall(text):
+        if piece.isalpha():
+            tokens += 1 + len(piece) // 8
+        elif piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+@lru_cache(maxsize=256)
+def compact_ocr_text(text: str) -> str:
+    """Shrink OCR text without losing billing content
+
+    Whitespace runs inside a line become single spaces, and wide gaps or
+    dot leaders between table columns become " | ". Blank lines,
+    boilerplate and repeated lines are dropped (page headers and footers on
+    multi-page bills). Lines with dollar amounts are never deduplicated, so
+    duplicate charges stay visible to the error check.
+    """
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        line = re.sub(r"\$\s+(?=\d)", "$", line.strip())
+        line = re.sub(r"\s*(\t|\s{2,}|\.{3,})\s*", " | ", line)
+        line = re.sub(r"\s+", " ", line).strip(" |")
+        if not line or BOILERPLATE.search(line):
+            continue
+        key = line.lower()
+        if key in seen and not AMOUNT.search(line):
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(lines)
+
+def _line_priority(position: int, line: str) -> int:
+    """The opening lines (provider, account) and totals matter most, then
+    amount lines, then numbered or bulleted points and figures"""
+    if position < 3 or TOTALS.search(line):
+        return 3
+    if AMOUNT.search(line):
+        return 2
+    if re.match(r"^(\d+[.)]|[-*•]|#+)\s", line) or re.search(r"\d", line):
+        return 1
+    return 0
+
+def summarize_section(text: str, budget: int) -> str:
+    """Cut text to at most budget tokens, keeping its most informative lines
+
+    Lines are kept in their original order, preferring the opening lines
+    and totals, then lines with amounts, then list items and figures, then earlier
+    lines. Gaps are marked with [...]. If no whole line fits, the text is
+    truncated by words.
+    """
+    if count_tokens(text) <= budget:
+        return text
+    lines = [line for line in text.splitlines() if line.strip()]
+    ranked = sorted(range(len(lines)), key=lambda i: (-_line_priority(i, lines[i]), i))
+
+    kept, used = [], count_tokens(OMITTED)
+    for i in ranked:
+        cost = count_tokens(lines[i])
+        if used + cost <= budget:
+            kept.append(i)
+            used += cost
+    # Gap markers were not counted above; shed the least important lines
+    # until they fit too
+    while kept:
+        summary = _join_kept(lines, set(kept))
+        if count_tokens(summary) <= budget:
+            return summary
+        kept.pop()
+
+    words, used = [], count_tokens(OMITTED)
+    for word in text.split():
+        used += count_tokens(word)
+        if used > budget:
+            break
+        words.append(word)
+    return " ".join(words + [OMITTED])
+
+def _join_kept(lines, kept) -> str:
+    output = []
+    for i, line in enumerate(lines):
+        if i in kept:
+            output.append(line)
+        elif not output or output[-1] != OMITTED:
+            output.append(OMITTED)
+    return "\n".join(output)
+
+class Prompt(str):
+    """Prompt text that remembers its token counts before and after budgeting"""
+
+    tokens: int
+    raw_tokens: int
+    trimmed: tuple
+
+def _render(template: str, values: Dict[str, str]) -> str:
+    """Fill {name} slots in one pass, so braces inside the values are never filled"""
+    return PLACEHOLDER.sub(lambda match: values.get(match.group(1), match.group(0)), template)
+
+def _allocate(sizes: Dict[str, int], available: int) -> Dict[str, int]:
+    """Split available tokens across sections, smallest first
+
+    Sections under their even share keep everything and hand the rest to
+    the larger ones.
+    """
+    shares = {}
+    remaining = max(available, 0)
+    ordered = sorted(sizes, key=sizes.get)
+    for position, name in enumerate(ordered):
+        share = remaining // (len(ordered) - position)
+        shares[name] = min(sizes[name], share)
+        remaining -= shares[name]
+    return shares
+
+def fill_prompt(template: str, budget: Optional[int], compact: Iterable[str] = (), **sections) -> Prompt:
+    """Fill the {name} slots of template so the prompt fits budget tokens
+
+    The template is dedented and the sections named in compact are OCR text
+    run through compact_ocr_text. If the prompt is still over budget the
+    largest sections are cut with summarize_section. A budget of 0 or None
+    only compacts. raw_tokens on the result is the size the prompt would
+    have had with the template and sections pasted verbatim.
+    """
+    raw = {name: str(value) for name, value in sections.items()}
+    raw_tokens = count_tokens(_render(template, raw))
+    template = textwrap.dedent(template).strip()
+    values = {
+        name: compact_ocr_text(value) if name in compact else value.strip()
+        for name, value in raw.items()
+    }
+
+    trimmed = []
+    if budget:
+        sizes = {name: count_tokens(value) for name, value in values.items()}
+        fixed = count_tokens(_render(template, {name: "" for name in values}))
+        shares = _allocate(sizes, budget - fixed)
+        for name, share in shares.items():
+            if sizes[name] > share:
+                values[name] = summarize_section(values[name], share)
+                trimmed.append(name)
+
+    prompt = Prompt(_render(template, values))
+    prompt.tokens = count_tokens(prompt)
+    prompt.raw_tokens = raw_tokens
+    prompt.trimmed = tuple(trimmed)
+    return prompt
+
+def prompt_budget(scope: str) -> int:
+    """Token budget from <SCOPE>_PROMPT_BUDGET or PROMPT_TOKEN_BUDGET (0 = unlimited)"""
+    value = os.getenv(f"{scope}_PROMPT_BUDGET") or os.getenv("PROMPT_TOKEN_BUDGET")
+    if value:
+        return int(value)
+    return DEFAULT_PROMPT_BUDGETS.get(scope, DEFAULT_PROMPT_BUDGET)
+
+class PromptStats:
+    """Tokens sent per LLM node, next to what unbudgeted prompts would have cost"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, node: str, prompt: str):
+        tokens = getattr(prompt, "tokens", None)
+        if tokens is None:
+            tokens = count_tokens(prompt)
+        raw_tokens = getattr(prompt, "raw_tokens", tokens)
+        with self._lock:
+            stats = self._nodes.setdefault(node, {"calls": 0, "tokens": 0, "raw_tokens": 0, "trimmed": 0})
+            stats["calls"] += 1
+            stats["tokens"] += tokens
+            stats["raw_tokens"] += raw_tokens
+            stats["trimmed"] += bool(getattr(prompt, "trimmed", ()))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            nodes = {name: dict(stats) for name, stats in self._nodes.items()}
+        for stats in nodes.values():
+            stats["avg_tokens"] = round(stats["tokens"] / stats["calls"], 1)
+            stats["reduction"] = round(1 - stats["tokens"] / stats["raw_tokens"], 4) if stats["raw_tokens"] else 0.0
+        tokens = sum(stats["tokens"] for stats in nodes.values())
+        raw_tokens = sum(stats["raw_tokens"] for stats in nodes.values())
+        return {
+            "tokens": tokens,
+            "raw_tokens": raw_tokens,
+            "reduction": round(1 - tokens / raw_tokens, 4) if raw_tokens else 0.0,
+            "nodes": nodes
+        }
+
+    def clear(self):
+        with self._lock:
+            self._nodes.clear()
+
+_prompt_stats = PromptStats()
+
+def get_prompt_stats() -> PromptStats:
+    """Process-wide per-node prompt token counters"""
+    return _prompt_stats
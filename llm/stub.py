@@ -0,0 +1,93 @@
+"""
+Offline stub chat and embedding models used by the stub backend, benchmarks and tests
+"""
+
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class SimulatedChatModel(BaseChatModel):
+    """Chat model that returns a canned reply after a fixed latency
+
+    The sync path sleeps the calling thread and the async path awaits
+    asyncio.sleep, mirroring how a real network-bound client behaves.
+    """
+
+    reply: str = "UTILITY"
+    latency: float = 0.2
+    # None mirrors clients that do not expose a temperature (never cached)
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated-chat-model"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _chunks(self) -> List[ChatGenerationChunk]:
+        words = self.reply.split(" ")
+        return [
+            ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            for i, word in enumerate(words)
+        ]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        """Stream the reply word by word, spreading the latency across tokens"""
+        for chunk in self._chunks():
+            time.sleep(self.latency / len(self.reply.split(" ")))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        """Stream the reply word by word, spreading the latency across tokens"""
+        for chunk in self._chunks():
+            await asyncio.sleep(self.latency / len(self.reply.split(" ")))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+class SimulatedEmbeddings(Embeddings):
+    """Embeddings with a fixed latency per request plus a smaller one per text
+
+    Vectors are derived from a hash of each text, so equal texts embed
+    equally. The latency split mirrors a remote embeddings API, where a
+    batch of texts costs little more than a single one.
+    """
+
+    def __init__(self, latency: float = 0.1, per_text_latency: float = 0.001, size: int = 64):
+        self.latency = latency
+        self.per_text_latency = per_text_latency
+        self.size = size
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode()).digest()
+        return [(digest[i % len(digest)] - 128) / 128 for i in range(self.size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency + self.per_text_latency * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
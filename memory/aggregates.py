@@ -0,0 +1,216 @@
+"""
+Incrementally maintained negotiation statistics behind /api/v1/stats
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+# Savings rates reported for a bill type until it has negotiations of its own
+DEFAULT_SAVINGS_RATES = {
+    'UTILITY': 0.18,      # 18% average savings
+    'MEDICAL': 0.35,      # 35% average savings
+    'SUBSCRIPTION': 0.25, # 25% average savings
+    'TELECOM': 0.22       # 22% average savings
+}
+DEFAULT_SAVINGS_RATE = 0.20
+DEFAULT_SUCCESS_RATE = 0.75
+
+FIELDS = ("negotiations", "successes", "amount", "savings", "confidence")
+DAY_SECONDS = 86400
+
+def _empty() -> Dict[str, float]:
+    return dict.fromkeys(FIELDS, 0)
+
+def _add(totals: Dict[str, float], other: Dict[str, float]):
+    for field in FIELDS:
+        totals[field] += other[field]
+
+def _summary(totals: Dict[str, float]) -> Dict:
+    negotiations = totals["negotiations"]
+    return {
+        "negotiations": negotiations,
+        "successes": totals["successes"],
+        "success_rate": round(totals["successes"] / negotiations, 4) if negotiations else None,
+        "savings": round(totals["savings"], 2),
+        "savings_rate": round(totals["savings"] / totals["amount"], 4) if totals["amount"] else None,
+        "avg_confidence": round(totals["confidence"] / negotiations, 4) if negotiations else None
+    }
+
+class NegotiationAggregates:
+    """Running counts, sums and success tallies per (bill type, company)
+
+    Every recorded negotiation is upserted into a per-day SQLite rollup and
+    added to in-memory totals, so reads never scan the vector collection:
+    all-time figures come from the running totals and windowed figures
+    (e.g. the last 7 or 30 days) from at most max_window_days daily buckets
+    per bill type. On start the totals are rebuilt from the rollup table.
+    """
+
+    def __init__(self, path: str = ":memory:", max_window_days: int = None):
+        self.path = path
+        self.max_window_days = (
+            max_window_days if max_window_days is not None else int(os.getenv("MEMORY_STATS_MAX_WINDOW_DAYS", 90))
+        )
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS negotiation_daily (
+                day INTEGER NOT NULL,
+                bill_type TEXT NOT NULL,
+                company TEXT NOT NULL,
+                negotiations INTEGER NOT NULL,
+                successes INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                savings REAL NOT NULL,
+                confidence REAL NOT NULL,
+                PRIMARY KEY (day, bill_type, company)
+            )
+        """)
+        self._db.commit()
+
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(_empty)
+        self._by_type: Dict[str, Dict[str, float]] = defaultdict(_empty)
+        self._by_company: Dict[str, Dict[str, float]] = defaultdict(_empty)
+        self._daily: Dict[Tuple[int, str], Dict[str, float]] = defaultdict(_empty)
+        self._pruned_day = self._today()
+        self._load()
+
+    def _load(self):
+        """Rebuild the in-memory totals from the rollup table"""
+        rows = self._db.execute(
+            "SELECT bill_type, company, SUM(negotiations), SUM(successes), SUM(amount), SUM(savings), "
+            "SUM(confidence) FROM negotiation_daily GROUP BY bill_type, company"
+        )
+        for bill_type, company, *values in rows:
+            totals = dict(zip(FIELDS, values))
+            _add(self._totals[(bill_type, company)], totals)
+            _add(self._by_type[bill_type], totals)
+            _add(self._by_company[company], totals)
+
+        since = self._today() - self.max_window_days
+        rows = self._db.execute(
+            "SELECT day, bill_type, SUM(negotiations), SUM(successes), SUM(amount), SUM(savings), "
+            "SUM(confidence) FROM negotiation_daily WHERE day > ? GROUP BY day, bill_type", (since,)
+        )
+        for day, bill_type, *values in rows:
+            _add(self._daily[(day, bill_type)], dict(zip(FIELDS, values)))
+
+    @staticmethod
+    def _today(now: float = None) -> int:
+        return int((now if now is not None else time.time()) // DAY_SECONDS)
+
+    def record(self, negotiation_data: Dict, now: float = None):
+        """Count one finished negotiation (successful or not)"""
+        bill_type = str(negotiation_data.get("bill_type") or "UNKNOWN").upper()
+        company = str(negotiation_data.get("company") or "Unknown")
+        day = self._today(now)
+        totals = {
+            "negotiations": 1,
+            "successes": int(bool(negotiation_data.get("success", False))),
+            "amount": float(negotiation_data.get("amount") or 0),
+            "savings": float(negotiation_data.get("savings") or 0),
+            "confidence": float(negotiation_data.get("confidence") or 0)
+        }
+
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO negotiation_daily (day, bill_type, company, negotiations, successes, amount, "
+                "savings, confidence) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (day, bill_type, company) DO UPDATE SET "
+                "negotiations = negotiations + excluded.negotiations, "
+                "successes = successes + excluded.successes, amount = amount + excluded.amount, "
+                "savings = savings + excluded.savings, confidence = confidence + excluded.confidence",
+                (day, bill_type, company, *(totals[field] for field in FIELDS))
+            )
+            self._db.commit()
+            _add(self._totals[(bill_type, company)], totals)
+            _add(self._by_type[bill_type], totals)
+            _add(self._by_company[company], totals)
+            _add(self._daily[(day, bill_type)], totals)
+            today = self._today()
+            if today != self._pruned_day:
+                self._prune(today)
+
+    def _prune(self, today: int):
+        """Drop daily buckets older than the longest window; caller must hold the lock"""
+        self._pruned_day = today
+        for key in [key for key in self._daily if key[0] <= today - self.max_window_days]:
+            del self._daily[key]
+
+    def totals(self, bill_type: str = None, company: str = None, window_days: int = None) -> Dict[str, float]:
+        """Summed counters, optionally for one bill type, company or recent window
+
+        A window covers today and the window_days - 1 days before it (at
+        most max_window_days) and cannot be combined with company, since
+        daily buckets are kept per bill type.
+        """
+        bill_type = bill_type.upper() if bill_type else None
+        totals = _empty()
+        with self._lock:
+            if window_days:
+                if company:
+                    raise ValueError("window_days cannot be combined with company")
+                today = self._today()
+                bill_types = [bill_type] if bill_type else list(self._by_type)
+                buckets: Iterable = [
+                    self._daily[(day, day_type)]
+                    for day in range(today - min(window_days, self.max_window_days) + 1, today + 1)
+                    for day_type in bill_types if (day, day_type) in self._daily
+                ]
+            elif company and bill_type:
+                buckets = [self._totals.get((bill_type, company), _empty())]
+            elif company:
+                buckets = [self._by_company.get(company, _empty())]
+            elif bill_type:
+                buckets = [self._by_type.get(bill_type, _empty())]
+            else:
+                buckets = self._by_type.values()
+            for values in buckets:
+                _add(totals, values)
+        return totals
+
+    def success_rate(self, company: str = None, bill_type: str = None, window_days: int = None) -> float:
+        """Share of recorded negotiations that succeeded (DEFAULT_SUCCESS_RATE without data)"""
+        totals = self.totals(bill_type, company, window_days)
+        if not totals["negotiations"]:
+            return DEFAULT_SUCCESS_RATE
+        return totals["successes"] / totals["negotiations"]
+
+    def savings_rate(self, bill_type: str = None, window_days: int = None) -> float:
+        """Savings as a share of billed amounts (the bill type's default without data)"""
+        totals = self.totals(bill_type, window_days=window_days)
+        if not totals["amount"]:
+            return DEFAULT_SAVINGS_RATES.get(bill_type.upper() if bill_type else None, DEFAULT_SAVINGS_RATE)
+        return totals["savings"] / totals["amount"]
+
+    def stats(self, windows: Iterable[int] = (), bill_types: Iterable[str] = ()) -> Dict:
+        """All-time and windowed summaries, overall and per bill type"""
+        with self._lock:
+            bill_types = sorted(set(bill_types) | set(self._by_type))
+
+        def summarize(window_days: Optional[int]) -> Dict:
+            return {
+                **_summary(self.totals(window_days=window_days)),
+                "by_bill_type": {
+                    bill_type: _summary(self.totals(bill_type, window_days=window_days))
+                    for bill_type in bill_types
+                }
+            }
+
+        return {
+            "all_time": summarize(None),
+            "windows": {f"{days}d": summarize(days) for days in windows}
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
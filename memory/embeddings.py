@@ -0,0 +1,168 @@
+"""
+Pluggable embedding backends for the negotiation memory
+
+MEMORY_EMBEDDINGS selects the backend: "openai" (remote, the default),
+"sentence-transformers" (a local CPU model, MEMORY_EMBEDDING_MODEL) or
+"hashing" (a zero-dependency feature-hashing vectorizer). Every backend is
+wrapped in CachedEmbeddings, which embeds each distinct text once.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_SENTENCE_MODEL = "all-MiniLM-L6-v2"
+WORD = re.compile(r"[a-z0-9]+(?:[&'+.-][a-z0-9]+)*")
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashing vectorizer: no model, no network, no dependencies
+
+    Words, word bigrams and character trigrams are hashed (CRC32) into
+    `size` signed buckets with sublinear term frequency and the vector is
+    L2-normalized. Texts sharing vocabulary (company names, strategies,
+    bill types) land close together; misspellings still share trigrams.
+    """
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _features(self, text: str) -> Dict[str, float]:
+        words = WORD.findall(text.lower())
+        counts: Dict[str, float] = {}
+        for word in words:
+            counts["w:" + word] = counts.get("w:" + word, 0) + 1
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                trigram = "c:" + padded[i:i + 3]
+                counts[trigram] = counts.get(trigram, 0) + 0.5
+        for first, second in zip(words, words[1:]):
+            bigram = f"b:{first} {second}"
+            counts[bigram] = counts.get(bigram, 0) + 1
+        return counts
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for feature, count in self._features(text).items():
+            hashed = zlib.crc32(feature.encode())
+            sign = 1.0 if hashed & 0x80000000 else -1.0
+            weight = 1 + math.log(count) if count > 1 else count
+            vector[hashed % self.size] += sign * weight
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """Local sentence-transformers model run on the CPU in batches
+
+    Requires the optional sentence-transformers package; the model is
+    downloaded on first use and cached by the library.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_SENTENCE_MODEL, batch_size: int = 64, device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "MEMORY_EMBEDDINGS=sentence-transformers needs the sentence-transformers package"
+            ) from e
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class CachedEmbeddings(Embeddings):
+    """LRU cache in front of an embeddings backend, keyed by a hash of the text
+
+    Texts missing from the cache are embedded in a single embed_documents
+    call per request (duplicates once), so batching is preserved. backend
+    names the wrapped model; vectors from different backends never mix.
+    """
+
+    def __init__(self, embeddings: Embeddings, backend: str, max_entries: int = None):
+        self.embeddings = embeddings
+        self.backend = backend
+        self.max_entries = (
+            max_entries if max_entries is not None else int(os.getenv("MEMORY_EMBEDDING_CACHE_SIZE", 10000))
+        )
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "batches": 0, "evictions": 0}
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.backend}\0{text}".encode()).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.setdefault(key, texts[i])
+                    continue
+                self._entries.move_to_end(key)
+                vectors[i] = vector
+            self._counters["hits"] += len(texts) - sum(vector is None for vector in vectors)
+            self._counters["misses"] += len(missing)
+
+        if missing:
+            embedded = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            with self._lock:
+                self._counters["batches"] += 1
+                for key, vector in embedded.items():
+                    self._remember(key, vector)
+            vectors = [vector if vector is not None else embedded[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _remember(self, key: str, vector: List[float]):
+        """Insert into the LRU; caller must hold the lock"""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "backend": self.backend,
+                "entries": len(self._entries),
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0
+            }
+
+def create_embeddings(backend: str = None) -> CachedEmbeddings:
+    """Cached embeddings for MEMORY_EMBEDDINGS (or the given backend name)"""
+    backend = (backend or os.getenv("MEMORY_EMBEDDINGS", "openai")).lower()
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return CachedEmbeddings(OpenAIEmbeddings(), "openai")
+    if backend == "hashing":
+        size = int(os.getenv("MEMORY_EMBEDDING_SIZE", 384))
+        return CachedEmbeddings(HashingEmbeddings(size), f"hashing-{size}")
+    if backend in ("sentence-transformers", "local"):
+        model_name = os.getenv("MEMORY_EMBEDDING_MODEL", DEFAULT_SENTENCE_MODEL)
+        return CachedEmbeddings(SentenceTransformerEmbeddings(model_name), f"st-{model_name.split('/')[-1]}")
+    raise ValueError(f"Unknown MEMORY_EMBEDDINGS backend: {backend}")
@@ -0,0 +1,207 @@
+"""
+Past successful strategies recalled by the specialist graphs
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from llm.prompts import summarize_section
+
+def _strategy(content: str) -> str:
+    """The strategy part of a stored "Company: ... Strategy: ... Outcome: ..." text"""
+    strategy = content.split("Strategy: ", 1)[-1]
+    return strategy.rsplit(" Outcome: ", 1)[0].strip()
+
+class StrategyRecall:
+    """Top-k past successful strategies per (bill type, company), for reuse
+
+    Lookups go to NegotiationMemory.retrieve_similar filtered on bill type,
+    company and success, and are kept in an LRU of the max_companies most
+    recently negotiated companies for ttl seconds, so hot companies cost no
+    vector search. A past strategy is close enough to reuse outright when
+    it was stored with at least reuse_confidence and its bill amount is
+    within amount_tolerance of the current one; otherwise the strategies
+    found are handed to the first analysis prompt as a compact context of
+    at most context_tokens tokens.
+
+    Without a memory nothing is recalled. stats() reports how often the
+    reuse path fires and the analysis latency it saved, estimated from the
+    running average of the analysis calls it skipped.
+    """
+
+    def __init__(self, memory=None, k: int = None, max_companies: int = None, ttl: float = None,
+                 reuse_confidence: float = None, amount_tolerance: float = None, context_tokens: int = None):
+        self.memory = memory
+        self.k = k if k is not None else int(os.getenv("STRATEGY_RECALL_K", 3))
+        self.max_companies = (
+            max_companies if max_companies is not None else int(os.getenv("STRATEGY_CACHE_COMPANIES", 256))
+        )
+        self.ttl = ttl if ttl is not None else float(os.getenv("STRATEGY_CACHE_SECONDS", 300))
+        self.reuse_confidence = (
+            reuse_confidence if reuse_confidence is not None
+            else float(os.getenv("STRATEGY_REUSE_CONFIDENCE", 0.85))
+        )
+        self.amount_tolerance = (
+            amount_tolerance if amount_tolerance is not None
+            else float(os.getenv("STRATEGY_REUSE_AMOUNT_TOLERANCE", 0.25))
+        )
+        self.context_tokens = (
+            context_tokens if context_tokens is not None else int(os.getenv("STRATEGY_CONTEXT_TOKENS", 200))
+        )
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict]]]" = OrderedDict()
+        self._counters = {"lookups": 0, "cache_hits": 0, "searches": 0, "with_history": 0, "reused": 0}
+        # Bill type -> [analysis calls timed, seconds], and the seconds saved by reuse
+        self._analysis: Dict[str, List[float]] = {}
+        self._saved: Dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory is not None
+
+    @staticmethod
+    def _key(bill_type: str, company: str) -> Tuple[str, str]:
+        return bill_type.upper(), company or ""
+
+    def cached(self, bill_type: str, company: str) -> Optional[List[Dict]]:
+        """Strategies for a hot company without searching, None when not cached"""
+        if not self.enabled:
+            return []
+        key = self._key(bill_type, company)
+        with self._lock:
+            self._counters["lookups"] += 1
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            self._counters["cache_hits"] += 1
+            return entry[1]
+
+    def search(self, bill_type: str, company: str) -> List[Dict]:
+        """Search the memory for a company's past successful strategies and cache them"""
+        results = self.memory.retrieve_similar(
+            f"Company: {company} {bill_type}", k=self.k, bill_type=bill_type, company=company, success=True
+        )
+        strategies = [
+            {**result["metadata"], "strategy": _strategy(result["content"])}
+            for result in results if _strategy(result["content"])
+        ]
+        with self._lock:
+            self._counters["searches"] += 1
+            if self.max_companies > 0:
+                self._entries[self._key(bill_type, company)] = (time.monotonic(), strategies)
+                self._entries.move_to_end(self._key(bill_type, company))
+                while len(self._entries) > self.max_companies:
+                    self._entries.popitem(last=False)
+        return strategies
+
+    def lookup(self, bill_type: str, company: str) -> List[Dict]:
+        """Past successful strategies for the company, from the cache when it is hot"""
+        strategies = self.cached(bill_type, company)
+        return strategies if strategies is not None else self.search(bill_type, company)
+
+    def invalidate(self, bill_type: str, company: str):
+        """Forget a company's cached strategies (after storing a new one)"""
+        with self._lock:
+            self._entries.pop(self._key(bill_type, company), None)
+
+    def close_match(self, strategies: List[Dict], amount: float) -> Optional[Dict]:
+        """The most confident strategy close enough to reuse for a bill of amount, if any"""
+        def close(strategy):
+            past = strategy.get("amount", 0)
+            return abs(past - amount) <= self.amount_tolerance * max(amount, past)
+
+        matches = [
+            strategy for strategy in strategies
+            if strategy.get("confidence", 0) >= self.reuse_confidence and close(strategy)
+        ]
+        return max(matches, key=lambda strategy: strategy.get("confidence", 0), default=None)
+
+    def context(self, strategies: List[Dict]) -> str:
+        """Compact prompt section listing past strategies, empty without any"""
+        if not strategies:
+            return ""
+        share = max(self.context_tokens // len(strategies), 1)
+        lines = [
+            f"- ${strategy.get('amount', 0):.2f} bill, ${strategy.get('savings', 0):.2f} saved: "
+            f"{summarize_section(strategy['strategy'], share)}"
+            for strategy in strategies
+        ]
+        return "Past successful strategies with this company:\n" + "\n".join(lines)
+
+    def recall(self, bill_type: str, company: str, amount: float, strategies: List[Dict] = None,
+               reuse: bool = True) -> Dict[str, str]:
+        """State update for a specialist graph: past_strategies and reused_strategy
+
+        Without reuse every strategy found goes into past_strategies.
+        """
+        if strategies is None:
+            strategies = self.lookup(bill_type, company) if self.enabled else []
+        match = self.close_match(strategies, amount or 0) if reuse else None
+        if strategies:
+            with self._lock:
+                self._counters["with_history"] += 1
+        return {
+            "past_strategies": "" if match else self.context(strategies),
+            "reused_strategy": match["strategy"] if match else ""
+        }
+
+    def record_analysis(self, bill_type: str, seconds: float):
+        """Time one analysis call that reuse would have skipped"""
+        with self._lock:
+            timed = self._analysis.setdefault(bill_type, [0, 0.0])
+            timed[0] += 1
+            timed[1] += seconds
+
+    def record_reuse(self, bill_type: str):
+        """Count a skipped analysis call, saving its average latency so far"""
+        with self._lock:
+            self._counters["reused"] += 1
+            calls, seconds = self._analysis.get(bill_type, (0, 0.0))
+            self._saved[bill_type] = self._saved.get(bill_type, 0.0) + (seconds / calls if calls else 0.0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            analyses = sum(int(calls) for calls, _ in self._analysis.values())
+            by_bill_type = {
+                bill_type: {
+                    "analysis_calls": int(calls),
+                    "avg_analysis_seconds": round(seconds / calls, 4) if calls else 0.0,
+                    "saved_seconds": round(self._saved.get(bill_type, 0.0), 4)
+                }
+                for bill_type, (calls, seconds) in self._analysis.items()
+            }
+            saved = sum(self._saved.values())
+            companies = len(self._entries)
+        decisions = analyses + counters["reused"]
+        return {
+            **counters,
+            "enabled": self.enabled,
+            "cached_companies": companies,
+            "cache_hit_ratio": round(counters["cache_hits"] / counters["lookups"], 4) if counters["lookups"] else 0.0,
+            "reuse_rate": round(counters["reused"] / decisions, 4) if decisions else 0.0,
+            "saved_seconds": round(saved, 4),
+            "by_bill_type": by_bill_type
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+_recall = StrategyRecall()
+_recall_lock = threading.Lock()
+
+def get_strategy_recall() -> StrategyRecall:
+    """Process-wide strategy recall used by the specialist graphs (disabled until a memory is set)"""
+    with _recall_lock:
+        return _recall
+
+def set_strategy_recall(recall: StrategyRecall):
+    """Replace the process-wide strategy recall (affects graphs built afterwards)"""
+    global _recall
+    with _recall_lock:
+        _recall = recall
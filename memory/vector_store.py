@@ -1,61 +1,418 @@
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
-from typing import Dict, List
+from langchain_core.documents import Document
+from typing import Dict, List, Optional
+import json
 import os
+import re
+import threading
+import time
+import uuid
+
+from memory.aggregates import NegotiationAggregates
+from memory.embeddings import create_embeddings
+
+PENDING_LOG = "pending_writes.jsonl"
+STATS_DB = "negotiation_stats.sqlite3"
+# Longest wait before the background flusher retries after consecutive failures
+FLUSH_RETRY_MAX_SECONDS = 60.0
+
+def _needs_manual_persist() -> bool:
+    """chromadb before 0.4 only writes to disk on persist()"""
+    import chromadb
+    major, minor = chromadb.__version__.split(".")[:2]
+    return (int(major), int(minor)) < (0, 4)
+
+def collection_name(backend: str) -> str:
+    """Chroma collection for vectors from the given embeddings backend"""
+    if backend == "openai":
+        return "negotiation_history"
+    return "negotiation_history_" + re.sub(r"[^A-Za-z0-9._-]", "-", backend)[:40]
+
+def metadata_filter(bill_type: str = None, company: str = None, success: bool = None,
+                    min_amount: float = None, max_amount: float = None) -> Optional[Dict]:
+    """Chroma where clause for the given predicates (None when unfiltered)"""
+    conditions = []
+    if bill_type:
+        conditions.append({"bill_type": bill_type.upper()})
+    if company:
+        conditions.append({"company": company})
+    if success is not None:
+        conditions.append({"success": success})
+    if min_amount is not None:
+        conditions.append({"amount": {"$gte": float(min_amount)}})
+    if max_amount is not None:
+        conditions.append({"amount": {"$lte": float(max_amount)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def squared_l2(a: List[float], b: List[float]) -> float:
+    """Distance as reported by Chroma's default (l2) index"""
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+def matches_filter(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a metadata_filter where clause against one record's metadata"""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(matches_filter(metadata, condition) for condition in where["$and"])
+    (field, condition), = where.items()
+    value = metadata.get(field)
+    if not isinstance(condition, dict):
+        return value == condition
+    if value is None:
+        return False
+    if "$gte" in condition:
+        return value >= condition["$gte"]
+    return value <= condition["$lte"]
 
 class NegotiationMemory:
-    """Vector store for storing and retrieving successful negotiation strategies"""
+    """Vector store for storing and retrieving successful negotiation strategies
+    
+    Writes are buffered: store_negotiation appends the negotiation to a local
+    append-only log and returns, and a background thread embeds and adds
+    buffered negotiations in one batch once batch_size are pending or the
+    oldest has waited flush_interval seconds. Entries still in the log when
+    the process dies are replayed on the next start; each carries a stable
+    ID, so replaying a batch that was already added is harmless.
+    batch_size 0 writes every negotiation through immediately. Searches
+    see buffered negotiations without waiting for them to be added. After a
+    failed background flush the thread waits flush_interval, doubling per
+    consecutive failure up to FLUSH_RETRY_MAX_SECONDS, before retrying, and
+    adds at most batch_size negotiations per batch so a backlog does not
+    become one huge embedding call; the error is reported by write_stats.
+    
+    Embeddings come from the MEMORY_EMBEDDINGS backend unless given. Each
+    backend gets its own collection, since vectors of different models
+    cannot be compared. With partition_by_bill_type each bill type is
+    stored in a collection of its own, so bill-type filtered searches
+    only walk that bill type's index.
     
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        self.embeddings = OpenAIEmbeddings()
+    Success rates and savings come from NegotiationAggregates, updated on
+    every store_negotiation and record_outcome, not from the vectors.
+    """
+    
+    def __init__(self, persist_directory: str = "./chroma_db", embeddings=None,
+                 batch_size: int = None, flush_interval: float = None, fsync: bool = None,
+                 filter_probe: int = None, partition_by_bill_type: bool = None,
+                 aggregates: NegotiationAggregates = None):
+        self.embeddings = embeddings or create_embeddings()
         self.persist_directory = persist_directory
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv("MEMORY_BATCH_SIZE", 32))
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else float(os.getenv("MEMORY_FLUSH_SECONDS", 2))
+        )
+        self.fsync = fsync if fsync is not None else os.getenv("MEMORY_LOG_FSYNC", "true").lower() == "true"
+        self.filter_probe = filter_probe if filter_probe is not None else int(os.getenv("MEMORY_FILTER_PROBE", 4))
+        self.partition_by_bill_type = (
+            partition_by_bill_type if partition_by_bill_type is not None
+            else os.getenv("MEMORY_PARTITION_BY_BILL_TYPE", "false").lower() == "true"
+        )
         
         # Ensure directory exists
         os.makedirs(persist_directory, exist_ok=True)
+        self.aggregates = aggregates or NegotiationAggregates(
+            os.getenv("MEMORY_STATS_PATH") or os.path.join(persist_directory, STATS_DB)
+        )
+        
+        self.collection_name = collection_name(getattr(self.embeddings, "backend", "openai"))
+        self.vector_store = self._open_collection(self.collection_name)
+        self._manual_persist = _needs_manual_persist()
+        
+        # Bill type -> partition collection, including partitions from earlier runs
+        self._partitions: Dict[str, Chroma] = {}
+        self._partitions_lock = threading.Lock()
+        if self.partition_by_bill_type:
+            prefix = self.collection_name + "."
+            for collection in self.vector_store._client.list_collections():
+                name = getattr(collection, "name", collection)
+                if name.startswith(prefix):
+                    self._partitions[name[len(prefix):].upper()] = self._open_collection(name)
+        
+        self._lock = threading.Lock()
+        # Held for a whole flush so batches are added one at a time, in order
+        self._flush_lock = threading.Lock()
+        # Held only while Chroma writes or searches an index: a search that
+        # overlaps an upsert can see IDs whose documents are not written yet
+        self._index_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = None
+        self._counters = {"stored": 0, "flushed": 0, "batches": 0, "failed_batches": 0, "flush_seconds": 0.0}
+        self.last_error = None
+        # Consecutive failed flushes and when the background flusher may retry
+        self._failures = 0
+        self._retry_at = 0.0
+        # The batch being added by flush(), still searched from memory until it is indexed
+        self._flushing: List[Dict] = []
         
-        self.vector_store = Chroma(
-            collection_name="negotiation_history",
+        self.log_path = os.path.join(persist_directory, PENDING_LOG)
+        self._pending = self._replay_log()
+        self._oldest = time.monotonic() if self._pending else None
+        self._log = open(self.log_path, "a", encoding="utf-8")
+        if self._pending:
+            self._start_flusher()
+            self._wake.set()
+    
+    def _open_collection(self, name: str) -> Chroma:
+        return Chroma(
+            collection_name=name,
             embedding_function=self.embeddings,
-            persist_directory=persist_directory
+            persist_directory=self.persist_directory,
+            client=getattr(getattr(self, "vector_store", None), "_client", None),
+            # Search breadth for new collections; Chroma's default of 10
+            # misses true neighbours in larger stores
+            collection_metadata={"hnsw:search_ef": int(os.getenv("MEMORY_SEARCH_EF", 100))}
         )
     
+    def _partition(self, bill_type: str) -> Chroma:
+        """Collection holding negotiations of this bill type"""
+        if not self.partition_by_bill_type or not bill_type:
+            return self.vector_store
+        bill_type = bill_type.upper()
+        with self._partitions_lock:
+            if bill_type not in self._partitions:
+                name = f"{self.collection_name}.{re.sub(r'[^a-z0-9_-]', '-', bill_type.lower())}"
+                self._partitions[bill_type] = self._open_collection(name)
+            return self._partitions[bill_type]
+    
+    def _replay_log(self) -> List[Dict]:
+        """Negotiations logged but not yet added to the vector store"""
+        if not os.path.exists(self.log_path):
+            return []
+        pending = []
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    pending.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append
+                    continue
+        return pending
+    
+    def _append_log(self, records: List[Dict]):
+        """Append records to the log; caller must hold the lock"""
+        self._log.write("".join(json.dumps(record) + "\n" for record in records))
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+    
+    def _rewrite_log(self):
+        """Replace the log with the still-pending records; caller must hold the lock"""
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in self._pending))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self._log.close()
+        os.replace(tmp_path, self.log_path)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+    
+    def record_outcome(self, negotiation_data: Dict):
+        """Count a finished negotiation in the statistics without storing its strategy"""
+        self.aggregates.record(negotiation_data)
+    
     def store_negotiation(self, negotiation_data: Dict):
         """Store successful negotiation strategies"""
-        texts = [
-            f"Company: {negotiation_data['company']} "
-            f"Strategy: {negotiation_data['strategy']} "
-            f"Outcome: {negotiation_data.get('outcome', 'Unknown')}"
-        ]
+        record = {
+            "id": uuid.uuid4().hex,
+            "text": (
+                f"Company: {negotiation_data['company']} "
+                f"Strategy: {negotiation_data['strategy']} "
+                f"Outcome: {negotiation_data.get('outcome', 'Unknown')}"
+            ),
+            "metadata": {
+                'company': negotiation_data['company'],
+                # Numbers are stored as floats and bill types upper-case so
+                # where-clause comparisons match every record
+                'savings': float(negotiation_data.get('savings', 0)),
+                'bill_type': negotiation_data['bill_type'].upper(),
+                'success': negotiation_data.get('success', False),
+                'amount': float(negotiation_data.get('amount', 0)),
+                'confidence': float(negotiation_data.get('confidence', 0)),
+                'timestamp': negotiation_data.get('timestamp', '')
+            }
+        }
+        
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("NegotiationMemory is closed")
+            self._append_log([record])
+            self._pending.append(record)
+            self._counters["stored"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.batch_size
+        # Counted once here; replaying the log after a crash only re-adds vectors
+        self.aggregates.record(record["metadata"])
+        
+        if self.batch_size <= 0:
+            self.flush()
+            return
+        self._start_flusher()
+        if full:
+            self._wake.set()
+    
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is None and not self._closed:
+                self._flusher = threading.Thread(target=self._flush_loop, name="memory-flusher", daemon=True)
+                self._flusher.start()
+    
+    def _flush_due(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            return bool(self._pending) and now >= self._retry_at and (
+                len(self._pending) >= self.batch_size or now - self._oldest >= self.flush_interval
+            )
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while not self._closed and self._flush_due():
+                try:
+                    self.flush(max_batch=self.batch_size or None)
+                except Exception:
+                    # Kept in the log and retried after the backoff
+                    break
+    
+    def flush(self, max_batch: int = None) -> int:
+        """Embed and add buffered negotiations in one batch (all of them, or the oldest max_batch)
         
-        metadatas = [{
-            'company': negotiation_data['company'],
-            'savings': negotiation_data.get('savings', 0),
-            'bill_type': negotiation_data['bill_type'],
-            'success': negotiation_data.get('success', False),
-            'amount': negotiation_data.get('amount', 0),
-            'confidence': negotiation_data.get('confidence', 0),
-            'timestamp': negotiation_data.get('timestamp', '')
-        }]
+        Returns the number of negotiations added. On failure they stay
+        buffered (and logged) and the error is raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending[:max_batch]
+                self._pending = self._pending[len(batch):]
+                self._flushing = batch
+                if not self._pending:
+                    self._oldest = None
+            if not batch:
+                return 0
+            
+            started = time.perf_counter()
+            groups: Dict[int, tuple] = {}
+            for record in batch:
+                store = self._partition(record["metadata"]["bill_type"])
+                groups.setdefault(id(store), (store, []))[1].append(record)
+            try:
+                # One embed_documents call and one upsert per collection;
+                # searches only wait for the upsert, not the embedding
+                for store, records in groups.values():
+                    texts = [record["text"] for record in records]
+                    vectors = self.embeddings.embed_documents(texts)
+                    with self._index_lock:
+                        store._collection.upsert(
+                            ids=[record["id"] for record in records],
+                            embeddings=vectors,
+                            metadatas=[record["metadata"] for record in records],
+                            documents=texts
+                        )
+                        if self._manual_persist:
+                            store.persist()
+            except Exception as e:
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._flushing = []
+                    self._oldest = time.monotonic()
+                    self._counters["failed_batches"] += 1
+                    self._failures += 1
+                    backoff = self.flush_interval * 2 ** min(self._failures - 1, 16)
+                    self._retry_at = time.monotonic() + min(backoff, FLUSH_RETRY_MAX_SECONDS)
+                    self.last_error = f"{type(e).__name__}: {e}"
+                raise
+            
+            with self._lock:
+                # Negotiations stored while this batch was embedding stay in the log
+                self._rewrite_log()
+                self._flushing = []
+                self._failures = 0
+                self._retry_at = 0.0
+                self.last_error = None
+                self._counters["flushed"] += len(batch)
+                self._counters["batches"] += 1
+                self._counters["flush_seconds"] += time.perf_counter() - started
+            return len(batch)
+    
+    def close(self):
+        """Stop the background flusher and write out everything still buffered"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._log.close()
+            self.aggregates.close()
+    
+    def write_stats(self) -> Dict:
+        """Buffered write counters: stored, pending and flushed negotiations, batch sizes and the last flush error"""
+        with self._lock:
+            batches = self._counters["batches"]
+            return {
+                **self._counters,
+                "flush_seconds": round(self._counters["flush_seconds"], 3),
+                "pending": len(self._pending),
+                "avg_batch_size": round(self._counters["flushed"] / batches, 1) if batches else 0.0,
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "last_error": self.last_error,
+                "retry_in_seconds": round(max(self._retry_at - time.monotonic(), 0.0), 3),
+                "embeddings": self.embeddings.stats() if hasattr(self.embeddings, "stats") else None
+            }
+    
+    def retrieve_similar(self, query: str, k: int = 5, bill_type: str = None, company: str = None,
+                         success: bool = None, min_amount: float = None, max_amount: float = None) -> List[Dict]:
+        """Retrieve similar successful negotiations
         
-        self.vector_store.add_texts(texts=texts, metadatas=metadatas)
-        self.vector_store.persist()
-    
-    def retrieve_similar(self, query: str, k: int = 5, bill_type: str = None) -> List[Dict]:
-        """Retrieve similar successful negotiations"""
-        # Build search query
-        search_query = query
-        if bill_type:
-            search_query = f"{bill_type} {query}"
+        The metadata predicates are applied inside the vector search, so up
+        to k matching negotiations come back however selective the filter
+        is. Chroma resolves a where clause by listing every matching ID
+        first, which is slow for broad filters, so the k * filter_probe
+        nearest negotiations are checked first: when k of them match, they
+        are exactly the k nearest matches and the filtered search is skipped.
         
-        results = self.vector_store.similarity_search_with_score(search_query, k=k)
+        With bill-type partitions a bill_type filter selects the partition
+        and an unfiltered search merges the nearest from every partition.
         
-        # Filter by bill type if specified
-        if bill_type:
-            filtered_results = []
-            for doc, score in results:
-                if doc.metadata.get('bill_type', '').upper() == bill_type.upper():
-                    filtered_results.append((doc, score))
-            results = filtered_results[:k]
+        Negotiations still in the write buffer are matched in memory and
+        merged in, so a search never waits for a flush; it costs one
+        embed_documents call (cache hits once embedded) and a linear scan of
+        at most batch_size buffered negotiations.
+        """
+        embedding = self.embeddings.embed_query(query)
+        # Read your own writes; taken before the index is searched so a
+        # concurrent flush can duplicate a negotiation but never hide it
+        buffered = self._search_buffer(embedding, k, metadata_filter(bill_type, company, success,
+                                                                     min_amount, max_amount))
+        if not self.partition_by_bill_type:
+            where = metadata_filter(bill_type, company, success, min_amount, max_amount)
+            results = self._search(self.vector_store, embedding, k, where)
+        else:
+            where = metadata_filter(None, company, success, min_amount, max_amount)
+            if bill_type:
+                stores = [self._partition(bill_type)]
+            else:
+                with self._partitions_lock:
+                    stores = [self.vector_store, *self._partitions.values()]
+            results = sorted(
+                (result for store in stores for result in self._search(store, embedding, k, where)),
+                key=lambda result: result[1]
+            )[:k]
+        if buffered:
+            seen = {(doc.page_content, json.dumps(doc.metadata, sort_keys=True)) for doc, _ in buffered}
+            indexed = [(doc, score) for doc, score in results
+                       if (doc.page_content, json.dumps(doc.metadata, sort_keys=True)) not in seen]
+            results = sorted(buffered + indexed, key=lambda result: result[1])[:k]
         
         return [
             {
@@ -66,20 +423,41 @@ class NegotiationMemory:
             for doc, score in results
         ]
     
-    def get_success_rate(self, company: str = None, bill_type: str = None) -> float:
-        """Calculate success rate for specific company or bill type"""
-        # This would require more sophisticated querying in production
-        # For now, return a placeholder
-        return 0.75  # 75% success rate placeholder
-    
-    def get_average_savings(self, bill_type: str = None) -> float:
-        """Get average savings for bill type"""
-        # Placeholder for average savings calculation
-        savings_by_type = {
-            'UTILITY': 0.18,      # 18% average savings
-            'MEDICAL': 0.35,      # 35% average savings
-            'SUBSCRIPTION': 0.25, # 25% average savings
-            'TELECOM': 0.22       # 22% average savings
-        }
+    def _search_buffer(self, embedding: List[float], k: int, where: Optional[Dict]) -> List[tuple]:
+        """k nearest (document, distance) pairs among buffered negotiations matching where"""
+        with self._lock:
+            records = [record for record in self._flushing + self._pending
+                       if matches_filter(record["metadata"], where)]
+        if not records:
+            return []
+        vectors = self.embeddings.embed_documents([record["text"] for record in records])
+        return sorted(
+            ((Document(page_content=record["text"], metadata=dict(record["metadata"])), squared_l2(embedding, vector))
+             for record, vector in zip(records, vectors)),
+            key=lambda result: result[1]
+        )[:k]
+    
+    def _search(self, store: Chroma, embedding: List[float], k: int, where: Optional[Dict]) -> List[tuple]:
+        """k nearest (document, distance) pairs in one collection matching where"""
+        def search(*args, **kwargs):
+            with self._index_lock:
+                return store.similarity_search_by_vector_with_relevance_scores(*args, **kwargs)
         
-        return savings_by_type.get(bill_type, 0.20)  # 20% default
\ No newline at end of file
+        if where is None:
+            return search(embedding, k=k)
+        if self.filter_probe > 0:
+            probe_size = k * self.filter_probe
+            probe = search(embedding, k=probe_size)
+            matching = [(doc, score) for doc, score in probe if matches_filter(doc.metadata, where)]
+            # A short probe covered the whole collection
+            if len(matching) >= k or len(probe) < probe_size:
+                return matching[:k]
+        return search(embedding, k=k, filter=where)
+    
+    def get_success_rate(self, company: str = None, bill_type: str = None, window_days: int = None) -> float:
+        """Calculate success rate for specific company or bill type"""
+        return self.aggregates.success_rate(company, bill_type, window_days)
+    
+    def get_average_savings(self, bill_type: str = None, window_days: int = None) -> float:
+        """Get average savings for bill type (savings as a share of billed amounts)"""
+        return self.aggregates.savings_rate(bill_type, window_days)
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Content-addressed cache of OCR results
+"""
+
+import hashlib
+import os
+from typing import Dict, Optional
+
+from ocr.engine import ocr_settings
+from tiered_cache import TieredCache
+
+class OCRCache:
+    """Two-tier cache of OCR results keyed by image content
+
+    Keys hash the decoded image bytes together with the Tesseract version,
+    language and config, so upgrading Tesseract or changing its settings
+    never serves stale text. Values are small dicts (the extracted text plus
+    parsed bill fields), kept in a TieredCache: an LRU bounded by entry
+    count and an optional SQLite tier bounded by total stored bytes.
+    """
+
+    def __init__(self, max_entries: int = None, path: str = None, max_bytes: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("OCR_CACHE_SIZE", 512))
+        self.path = path if path is not None else os.getenv("OCR_CACHE_PATH", "")
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("OCR_CACHE_MAX_MB", 256)) * 1024 * 1024
+        self._store = TieredCache("ocr_cache", self.max_entries, self.path, self.max_bytes)
+
+    @staticmethod
+    def make_key(image_data: bytes) -> str:
+        """Hash of the image bytes and the OCR settings that produced the text"""
+        digest = hashlib.sha256(image_data)
+        digest.update("\0".join(ocr_settings()).encode())
+        return digest.hexdigest()
+
+    def get(self, image_data: bytes) -> Optional[Dict]:
+        """Return the cached result for these image bytes, if any"""
+        return self._store.get(self.make_key(image_data))
+
+    def put(self, image_data: bytes, value: Dict):
+        """Cache an OCR result for these image bytes"""
+        self._store.put(self.make_key(image_data), value)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        return self._store.stats()
+
+    def close(self):
+        """Close the disk tier"""
+        self._store.close()
@@ -0,0 +1,63 @@
+"""
+Tesseract OCR entry points that run inside the OCR worker processes
+"""
+
+import io
+import os
+import time
+
+import pytesseract
+from PIL import Image
+
+from ocr.preprocess import preprocess_from_settings, settings_key
+
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_CONFIG = os.getenv("OCR_CONFIG", "")
+
+_tesseract_version = None
+
+def init_worker():
+    """Configure Tesseract once per worker process"""
+    tesseract_cmd = os.getenv("TESSERACT_CMD")
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+def tesseract_version() -> str:
+    """Installed Tesseract version, or "unknown" if it cannot be run"""
+    global _tesseract_version
+    if _tesseract_version is None:
+        init_worker()
+        try:
+            _tesseract_version = str(pytesseract.get_tesseract_version())
+        except Exception:
+            _tesseract_version = "unknown"
+    return _tesseract_version
+
+def ocr_settings() -> tuple:
+    """Everything besides the image that determines the OCR output"""
+    return (tesseract_version(), OCR_LANG, OCR_CONFIG, settings_key())
+
+def run_ocr(image_data: bytes, timeout: float = 0) -> tuple:
+    """Extract text from bill image bytes
+
+    Returns the text and the per-stage timings in ms. A non-zero timeout
+    makes pytesseract kill the Tesseract subprocess instead of letting a
+    pathological image hold the worker.
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image, timings = preprocess_from_settings(image)
+
+    start = time.perf_counter()
+    text = pytesseract.image_to_string(image, lang=OCR_LANG, config=OCR_CONFIG, timeout=timeout)
+    timings["tesseract"] = round((time.perf_counter() - start) * 1000, 3)
+    return text.strip(), timings
+
+def timed_job(job, image_data: bytes, timeout: float):
+    """Run an OCR job and report its service time (excluding queue wait)
+
+    Jobs return either the text or a (text, stage_timings) tuple.
+    """
+    start = time.perf_counter()
+    result = job(image_data, timeout)
+    text, stages = result if isinstance(result, tuple) else (result, {})
+    return text, time.perf_counter() - start, stages
@@ -0,0 +1,166 @@
+"""
+Bounded process pool for CPU-bound OCR work
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+from ocr.engine import init_worker, run_ocr, timed_job
+
+class OCRBusyError(Exception):
+    """Raised when the OCR queue is full; retry_after is a hint in seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"OCR queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class OCRTimeoutError(Exception):
+    """Raised when a single OCR job exceeds its time limit"""
+
+class OCRExecutor:
+    """Runs OCR jobs on a process pool sized to the available cores
+
+    At most max_workers jobs run at once and at most max_queue more may wait;
+    further submissions fail fast with OCRBusyError so a burst of uploads
+    cannot pile up unbounded work behind the LLM-bound requests. A job keeps
+    its slot until its worker finishes it, even after the caller timed out.
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None,
+                 timeout: float = None, job: Callable = run_ocr):
+        self.max_workers = max_workers or int(os.getenv("OCR_WORKERS", 0)) or os.cpu_count() or 1
+        if max_queue is None:
+            max_queue = int(os.getenv("OCR_MAX_QUEUE", self.max_workers * 4))
+        self.max_queue = max_queue
+        self.timeout = timeout if timeout is not None else float(os.getenv("OCR_TIMEOUT_SECONDS", 30))
+        self.job = job
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._service_times = deque(maxlen=256)
+        self._wait_times = deque(maxlen=256)
+        self._stage_totals: Dict[str, tuple] = {}
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "failed": 0
+        }
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Create the worker pool on first use (or after it broke)"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker
+            )
+        return self._pool
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs accepted but still waiting for a free worker"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a queue slot frees up"""
+        service = self._average(self._service_times) or 1.0
+        backlog = self.queue_depth + 1
+        return max(1, math.ceil(service * backlog / self.max_workers))
+
+    def _release(self, job=None):
+        """Free a slot (runs on the pool's management thread for submitted jobs)"""
+        with self._lock:
+            self._in_flight -= 1
+
+    async def submit(self, image_data: bytes) -> str:
+        """Run OCR on the pool and return the extracted text"""
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise OCRBusyError(self.retry_after())
+            self._in_flight += 1
+        self._counters["submitted"] += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        job = None
+        try:
+            job = self._get_pool().submit(timed_job, self.job, image_data, self.timeout)
+            # The slot is freed when the worker is done with the job, not when
+            # this coroutine stops waiting for it
+            job.add_done_callback(self._release)
+            # Queue wait counts against the deadline too; pytesseract's own
+            # timeout kills the subprocess once the job is actually running
+            text, service_time, stages = await asyncio.wait_for(asyncio.wrap_future(job),
+                                                                timeout=self.timeout or None)
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            raise OCRTimeoutError(f"OCR exceeded {self.timeout}s")
+        except RuntimeError as e:
+            # pytesseract signals its own timeout with RuntimeError
+            if "timeout" in str(e).lower():
+                self._counters["timed_out"] += 1
+                raise OCRTimeoutError(f"OCR exceeded {self.timeout}s") from e
+            self._counters["failed"] += 1
+            raise
+        except BrokenProcessPool:
+            self._counters["failed"] += 1
+            self._pool = None
+            raise
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            if job is None:
+                self._release()
+
+        self._counters["completed"] += 1
+        self._service_times.append(service_time)
+        self._wait_times.append(max(0.0, loop.time() - started - service_time))
+        for name, ms in stages.items():
+            total, count = self._stage_totals.get(name, (0.0, 0))
+            self._stage_totals[name] = (total + ms, count + 1)
+        return text
+
+    @staticmethod
+    def _average(samples) -> float:
+        return sum(samples) / len(samples) if samples else 0.0
+
+    @staticmethod
+    def _percentile(samples, fraction: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def metrics(self) -> Dict:
+        """Queue depth, throughput counters and recent service/wait times"""
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            **self._counters,
+            "service_ms_avg": round(self._average(self._service_times) * 1000, 2),
+            "service_ms_p95": round(self._percentile(self._service_times, 0.95) * 1000, 2),
+            "wait_ms_avg": round(self._average(self._wait_times) * 1000, 2),
+            "stage_ms_avg": {
+                name: round(total / count, 2)
+                for name, (total, count) in self._stage_totals.items()
+            }
+        }
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,295 @@
+"""
+Parsing of structured bill fields from OCR text
+"""
+
+import re
+from datetime import date
+from typing import Dict, List, Optional, TypedDict
+
+# Bump when extraction changes so cached OCR results are re-parsed
+EXTRACTION_VERSION = 2
+
+class LineItem(TypedDict):
+    description: str
+    amount: float
+
+class BillData(TypedDict):
+    """Fields parsed from one bill; confidence holds a 0-1 score per field"""
+    company: Optional[str]
+    amount: float
+    due_date: Optional[str]            # ISO date
+    account_number: Optional[str]
+    service_period: Optional[Dict[str, str]]  # {"start": ISO date, "end": ISO date}
+    line_items: List[LineItem]
+    confidence: Dict[str, float]
+
+MONTHS = {name: number for number, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+
+# One scanner tokenizes the whole text in a single pass. Labels come first
+# so "Amount Due" is never split into a date or money token; "skip" labels
+# mark payments, credits and prior balances that are neither totals nor
+# charges. The lookaheads let most positions fail on one character check
+# instead of trying every alternative.
+SCANNER = re.compile(r"""
+    \b(?=[abcdfijmnopstuy\d])(?:
+    (?P<skip>previous\s+balance|balance\s+forward|past\s+due|payments?\s+(?:received|thank)|insurance\s+pa(?:id|yments?)
+        |(?:contractual\s+|insurance\s+)?adjustments?\b|sub\s?total)
+  | (?P<amount_due>(?:total\s+)?amount\s+due|total\s+(?:amount\s+)?due|balance\s+due|pay\s+this\s+amount
+        |new\s+balance|total\s+balance|amount\s+billed|you\s+owe|patient\s+(?:portion|responsibility))
+  | (?P<due_date>(?:payment\s+)?due\s+(?:date|by|on)|pay(?:ment)?\s+(?:due|by)|\bdue\b)
+  | (?P<total>\btotal\b|\bbalance\b|current\s+charges)
+  | (?P<account>\bacc(?:oun)?t\b\.?(?:\s*(?:number|no\b\.?|num\b|id\b|\#))?|member\s+(?:id|number)|patient\s+id)
+  | (?P<period>(?:service|billing|bill)\s+(?:period|dates?)|services?\s+from|statement\s+for)
+  | (?P<date>\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b
+        |\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?\b(?:,?\s+\d{4})?)
+    )
+  | (?=[-$\d])(?P<money>-?\$\s?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{2})?(?![\d,])
+        |(?<![\w.,/$-])-?(?:\d{1,3}(?:,\d{3})+|\d+)\.\d{2}(?!\d))
+  | (?P<newline>\n)
+""", re.IGNORECASE | re.VERBOSE)
+
+LABELS = ("skip", "amount_due", "due_date", "total", "account", "period")
+# A whole-dollar figure right after an amount due label ("Amount Due: 124"),
+# which the scanner does not treat as money without a "$" or cents
+BARE_AMOUNT = re.compile(r"[\s:]*\$?\s?((?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{1,2})?)(?![\d,./-])")
+ACCOUNT_VALUE = re.compile(r"[\s:#.]*([A-Z0-9](?:[A-Z0-9-]|\s(?=\d))*)", re.IGNORECASE)
+NUMERIC_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})|(\d+)[/-](\d+)[/-](\d+)")
+NAMED_DATE = re.compile(r"([a-z]+)\.?\s+(\d{1,2})\D*?(?:,?\s+(\d{4}))?$", re.IGNORECASE)
+RANGE_JOINER = re.compile(r"^\s*(?:-|–|to|through|thru)\s*$", re.IGNORECASE)
+GENERIC_HEADING = re.compile(
+    r"^(?:(?:monthly|electric|gas|water|medical|hospital|phone|wireless)\s+)?"
+    r"(?:bill|statement|invoice|receipt|summary)\b", re.IGNORECASE
+)
+MONEY_NOISE = re.compile(r"[$,\s]")
+COLUMN_GAP = re.compile(r"\s{2,}|\t")
+LEADING_DATE = re.compile(r"^\s*\d{1,2}/\d{1,2}/\d{2,4}\s+")
+LETTER = re.compile(r"[A-Za-z]")
+DIGIT = re.compile(r"\d")
+COMPANY_SUFFIX = re.compile(
+    r"\b(?:inc|llc|ltd|corp(?:oration)?|company|co|hospital|medical|center|clinic|group|associates"
+    r"|dental|electric|energy|power|gas|water|wireless|services|district|utilities)\b\.?", re.IGNORECASE
+)
+
+def parse_money(text: str) -> float:
+    return float(MONEY_NOISE.sub("", text))
+
+def parse_date(text: str) -> Optional[tuple]:
+    """(year, month, day) with year None when the text has no year"""
+    numeric = NUMERIC_DATE.fullmatch(text)
+    if numeric:
+        if numeric.group(1):
+            return int(numeric.group(1)), int(numeric.group(2)), int(numeric.group(3))
+        month, day, year = (int(part) for part in numeric.group(4, 5, 6))
+        return (year + 2000 if year < 100 else year), month, day
+    named = NAMED_DATE.match(text)
+    if named and named.group(1)[:3].lower() in MONTHS:
+        year = int(named.group(3)) if named.group(3) else None
+        return year, MONTHS[named.group(1)[:3].lower()], int(named.group(2))
+    return None
+
+def iso_date(parts: Optional[tuple]) -> Optional[str]:
+    if not parts or parts[0] is None:
+        return None
+    try:
+        return date(*parts).isoformat()
+    except ValueError:
+        return None
+
+def date_range(first: tuple, second: tuple) -> Optional[Dict[str, str]]:
+    """Service period from two dates, borrowing a missing year from the other end"""
+    if first is None or second is None:
+        return None
+    if first[0] is None and second[0] is not None:
+        # A period running from December into January starts the year before
+        first = (second[0] - (first[1] > second[1]), first[1], first[2])
+    elif second[0] is None and first[0] is not None:
+        second = (first[0] + (second[1] < first[1]), second[1], second[2])
+    start, end = iso_date(first), iso_date(second)
+    if start and end and start <= end:
+        return {"start": start, "end": end}
+    return None
+
+def scan_lines(ocr_text: str) -> List[dict]:
+    """Tokenize the text once, grouping tokens by line"""
+    lines = [{"start": 0, "end": len(ocr_text), "tokens": []}]
+    for match in SCANNER.finditer(ocr_text):
+        if match.lastgroup == "newline":
+            lines[-1]["end"] = match.start()
+            lines.append({"start": match.end(), "end": len(ocr_text), "tokens": []})
+        else:
+            lines[-1]["tokens"].append(match)
+    return lines
+
+def label_values(lines: List[dict], index: int, position: int) -> tuple:
+    """Tokens after the label at lines[index]["tokens"][position], and whether
+    they came from the following line because the label stood alone"""
+    tokens = lines[index]["tokens"]
+    following = []
+    for token in tokens[position + 1:]:
+        if token.lastgroup in LABELS:
+            break
+        following.append(token)
+    if following or index + 1 >= len(lines):
+        return following, False
+    return [token for token in lines[index + 1]["tokens"] if token.lastgroup not in LABELS], True
+
+def label_rest(ocr_text: str, lines: List[dict], index: int, token) -> tuple:
+    """Text after a label on its line, or the next line when the label stands alone"""
+    rest = ocr_text[token.end():lines[index]["end"]]
+    if not rest.strip() and index + 1 < len(lines):
+        return ocr_text[lines[index + 1]["start"]:lines[index + 1]["end"]], True
+    return rest, False
+
+def find_company(ocr_text: str, lines: List[dict]) -> tuple:
+    """First heading line that reads like a provider name"""
+    for line in lines[:6]:
+        text = ocr_text[line["start"]:line["end"]]
+        name = COLUMN_GAP.split(text.strip())[0]
+        if (len(LETTER.findall(name)) < 3 or name[0].isdigit() or GENERIC_HEADING.match(name)
+                or any(token.lastgroup in LABELS + ("money",) for token in line["tokens"])):
+            continue
+        if DIGIT.search(name):
+            return name, 0.3
+        return name, 0.8 if COMPANY_SUFFIX.search(name) else 0.5
+    return None, 0.0
+
+def extract_bill_data(ocr_text: str) -> BillData:
+    """Parse the company, amount due, due date, account number, service
+    period and line items from OCR text in one pass
+
+    Every field has a confidence: values next to an explicit label score
+    highest, values on the line below a lone label a little lower, and
+    fallbacks (the largest dollar figure, an unlabelled date range) low.
+    Missing fields are None with confidence 0.
+    """
+    lines = scan_lines(ocr_text)
+    candidates = {"amount": [], "due_date": [], "account_number": [], "service_period": []}
+    line_items: List[LineItem] = []
+    all_money = []
+
+    for index, line in enumerate(lines):
+        tokens = line["tokens"]
+        kinds = [token.lastgroup for token in tokens]
+        money = [token for token in tokens if token.lastgroup == "money"]
+        all_money += money
+
+        for position, token in enumerate(tokens):
+            kind = token.lastgroup
+            if kind not in ("amount_due", "total", "due_date", "account", "period"):
+                continue
+            values, below = label_values(lines, index, position)
+            if kind in ("amount_due", "total"):
+                amounts = [value for value in values if value.lastgroup == "money"]
+                score = {"amount_due": 0.95, "total": 0.75}[kind]
+                # A bare number on the label's own line beats money on the next;
+                # "Total" labels are too loose ("Total 3 items") to trust one
+                bare = None
+                if kind == "amount_due" and (below or not amounts):
+                    rest, rest_below = label_rest(ocr_text, lines, index, token)
+                    bare = BARE_AMOUNT.match(rest)
+                if bare and not (amounts and rest_below):
+                    candidates["amount"].append((score - (0.15 if rest_below else 0.05), index,
+                                                 parse_money(bare.group(1))))
+                elif amounts:
+                    candidates["amount"].append((score - (0.1 if below else 0), index,
+                                                 abs(parse_money(amounts[0].group()))))
+            elif kind == "due_date":
+                dates = [iso_date(parse_date(value.group())) for value in values if value.lastgroup == "date"]
+                if dates and dates[0]:
+                    candidates["due_date"].append((0.8 if below else 0.95, index, dates[0]))
+            elif kind == "period":
+                dates = [parse_date(value.group()) for value in values if value.lastgroup == "date"]
+                period = date_range(*dates[:2]) if len(dates) >= 2 else None
+                if period:
+                    candidates["service_period"].append((0.75 if below else 0.9, index, period))
+            else:
+                rest, below = label_rest(ocr_text, lines, index, token)
+                value = ACCOUNT_VALUE.match(rest)
+                if value and DIGIT.search(value.group(1)):
+                    candidates["account_number"].append((0.7 if below else 0.9, index, value.group(1).strip()))
+
+        if any(kind in LABELS for kind in kinds):
+            continue
+
+        # Unlabelled "date - date" / "date to date" ranges are likely service periods
+        dates = [token for token in tokens if token.lastgroup == "date"]
+        if len(dates) >= 2 and RANGE_JOINER.match(ocr_text[dates[0].end():dates[1].start()]):
+            period = date_range(parse_date(dates[0].group()), parse_date(dates[1].group()))
+            if period:
+                candidates["service_period"].append((0.6, index, period))
+
+        # Charge lines: a description followed by a dollar amount
+        if money:
+            description = ocr_text[line["start"]:money[0].start()]
+            description = LEADING_DATE.sub("", description)
+            description = COLUMN_GAP.sub(" ", description).strip(" :.-\t")
+            if len(LETTER.findall(description)) >= 2:
+                line_items.append({"description": description, "amount": parse_money(money[-1].group())})
+
+    def best(field):
+        # Highest confidence wins; ties go to the earliest line
+        options = sorted(candidates[field], key=lambda option: (-option[0], option[1]))
+        return (options[0][2], options[0][0]) if options else (None, 0.0)
+
+    amount, amount_confidence = best("amount")
+    if amount is None and all_money:
+        amount, amount_confidence = max(abs(parse_money(token.group())) for token in all_money), 0.4
+    items_total = round(sum(item["amount"] for item in line_items), 2)
+    items_match = bool(line_items) and amount is not None and abs(items_total - amount) < 0.005
+    if items_match:
+        amount_confidence = max(amount_confidence, 0.9)
+
+    company, company_confidence = find_company(ocr_text, lines)
+    due_date, due_confidence = best("due_date")
+    account_number, account_confidence = best("account_number")
+    service_period, period_confidence = best("service_period")
+
+    return {
+        "company": company,
+        "amount": amount or 0.0,
+        "due_date": due_date,
+        "account_number": account_number,
+        "service_period": service_period,
+        "line_items": line_items,
+        "confidence": {
+            "company": company_confidence,
+            "amount": amount_confidence,
+            "due_date": due_confidence,
+            "account_number": account_confidence,
+            "service_period": period_confidence,
+            "line_items": (0.9 if items_match else 0.6) if line_items else 0.0
+        }
+    }
+
+def extract_bill_amount(ocr_text: str) -> float:
+    """Extract bill amount from OCR text"""
+    return extract_bill_data(ocr_text)["amount"]
+
+def format_bill_data(bill: dict, min_confidence: float = 0.6) -> str:
+    """Compact text rendering of the confident fields for LLM prompts
+
+    Returns "" when nothing beyond the amount was extracted, so callers can
+    fall back to the OCR text.
+    """
+    confidence = bill.get("confidence") or {}
+
+    def confident(field):
+        return bill.get(field) and confidence.get(field, 0) >= min_confidence
+
+    lines = []
+    if confident("company") or (bill.get("company") and "company" not in confidence):
+        lines.append(f"Company: {bill['company']}")
+    if bill.get("amount"):
+        lines.append(f"Amount due: ${bill['amount']:,.2f}")
+    if confident("due_date"):
+        lines.append(f"Due date: {bill['due_date']}")
+    if confident("account_number"):
+        lines.append(f"Account: {bill['account_number']}")
+    if confident("service_period"):
+        lines.append(f"Service period: {bill['service_period']['start']} to {bill['service_period']['end']}")
+    if confident("line_items"):
+        lines.append("Line items:")
+        lines += [f"- {item['description']}: ${item['amount']:,.2f}" for item in bill["line_items"]]
+    return "\n".join(lines) if len(lines) > 2 else ""
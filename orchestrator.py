@@ -1,13 +1,29 @@
 from langgraph.graph import StateGraph, END
 from typing import TypedDict, Annotated, Sequence
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 import operator
 
 from agents.router_agent import create_router_graph
+from agents.bill_classifier import get_bill_classifier
 from agents.utility_agent import UtilityNegotiationGraph
 from agents.medical_agent import MedicalNegotiationGraph
 from agents.subscription_agent import SubscriptionNegotiationGraph
 from agents.telecom_agent import TelecomNegotiationGraph
+from agents.nodes import compile_graph
+from memory.strategies import StrategyRecall, get_strategy_recall
+from tools.competitor_rates import CompetitorRateStore
+from confidence import calculate_confidence, execution_mode
+from ocr.extraction import format_bill_data
+
+# State key of each specialist's analysis stage: the output strategy recall
+# reuses, and so what the negotiation memory stores (never a rendered script)
+ANALYSIS_KEYS = {
+    "UTILITY": "negotiation_strategy",
+    "MEDICAL": "negotiation_plan",
+    "TELECOM": "plan_analysis",
+    "SUBSCRIPTION": "service_analysis"
+}
 
 class NegotiationState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], operator.add]
@@ -16,55 +32,50 @@ class NegotiationState(TypedDict):
     negotiation_result: dict
     confidence_score: float
     execution_mode: str
+    routing_tier: str
 
-def calculate_confidence(negotiation_result: dict) -> float:
-    """Calculate confidence score based on negotiation analysis"""
-    # Simplified confidence calculation
-    # In production, this would use more sophisticated metrics
-    
-    factors = {
-        'clear_strategy': 0.3,
-        'competitor_data': 0.2,
-        'error_identification': 0.2,
-        'historical_success': 0.2,
-        'bill_complexity': 0.1
+def build_specialist_graphs(llm=None, max_concurrency: int = None, token_budget: int = None,
+                            recall: StrategyRecall = None, rates: CompetitorRateStore = None,
+                            script_tokens: int = None) -> dict:
+    """Compile every specialist graph, keyed by the router's bill type
+    
+    Passing llm overrides each specialist's default model (e.g. with a fake
+    chat model for offline load tests); max_concurrency and token_budget
+    override each specialist's configured parallel node limit and prompt
+    token budget, recall the process-wide past strategy recall, rates
+    the process-wide competitor rate store and script_tokens the configured
+    cap on the personalized lines of the negotiation scripts.
+    """
+    scripted = (llm, max_concurrency, token_budget, recall, rates, script_tokens)
+    return {
+        "UTILITY": UtilityNegotiationGraph(*scripted).build_graph(),
+        "MEDICAL": MedicalNegotiationGraph(llm, max_concurrency, token_budget, recall).build_graph(),
+        "SUBSCRIPTION": SubscriptionNegotiationGraph(*scripted).build_graph(),
+        "TELECOM": TelecomNegotiationGraph(*scripted).build_graph()
     }
-    
-    score = 0.0
-    
-    # Check if strategy is comprehensive
-    if negotiation_result.get('strategy') and len(negotiation_result['strategy']) > 200:
-        score += factors['clear_strategy']
-    
-    # Check for competitor information
-    if 'competitor' in str(negotiation_result).lower():
-        score += factors['competitor_data']
-    
-    # Check for error identification
-    if 'error' in str(negotiation_result).lower():
-        score += factors['error_identification']
-    
-    # Base confidence for having a result
-    score += 0.3
-    
-    return min(score, 1.0)
 
-def create_master_orchestrator():
-    """Creates the master orchestrator that coordinates all negotiation agents"""
+def create_master_orchestrator(router=None, specialists: dict = None, classifier=None):
+    """Creates the master orchestrator that coordinates all negotiation agents
+    
+    Pre-compiled router and specialist graphs can be passed in so that they
+    are shared with other orchestrators (see graph_registry.GraphRegistry).
+    Bills are routed by the tiered BillClassifier first (the process-wide
+    one unless classifier is given) and by the LLM router only when it abstains.
+    Async runs never train the process-wide classifier, which reads the job
+    store and fits a model; until it is trained (the API does so at startup)
+    they route every bill with the LLM router.
+    """
     workflow = StateGraph(NegotiationState)
     
-    # Initialize specialist agents
-    utility_agent = UtilityNegotiationGraph().build_graph()
-    medical_agent = MedicalNegotiationGraph().build_graph()
-    subscription_agent = SubscriptionNegotiationGraph().build_graph()
-    telecom_agent = TelecomNegotiationGraph().build_graph()
-    
-    def route_negotiation(state):
-        """Route bill to appropriate specialist agent"""
+    # Initialize specialist agents and the router once per orchestrator
+    if specialists is None:
+        specialists = build_specialist_graphs()
+    if router is None:
         router = create_router_graph()
-        
-        # Prepare router input
-        router_input = {
+    
+    def prepare_router_input(state):
+        """Build the router graph input from the bill data"""
+        return {
             "bill_type": "",
             "ocr_text": state["bill_data"]["text"],
             "company": state["bill_data"].get("company", ""),
@@ -72,35 +83,62 @@ def create_master_orchestrator():
             "negotiation_strategy": "",
             "conversation_history": []
         }
-        
-        result = router.invoke(router_input)
+    
+    def fast_route(state, train: bool = True):
+        """Route obvious bills by keywords or the local model; False when the LLM is needed"""
+        selected = classifier or get_bill_classifier(train=train)
+        if selected is None:
+            return False
+        decision = selected.classify(state["bill_data"]["text"], state["bill_data"].get("company"))
+        if decision is None:
+            return False
+        state["agent_decision"] = decision["bill_type"]
+        state["routing_tier"] = decision["tier"]
+        return True
+    
+    def route_negotiation(state, config):
+        """Route bill to appropriate specialist agent"""
+        if fast_route(state):
+            return state
+        result = router.invoke(prepare_router_input(state), config)
         state["agent_decision"] = result["bill_type"]
+        state["routing_tier"] = "llm"
         return state
     
-    def execute_specialist(state):
-        """Execute the appropriate specialist agent"""
-        agent_type = state["agent_decision"]
+    async def aroute_negotiation(state, config):
+        """Route bill to appropriate specialist agent without blocking the event loop"""
+        if fast_route(state, train=False):
+            return state
+        result = await router.ainvoke(prepare_router_input(state), config)
+        state["agent_decision"] = result["bill_type"]
+        state["routing_tier"] = "llm"
+        return state
+    
+    def prepare_agent_input(state):
+        """Build the specialist graph input from the bill data
         
-        agents = {
-            "UTILITY": utility_agent,
-            "MEDICAL": medical_agent,
-            "SUBSCRIPTION": subscription_agent,
-            "TELECOM": telecom_agent
+        bill_summary is the confidently extracted fields, which nodes that
+        need only the headline facts use instead of the raw OCR text; region
+        (optional) picks the competitor rates the bill is compared against.
+        """
+        return {
+            "ocr_text": state["bill_data"]["text"],
+            "company": state["bill_data"].get("company", ""),
+            "amount": state["bill_data"].get("amount", 0.0),
+            "region": state["bill_data"].get("region", ""),
+            "bill_summary": format_bill_data(state["bill_data"])
         }
+    
+    def record_specialist_result(state, result):
+        """Store the specialist output (None if no specialist matched)"""
+        agent_type = state["agent_decision"]
         
-        selected_agent = agents.get(agent_type)
-        if selected_agent:
-            # Prepare agent input based on agent type
-            agent_input = {
-                "ocr_text": state["bill_data"]["text"],
-                "company": state["bill_data"].get("company", ""),
-                "amount": state["bill_data"].get("amount", 0.0)
-            }
-            
-            result = selected_agent.invoke(agent_input)
+        if result is not None:
             state["negotiation_result"] = {
                 "agent_type": agent_type,
-                "strategy": result.get("negotiation_strategy") or result.get("negotiation_plan") or result.get("negotiation_script", ""),
+                "strategy": (result.get("negotiation_strategy") or result.get("negotiation_plan")
+                             or result.get("negotiation_script") or result.get("cancellation_strategy", "")),
+                "analysis": result.get(ANALYSIS_KEYS.get(agent_type, ""), ""),
                 "details": result,
                 "estimated_savings": state["bill_data"].get("amount", 0) * 0.15  # Estimate 15% savings
             }
@@ -112,18 +150,34 @@ def create_master_orchestrator():
         
         return state
     
+    def execute_specialist(state, config):
+        """Execute the appropriate specialist agent"""
+        selected_agent = specialists.get(state["agent_decision"])
+        result = selected_agent.invoke(prepare_agent_input(state), config) if selected_agent else None
+        return record_specialist_result(state, result)
+    
+    async def aexecute_specialist(state, config):
+        """Execute the appropriate specialist agent without blocking the event loop"""
+        selected_agent = specialists.get(state["agent_decision"])
+        result = await selected_agent.ainvoke(prepare_agent_input(state), config) if selected_agent else None
+        return record_specialist_result(state, result)
+    
+    def historical_success_rate(state):
+        """The company's success rate from the negotiation memory (None without one)"""
+        memory = get_strategy_recall().memory
+        if memory is None:
+            return None
+        return memory.get_success_rate(state["bill_data"].get("company"), state.get("agent_decision"))
+    
     def evaluate_confidence(state):
         """Determine confidence level and execution mode"""
-        confidence = calculate_confidence(state["negotiation_result"])
+        confidence = calculate_confidence(
+            state["negotiation_result"], state["bill_data"], historical_success_rate(state)
+        )
         state["confidence_score"] = confidence
         
         # Determine execution mode based on confidence thresholds
-        if confidence > 0.8:
-            state["execution_mode"] = "auto_execute"
-        elif confidence > 0.5:
-            state["execution_mode"] = "supervised"
-        else:
-            state["execution_mode"] = "human_handoff"
+        state["execution_mode"] = execution_mode(confidence)
         
         return state
     
@@ -150,8 +204,8 @@ def create_master_orchestrator():
         return state["execution_mode"]
     
     # Add nodes to workflow
-    workflow.add_node("route", route_negotiation)
-    workflow.add_node("execute", execute_specialist)
+    workflow.add_node("route", RunnableLambda(route_negotiation, afunc=aroute_negotiation))
+    workflow.add_node("execute", RunnableLambda(execute_specialist, afunc=aexecute_specialist))
     workflow.add_node("evaluate", evaluate_confidence)
     workflow.add_node("auto_execute", auto_execute_node)
     workflow.add_node("supervised", supervised_node)
@@ -179,4 +233,4 @@ def create_master_orchestrator():
     
     workflow.set_entry_point("route")
     
-    return workflow.compile()
\ No newline at end of file
+    return compile_graph(workflow, name="orchestrator")
\ No newline at end of file
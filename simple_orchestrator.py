@@ -1,7 +1,8 @@
 from langgraph.graph import StateGraph, END
 from typing import TypedDict, Annotated, Sequence
 from langchain_core.messages import BaseMessage
-from langchain_openai import ChatOpenAI
+from llm.clients import get_chat_model
+from confidence import calculate_confidence, execution_mode
 import operator
 
 class NegotiationState(TypedDict):
@@ -12,36 +13,12 @@ class NegotiationState(TypedDict):
     confidence_score: float
     execution_mode: str
 
-def calculate_confidence(negotiation_result: dict) -> float:
-    """Calculate confidence score based on negotiation analysis"""
-    # Simplified confidence calculation for deployment
-    score = 0.0
-    
-    # Check if strategy is comprehensive
-    if negotiation_result.get('strategy') and len(negotiation_result['strategy']) > 200:
-        score += 0.3
-    
-    # Check for competitor information
-    if 'competitor' in str(negotiation_result).lower():
-        score += 0.2
-    
-    # Check for error identification
-    if 'error' in str(negotiation_result).lower():
-        score += 0.2
-    
-    # Base confidence for having a result
-    score += 0.3
-    
-    return min(score, 1.0)
-
 def create_simple_orchestrator():
     """Creates a simplified orchestrator for initial deployment"""
     workflow = StateGraph(NegotiationState)
     
     def route_bill(state):
         """Simple bill routing logic"""
-        llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-        
         text = state["bill_data"]["text"].lower()
         
         # Simple keyword-based routing
@@ -61,7 +38,7 @@ def create_simple_orchestrator():
     
     def generate_strategy(state):
         """Generate negotiation strategy"""
-        llm = ChatOpenAI(model="gpt-4", temperature=0.3)
+        llm = get_chat_model("openai", "gpt-4", 0.3)
         
         bill_type = state["agent_decision"]
         amount = state["bill_data"].get("amount", 0)
@@ -92,15 +69,9 @@ def create_simple_orchestrator():
     
     def evaluate_confidence(state):
         """Evaluate confidence and set execution mode"""
-        confidence = calculate_confidence(state["negotiation_result"])
+        confidence = calculate_confidence(state["negotiation_result"], state["bill_data"])
         state["confidence_score"] = confidence
-        
-        if confidence > 0.8:
-            state["execution_mode"] = "auto_execute"
-        elif confidence > 0.5:
-            state["execution_mode"] = "supervised"
-        else:
-            state["execution_mode"] = "human_handoff"
+        state["execution_mode"] = execution_mode(confidence)
         
         return state
     
@@ -0,0 +1,226 @@
+import asyncio
+import base64
+import io
+import json
+import threading
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from api.uploads import UploadSizeLimitMiddleware, MULTIPART_OVERHEAD_BYTES, read_upload
+from ocr.cache import OCRCache
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    """The API module, imported offline (startup hooks are not run)"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("MEMORY_EMBEDDINGS", "hashing")
+        patch.setenv("LLM_BACKEND", "stub")
+        patch.setenv("MAX_BATCH_MB", "1")
+        patch.setenv("JOB_DB_PATH", str(tmp_path_factory.mktemp("jobs") / "negotiations.sqlite3"))
+        import api.main
+        yield api.main
+
+@pytest.fixture
+def client(api):
+    return TestClient(api.app)
+
+class TestAdminEndpoints:
+
+    def test_reload_requires_admin_token(self, api, client, monkeypatch):
+        """Test graph reload is disabled without ADMIN_TOKEN and checks the header"""
+        calls = []
+        monkeypatch.setattr(api.graphs, "reload", lambda **kwargs: calls.append(kwargs) or {"version": 2})
+
+        monkeypatch.setattr(api, "ADMIN_TOKEN", "")
+        assert client.post("/api/v1/admin/graphs/reload", headers={"X-Admin-Token": ""}).status_code == 403
+
+        monkeypatch.setattr(api, "ADMIN_TOKEN", "s3cret")
+        assert client.post("/api/v1/admin/graphs/reload").status_code == 401
+        assert client.post("/api/v1/admin/graphs/reload", headers={"X-Admin-Token": "guess"}).status_code == 401
+
+        response = client.post("/api/v1/admin/graphs/reload?reload_modules=true", headers={"X-Admin-Token": "s3cret"})
+        assert response.status_code == 200 and response.json()["version"] == 2
+        assert calls == [{}]
+
+class TestReadBill:
+
+    def test_repeat_upload_is_served_from_cache(self, api, monkeypatch, tmp_path):
+        """Test a repeat image skips OCR and the cache is read off the event loop"""
+
+        monkeypatch.setattr(api, "ocr_cache", OCRCache(path=str(tmp_path / "ocr.sqlite3")))
+        calls = []
+        async def fake_ocr(image_data):
+            calls.append(image_data)
+            return "CITY POWER\nAmount Due: $150.00"
+        monkeypatch.setattr(api, "process_ocr", fake_ocr)
+        threads = []
+        get = api.ocr_cache.get
+        monkeypatch.setattr(api.ocr_cache, "get", lambda data: threads.append(threading.current_thread()) or get(data))
+
+        first = asyncio.run(api.read_bill(b"image"))
+        second = asyncio.run(api.read_bill(b"image"))
+        assert first == second and first[1]["amount"] == 150.0
+        assert calls == [b"image"]
+        assert threads and threading.main_thread() not in threads
+
+def negotiation_response(api, **fields):
+    values = dict(negotiation_id="n-1", status="completed", agent_type="UTILITY", strategy="ask",
+                  estimated_savings=10.0, confidence=0.8, execution_mode="HUMAN_ASSISTED")
+    values.update(fields)
+    return api.NegotiationResponse(**values)
+
+class TestFinishNegotiation:
+
+    def test_stores_analysis_not_script(self, api, monkeypatch):
+        """Test memory learns the specialist's analysis, while the response keeps the script strategy"""
+        stored = []
+        monkeypatch.setattr(api.memory, "store_negotiation", stored.append)
+        negotiation_input = {"bill_data": {"company": "Verizon", "amount": 89.99}}
+        result = {
+            "agent_decision": "TELECOM", "confidence_score": 0.9,
+            "negotiation_result": {"strategy": "I'm calling about my Verizon bill of $89.99",
+                                   "analysis": "Data usage is well under the allowance",
+                                   "details": {}, "estimated_savings": 13.5}
+        }
+        response = asyncio.run(api.finish_negotiation("n-analysis", negotiation_input, result))
+        assert [outcome["strategy"] for outcome in stored] == ["Data usage is well under the allowance"]
+        assert response.strategy == "I'm calling about my Verizon bill of $89.99"
+
+class TestUploads:
+
+    @pytest.fixture
+    def limited(self):
+        """A small app behind UploadSizeLimitMiddleware, recording the bytes its handler read"""
+
+        app = FastAPI()
+        app.add_middleware(UploadSizeLimitMiddleware, max_bytes=1024, paths=["/upload"])
+        app.state.limit = 1024 + MULTIPART_OVERHEAD_BYTES
+
+        @app.post("/upload")
+        async def upload(request: Request):
+            return {"read": len(await request.body())}
+
+        @app.post("/other")
+        async def other(request: Request):
+            return {"read": len(await request.body())}
+
+        return app
+
+    def test_declared_content_length_over_limit(self, limited):
+        """Test a Content-Length over the limit is refused before the body is read"""
+        client = TestClient(limited)
+        response = client.post("/upload", content=b"x" * (limited.state.limit + 1))
+        assert response.status_code == 413
+        assert client.post("/upload", content=b"x" * 100).json() == {"read": 100}
+        # Other routes are not limited
+        assert client.post("/other", content=b"x" * (limited.state.limit + 1)).status_code == 200
+
+    def test_chunked_body_aborted_once_over_limit(self, limited):
+        """Test a body without Content-Length is cut off as soon as it crosses the limit"""
+        chunk = b"x" * 16 * 1024
+        chunks = limited.state.limit // len(chunk) + 10
+        received = []
+        sent = []
+
+        async def receive():
+            received.append(len(received))
+            more = len(received) < chunks
+            return {"type": "http.request", "body": chunk, "more_body": more}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/upload", "raw_path": b"/upload",
+                 "root_path": "", "scheme": "http", "query_string": b"", "headers": [],
+                 "client": ("test", 1), "server": ("test", 80), "http_version": "1.1"}
+        asyncio.run(limited(scope, receive, send))
+
+        assert sent[0]["status"] == 413
+        assert len(received) == limited.state.limit // len(chunk) + 1
+
+    def test_read_upload_limit(self):
+        """Test read_upload refuses files over max_bytes, with and without a known size"""
+
+        assert asyncio.run(read_upload(UploadFile(io.BytesIO(b"x" * 10), size=10), 10)) == b"x" * 10
+        for size in (11, None):
+            with pytest.raises(HTTPException) as error:
+                asyncio.run(read_upload(UploadFile(io.BytesIO(b"x" * 11), size=size), 10))
+            assert error.value.status_code == 413
+        assert asyncio.run(read_upload(UploadFile(io.BytesIO(b"x" * 10)), 10)) == b"x" * 10
+
+    def test_upload_rejects_non_images(self, api, client, monkeypatch):
+        """Test a non-image upload gets 415 without running the negotiation"""
+        async def fail(*args):
+            raise AssertionError("negotiated a non-image upload")
+        monkeypatch.setattr(api, "negotiate_bill", fail)
+        response = client.post("/api/v1/negotiate/upload", data={"user_id": "u1"},
+                               files={"bill_image": ("bill.pdf", b"%PDF-1.4", "application/pdf")})
+        assert response.status_code == 415
+
+    def test_upload_negotiation(self, api, client, monkeypatch):
+        """Test a multipart image upload is read and negotiated"""
+        calls = []
+        async def negotiate(image_data, user_id, company_name=None):
+            calls.append((image_data, user_id, company_name))
+            return negotiation_response(api)
+        monkeypatch.setattr(api, "negotiate_bill", negotiate)
+        response = client.post("/api/v1/negotiate/upload", data={"user_id": "u1", "company_name": "City Power"},
+                               files={"bill_image": ("bill.png", b"\x89PNG image", "image/png")})
+        assert response.status_code == 200 and response.json()["negotiation_id"] == "n-1"
+        assert calls == [(b"\x89PNG image", "u1", "City Power")]
+
+class TestBatchEndpoint:
+
+    @pytest.fixture
+    def negotiated(self, api, monkeypatch):
+        """Stub OCR and negotiation; an image's text is its bytes and "slow" bills take longer"""
+        calls = []
+        async def read_bill(image_data):
+            return image_data.decode(), {"amount": 100.0}
+        async def negotiate_text(ocr_text, bill, user_id, company_name=None):
+            calls.append(user_id)
+            await asyncio.sleep(0.3 if ocr_text == "slow" else 0)
+            return negotiation_response(api, negotiation_id=user_id)
+        monkeypatch.setattr(api, "read_bill", read_bill)
+        monkeypatch.setattr(api, "negotiate_text", negotiate_text)
+        return calls
+
+    def bill(self, image: bytes, user_id: str) -> dict:
+        return {"bill_image": base64.b64encode(image).decode(), "user_id": user_id}
+
+    def test_streams_results_in_completion_order(self, client, negotiated):
+        """Test NDJSON lines arrive as bills complete, with per-item errors and a summary"""
+        bills = [self.bill(b"slow", "u0"), self.bill(b"fast", "u1"), {"bill_image": "not base64!", "user_id": "u2"}]
+        response = client.post("/api/v1/negotiate/batch", json={"bills": bills})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        # The slow bill finishes last even though it was submitted first
+        assert sorted(line["index"] for line in lines[:2]) == [1, 2] and lines[2]["index"] == 0
+        by_index = {line["index"]: line for line in lines[:3]}
+        assert by_index[1]["status"] == "ok" and by_index[1]["result"]["negotiation_id"] == "u1"
+        assert by_index[2] == {"index": 2, "status": "error", "status_code": 400,
+                               "error": "bill_image is not valid base64"}
+        assert by_index[0]["status"] == "ok" and by_index[0]["result"]["negotiation_id"] == "u0"
+        summary = lines[3]["summary"]
+        assert (summary["total"], summary["succeeded"], summary["failed"]) == (3, 2, 1)
+        assert sorted(negotiated) == ["u0", "u1"]
+
+    def test_rejects_batches_over_max_size(self, api, client, negotiated, monkeypatch):
+        """Test a batch with more than MAX_BATCH_SIZE bills gets 413 and nothing runs"""
+        monkeypatch.setattr(api, "MAX_BATCH_SIZE", 2)
+        bills = [self.bill(b"fast", f"u{i}") for i in range(3)]
+        response = client.post("/api/v1/negotiate/batch", json={"bills": bills})
+        assert response.status_code == 413
+        assert negotiated == []
+
+    def test_rejects_oversized_body_before_parsing(self, api, client, negotiated):
+        """Test a body over MAX_BATCH_MB gets 413 before the bills are decoded"""
+        assert api.MAX_BATCH_BYTES == 1024 * 1024
+        bills = [self.bill(b"x" * 400 * 1024, f"u{i}") for i in range(4)]
+        response = client.post("/api/v1/negotiate/batch", json={"bills": bills})
+        assert response.status_code == 413
+        assert negotiated == []
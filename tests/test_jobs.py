@@ -0,0 +1,104 @@
+import pytest
+import asyncio
+from api.jobs import JobStore, JobQueue, JobQueueFullError
+
+class TestJobStore:
+    
+    def test_progress_and_completion(self, tmp_path):
+        """Test node progress and results are persisted and reloadable"""
+        store = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+        store.create("neg-1", user_id="test_user", company="City Power")
+        store.record_node("neg-1", "route", {"agent_decision": "UTILITY"})
+        store.record_node("neg-1", "execute")
+        
+        running = store.get("neg-1", include_states=True)
+        assert running["status"] == "running"
+        assert running["current_node"] == "execute"
+        assert running["progress"][0]["state"] == {"agent_decision": "UTILITY"}
+        
+        store.complete("neg-1", {"agent_type": "UTILITY", "confidence": 0.8})
+        store.close()
+        
+        reopened = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+        record = reopened.get("neg-1")
+        assert record["status"] == "completed"
+        assert record["result"]["agent_type"] == "UTILITY"
+        assert [event["node"] for event in record["progress"]] == ["route", "execute"]
+    
+    def test_unknown_and_interrupted(self, tmp_path):
+        """Test unknown IDs and jobs orphaned by a restart"""
+        store = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+        store.create("neg-2")
+        store.fail_interrupted()
+        
+        assert store.get("missing") is None
+        assert store.get("neg-2")["status"] == "failed"
+    
+    def test_routed_bills_are_llm_decisions(self, tmp_path):
+        """Test only bills the LLM router classified are offered as training data"""
+        store = JobStore(path=str(tmp_path / "jobs.sqlite3"))
+        routes = {
+            "neg-llm": {"routing_tier": "llm", "agent_decision": "MEDICAL"},
+            "neg-keyword": {"routing_tier": "keyword", "agent_decision": "UTILITY"},
+            "neg-model": {"routing_tier": "model", "agent_decision": "TELECOM"},
+            "neg-legacy": {"agent_decision": "SUBSCRIPTION"}
+        }
+        for negotiation_id, route in routes.items():
+            store.create(negotiation_id)
+            store.record_node(negotiation_id, "route", {
+                **route, "bill_data": {"text": f"bill for {negotiation_id}", "company": "Acme"}
+            })
+            store.complete(negotiation_id, {})
+        
+        assert sorted(store.routed_bills()) == [
+            ("bill for neg-legacy", "Acme", "SUBSCRIPTION"),
+            ("bill for neg-llm", "Acme", "MEDICAL")
+        ]
+        assert store.routed_bills(tier="model") == [("bill for neg-model", "Acme", "TELECOM")]
+        store.close()
+
+class TestJobQueue:
+    
+    def test_workers_run_jobs_and_record_failures(self):
+        """Test queued jobs run in the background and failures are stored"""
+        store = JobStore(path=":memory:")
+        queue = JobQueue(store, workers=2, max_size=4)
+        finished = []
+        
+        async def scenario():
+            await queue.start()
+            store.create("ok")
+            store.create("broken")
+            
+            async def succeed():
+                finished.append("ok")
+            
+            async def explode():
+                raise ValueError("OCR produced no text")
+            
+            queue.submit("ok", succeed)
+            queue.submit("broken", explode)
+            await queue._queue.join()
+            await queue.stop()
+        
+        asyncio.run(scenario())
+        
+        assert finished == ["ok"]
+        assert store.get("broken")["status"] == "failed"
+        assert store.get("broken")["error"] == "OCR produced no text"
+    
+    def test_full_queue_rejects(self):
+        """Test submissions beyond the queue bound are refused"""
+        queue = JobQueue(JobStore(path=":memory:"), workers=1, max_size=1)
+        
+        async def scenario():
+            await queue.start()
+            blocker = asyncio.Event()
+            queue.submit("a", blocker.wait)
+            await asyncio.sleep(0)
+            queue.submit("b", blocker.wait)
+            with pytest.raises(JobQueueFullError):
+                queue.submit("c", blocker.wait)
+            await queue.stop()
+        
+        asyncio.run(scenario())
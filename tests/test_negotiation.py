@@ -1,8 +1,28 @@
 import pytest
-from orchestrator import create_master_orchestrator
+import asyncio
+import os
+import time
+from datetime import date
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from llm.stub import SimulatedChatModel, SimulatedEmbeddings
+from llm.clients import ClientFactory
+from orchestrator import create_master_orchestrator, build_specialist_graphs
+from agents.router_agent import create_router_graph
 from agents.utility_agent import UtilityNegotiationGraph
 from agents.medical_agent import MedicalNegotiationGraph
+from agents.telecom_agent import TelecomNegotiationGraph
+from agents.subscription_agent import SubscriptionNegotiationGraph
 from memory.vector_store import NegotiationMemory
+from memory.embeddings import CachedEmbeddings, create_embeddings
+from memory.aggregates import NegotiationAggregates
+from memory.strategies import StrategyRecall
+from graph_registry import GraphRegistry
+from api.streaming import negotiation_events
+from agents.bill_classifier import BillClassifier, KeywordMatcher, load_examples, SEED_EXAMPLES_PATH
+from tools.bill_analytics import analyze_bill_histories, analyze_bill_patterns, month_index
+from tools.competitor_rates import CompetitorRateStore, load_index, save_index
+from agents.scripts import get_script_template, parse_personalization, script_fields
+from tracing import Tracer, get_tracer, note_queue_wait, set_tracer
 
 class TestNegotiationAgents:
     
@@ -147,6 +167,245 @@ class TestMemorySystem:
         assert len(results) > 0
         assert results[0]["metadata"]["bill_type"] == "UTILITY"
     
+    def test_writes_are_batched(self, tmp_path):
+        """Buffered negotiations are embedded in one batch and searchable"""
+        embeddings = SimulatedEmbeddings(latency=0, per_text_latency=0)
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=embeddings,
+                                   batch_size=100, flush_interval=60)
+        for i in range(5):
+            memory.store_negotiation({"company": f"Power Co {i}", "strategy": "Loyalty discount",
+                                      "bill_type": "UTILITY"})
+        assert memory.write_stats()["pending"] == 5
+        assert embeddings.calls == 0
+        
+        memory.flush()
+        stats = memory.write_stats()
+        assert len(memory.retrieve_similar("loyalty discount", k=5)) == 5
+        assert stats["batches"] == 1 and stats["pending"] == 0
+        memory.close()
+    
+    def test_failed_flushes_back_off_and_report_the_error(self, tmp_path):
+        """A failing background flush is retried with backoff in batch_size chunks, its error in write_stats"""
+        class FlakyEmbeddings(SimulatedEmbeddings):
+            failing = True
+            batches = []
+            def embed_documents(self, texts):
+                if self.failing:
+                    raise RuntimeError("invalid API key")
+                self.batches.append(len(texts))
+                return super().embed_documents(texts)
+        
+        embeddings = FlakyEmbeddings(latency=0, per_text_latency=0)
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=embeddings,
+                                   batch_size=2, flush_interval=0.02)
+        for i in range(5):
+            memory.store_negotiation({"company": f"Power Co {i}", "strategy": "Loyalty discount",
+                                      "bill_type": "UTILITY"})
+        time.sleep(0.4)
+        stats = memory.write_stats()
+        assert stats["last_error"] == "RuntimeError: invalid API key" and stats["pending"] == 5
+        # Without backoff a 0.02s interval would retry about 20 times
+        assert 1 <= stats["failed_batches"] <= 6
+        
+        embeddings.failing = False
+        deadline = time.monotonic() + 3
+        while memory.write_stats()["flushed"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        stats = memory.write_stats()
+        assert stats["flushed"] == 5 and stats["last_error"] is None and stats["retry_in_seconds"] == 0
+        assert embeddings.batches == [2, 2, 1]
+        memory.close()
+    
+    @pytest.mark.parametrize("partitioned", [False, True])
+    def test_search_reads_buffered_writes_without_flushing(self, tmp_path, partitioned):
+        """Buffered negotiations are searched in memory, ranked as they will be once indexed"""
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=create_embeddings("hashing"),
+                                   batch_size=100, flush_interval=60, partition_by_bill_type=partitioned)
+        for i in range(6):
+            memory.store_negotiation({"company": f"Provider {i}", "strategy": f"Loyalty discount tier {i}",
+                                      "bill_type": "MEDICAL" if i % 3 == 0 else "UTILITY"})
+        memory.flush()
+        for i in range(6, 12):
+            memory.store_negotiation({"company": f"Provider {i}", "strategy": f"Loyalty discount tier {i}",
+                                      "bill_type": "MEDICAL" if i % 3 == 0 else "UTILITY"})
+        
+        queries = [{}, {"bill_type": "medical"}, {"company": "Provider 7"}]
+        buffered = [memory.retrieve_similar("loyalty discount tier 7", k=5, **query) for query in queries]
+        assert memory.write_stats()["pending"] == 6 and memory.write_stats()["batches"] == 1
+        assert buffered[0][0]["metadata"]["company"] == "Provider 7"
+        assert {result["metadata"]["bill_type"] for result in buffered[1]} == {"MEDICAL"}
+        assert [result["metadata"]["company"] for result in buffered[2]] == ["Provider 7"]
+        
+        memory.flush()
+        indexed = [memory.retrieve_similar("loyalty discount tier 7", k=5, **query) for query in queries]
+        # Same distances (Chroma computes them in float32; equal ones may swap places)
+        for before, after in zip(buffered, indexed):
+            assert after[0]["content"] == before[0]["content"]
+            assert [result["similarity_score"] for result in after] == pytest.approx(
+                [result["similarity_score"] for result in before], abs=1e-4)
+        memory.close()
+    
+    def test_pending_writes_survive_restart(self, tmp_path):
+        """Negotiations logged but never flushed are replayed on the next start"""
+        embeddings = SimulatedEmbeddings(latency=0, per_text_latency=0)
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=embeddings,
+                                   batch_size=100, flush_interval=60)
+        memory.store_negotiation({"company": "Test Electric Co", "strategy": "Competitor match",
+                                  "bill_type": "UTILITY"})
+        # Simulate a crash: the process exits without flushing
+        memory._log.close()
+        
+        reopened = NegotiationMemory(persist_directory=str(tmp_path), embeddings=embeddings,
+                                     batch_size=100, flush_interval=60)
+        reopened.close()
+        assert reopened.vector_store._collection.count() == 1
+        assert os.path.getsize(reopened.log_path) == 0
+    
+    def test_local_embeddings_offline(self, tmp_path):
+        """The hashing backend stores and retrieves without any network access"""
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=create_embeddings("hashing"),
+                                   batch_size=0)
+        memory.store_negotiation({"company": "General Hospital", "bill_type": "MEDICAL",
+                                  "strategy": "Itemized review found duplicate CPT charges"})
+        memory.store_negotiation({"company": "Comcast", "bill_type": "TELECOM",
+                                  "strategy": "Competitor fiber offer to the retention department"})
+        
+        results = memory.retrieve_similar("hospital duplicate charges", k=1)
+        assert results[0]["metadata"]["company"] == "General Hospital"
+        assert memory.vector_store._collection.name == "negotiation_history_hashing-384"
+        memory.close()
+    
+    @pytest.mark.parametrize("partitioned", [False, True])
+    def test_filters_return_k_matches(self, tmp_path, partitioned):
+        """Selective metadata filters still return k matching negotiations"""
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=create_embeddings("hashing"),
+                                   batch_size=1000, fsync=False, partition_by_bill_type=partitioned)
+        for i in range(200):
+            memory.store_negotiation({"company": f"Provider {i % 10}", "strategy": "Loyalty discount",
+                                      "bill_type": "MEDICAL" if i % 20 == 0 else "utility",
+                                      "amount": float(i), "success": i % 2 == 0})
+        
+        medical = memory.retrieve_similar("loyalty discount", k=5, bill_type="medical")
+        assert len(medical) == 5
+        assert all(result["metadata"]["bill_type"] == "MEDICAL" for result in medical)
+        
+        ranged = memory.retrieve_similar("loyalty discount", k=3, bill_type="UTILITY", company="Provider 3",
+                                         success=False, min_amount=50, max_amount=80)
+        assert sorted(result["metadata"]["amount"] for result in ranged) == [53.0, 63.0, 73.0]
+        assert len(memory.retrieve_similar("loyalty discount", k=15)) == 15
+        memory.close()
+    
+    def test_embedding_cache_batches_misses(self):
+        """Each distinct text is embedded once, all misses in one batch"""
+        backend = SimulatedEmbeddings(latency=0, per_text_latency=0)
+        embeddings = CachedEmbeddings(backend, "simulated")
+        
+        first = embeddings.embed_documents(["a", "b", "a"])
+        second = embeddings.embed_documents(["b", "c"])
+        assert first[0] == first[2] and second[0] == first[1]
+        assert backend.calls == 2
+        assert embeddings.stats()["misses"] == 3
+        assert embeddings.stats()["hits"] == 1
+    
+    def test_aggregates_track_outcomes(self, tmp_path):
+        """Stats come from running totals, with time windows, and survive a restart"""
+        path = str(tmp_path / "stats.sqlite3")
+        aggregates = NegotiationAggregates(path)
+        now = time.time()
+        aggregates.record({"company": "City Power", "bill_type": "UTILITY", "amount": 200.0,
+                           "savings": 30.0, "success": True}, now=now)
+        aggregates.record({"company": "City Power", "bill_type": "utility", "amount": 100.0,
+                           "savings": 0.0, "success": False}, now=now - 20 * 86400)
+        aggregates.record({"company": "General Hospital", "bill_type": "MEDICAL", "amount": 1000.0,
+                           "savings": 400.0, "success": True}, now=now - 60 * 86400)
+        aggregates.close()
+        
+        reopened = NegotiationAggregates(path)
+        assert reopened.totals()["negotiations"] == 3
+        assert reopened.success_rate(company="City Power") == 0.5
+        assert reopened.success_rate(bill_type="UTILITY", window_days=7) == 1.0
+        assert reopened.savings_rate("UTILITY") == 0.1
+        assert reopened.savings_rate("TELECOM") == 0.22  # default until there is data
+        stats = reopened.stats(windows=[7, 30])
+        assert stats["windows"]["30d"]["negotiations"] == 2
+        assert stats["all_time"]["by_bill_type"]["MEDICAL"]["savings_rate"] == 0.4
+    
+    def test_specialist_reuses_close_strategy(self, tmp_path):
+        """A close past strategy replaces the analysis call; others become prompt context"""
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=create_embeddings("hashing"),
+                                   batch_size=0)
+        memory.store_negotiation({"company": "City Power", "bill_type": "UTILITY", "amount": 200.0,
+                                  "strategy": "Loyalty discount after 5 years of on-time payments",
+                                  "confidence": 0.9, "success": True})
+        recall = StrategyRecall(memory)
+        graph = UtilityNegotiationGraph(SimulatedChatModel(reply="fresh analysis", latency=0.05),
+                                        recall=recall).build_graph()
+        bill = {"ocr_text": "CITY POWER ELECTRIC BILL", "company": "City Power"}
+        
+        far = graph.invoke({**bill, "amount": 900.0})
+        assert far["negotiation_strategy"] == "fresh analysis"
+        assert "Loyalty discount" in far["past_strategies"]
+        
+        close = graph.invoke({**bill, "amount": 180.0})
+        assert close["negotiation_strategy"] == "Loyalty discount after 5 years of on-time payments"
+        
+        stats = recall.stats()
+        assert stats["searches"] == 1 and stats["cache_hits"] == 1
+        assert stats["reused"] == 1 and stats["reuse_rate"] == 0.5
+        assert stats["saved_seconds"] >= 0.05
+        memory.close()
+    
+    @pytest.mark.parametrize("graph_class,bill_type,company,analysis_key,script_key", [
+        (TelecomNegotiationGraph, "TELECOM", "Verizon", "plan_analysis", "negotiation_script"),
+        (SubscriptionNegotiationGraph, "SUBSCRIPTION", "Netflix", "service_analysis", "cancellation_strategy")
+    ])
+    def test_specialist_reuses_close_analysis(self, tmp_path, graph_class, bill_type, company,
+                                              analysis_key, script_key):
+        """A close past analysis replaces the analysis call; the script is rendered for this bill"""
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=create_embeddings("hashing"),
+                                   batch_size=0)
+        memory.store_negotiation({"company": company, "bill_type": bill_type, "amount": 89.99,
+                                  "strategy": "Loyalty discount after 5 years of on-time payments",
+                                  "confidence": 0.9, "success": True})
+        recall = StrategyRecall(memory)
+        graph = graph_class(SimulatedChatModel(reply="fresh analysis", latency=0),
+                            recall=recall).build_graph()
+        
+        result = graph.invoke({"ocr_text": f"{company.upper()}\nAmount Due: $99.50", "company": company,
+                               "amount": 99.5})
+        assert result[analysis_key] == "Loyalty discount after 5 years of on-time payments"
+        assert "$99.50" in result[script_key] and "89.99" not in result[script_key]
+        assert recall.stats()["reused"] == 1
+        memory.close()
+    
+    def test_orchestrator_records_analysis_for_reuse(self, tmp_path):
+        """The stored strategy of a telecom bill is its plan analysis, so a later bill's script never quotes it"""
+        memory = NegotiationMemory(persist_directory=str(tmp_path), embeddings=create_embeddings("hashing"),
+                                   batch_size=0)
+        recall = StrategyRecall(memory)
+        llm = SimulatedChatModel(reply="Data usage is well under the 10GB allowance", latency=0)
+        orchestrator = create_master_orchestrator(
+            router=create_router_graph(llm=llm),
+            specialists=build_specialist_graphs(llm=llm, recall=recall)
+        )
+        def negotiate(amount):
+            return orchestrator.invoke({"bill_data": {
+                "text": f"VERIZON WIRELESS\nMonthly Charges: ${amount:.2f}\nData Usage: 8GB of 10GB",
+                "company": "Verizon", "amount": amount, "confidence": {}
+            }, "messages": []})
+        
+        first = negotiate(89.99)["negotiation_result"]
+        assert first["analysis"] == first["details"]["plan_analysis"]
+        assert "$89.99" in first["strategy"] and "$89.99" not in first["analysis"]
+        memory.store_negotiation({"company": "Verizon", "bill_type": "TELECOM", "amount": 89.99,
+                                  "strategy": first["analysis"], "confidence": 0.9, "success": True})
+        recall.invalidate("TELECOM", "Verizon")
+        
+        second = negotiate(99.5)["negotiation_result"]
+        assert recall.stats()["reused"] == 1
+        assert "$99.50" in second["strategy"] and "89.99" not in second["strategy"]
+        memory.close()
+    
     def test_success_rate_calculation(self):
         """Test success rate calculation"""
         memory = NegotiationMemory()
@@ -189,6 +448,403 @@ class TestConfidenceScoring:
         confidence = calculate_confidence(negotiation_result)
         
         assert confidence < 0.6  # Should be lower confidence
+    
+    def test_features_and_batch_scoring(self):
+        """Features come from structured fields, and a batch scores like single results"""
+        from confidence import ConfidenceModel, extract_features, score_results, calculate_confidence, execution_mode
+        checked = {"strategy": "Dispute the duplicate charge", "details": {
+            "errors": "Duplicate CPT 99285 on line 3", "script": "No competitor mentioned here " * 200}}
+        clean = {"strategy": "Ask for a payment plan", "details": {"errors": "None identified"}}
+        bill = {"confidence": {"company": 1.0, "amount": 1.0, "due_date": 1.0}}
+        
+        features = extract_features(checked, bill, success_rate=0.9)
+        assert features[1:] == (0.0, 1.0, 0.9, 0.6)
+        assert extract_features(clean)[2] == 0.0
+        assert score_results([checked, clean], [bill, None], [0.9, None]) == pytest.approx(
+            [calculate_confidence(checked, bill, 0.9), calculate_confidence(clean)])
+        assert [execution_mode(score) for score in (0.81, 0.8, 0.5)] == ["auto_execute", "supervised", "human_handoff"]
+        
+        fitted = ConfidenceModel().fit([(1, 1, 1, 1, 1), (0, 0, 0, 0, 0)] * 20, [1, 0] * 20)
+        assert fitted.score((1, 1, 1, 1, 1)) > 0.9 and fitted.score((0, 0, 0, 0, 0)) < 0.1
+
+class TestAsyncPipeline:
+    
+    def create_offline_orchestrator(self):
+        """Orchestrator wired to fake LLMs so no API calls are made"""
+        return create_master_orchestrator(
+            router=create_router_graph(llm=FakeListChatModel(responses=["MEDICAL"])),
+            specialists=build_specialist_graphs(llm=FakeListChatModel(responses=["Settlement plan"]))
+        )
+    
+    def test_ainvoke_end_to_end(self):
+        """Test the orchestrator runs every node through the async path"""
+        orchestrator = self.create_offline_orchestrator()
+        
+        result = asyncio.run(orchestrator.ainvoke({
+            "bill_data": {
+                "text": "HOSPITAL BILL - Emergency Room Visit - $2,450.00",
+                "user_id": "test_user_005",
+                "amount": 2450.00,
+                "company": "General Hospital"
+            },
+            "messages": []
+        }))
+        
+        assert result["agent_decision"] == "MEDICAL"
+        assert result["negotiation_result"]["details"]["settlement_options"] == "Settlement plan"
+        assert result["execution_mode"] in ["auto_execute", "supervised", "human_handoff"]
+    
+    def test_invoke_still_supported(self):
+        """Test the same compiled graph still serves sync callers"""
+        orchestrator = self.create_offline_orchestrator()
+        
+        result = orchestrator.invoke({
+            "bill_data": {"text": "HOSPITAL BILL", "user_id": "test_user_006", "amount": 100.0},
+            "messages": []
+        })
+        
+        assert result["agent_decision"] == "MEDICAL"
+
+    def test_stream_events_order(self):
+        """Test streamed events push routing, then tokens, then confidence"""
+        orchestrator = self.create_offline_orchestrator()
+
+        async def collect():
+            return [event async for event in negotiation_events(orchestrator, {
+                "bill_data": {"text": "HOSPITAL BILL", "user_id": "test_user_007", "amount": 100.0},
+                "messages": []
+            })]
+
+        events = asyncio.run(collect())
+        names = [name for name, _ in events]
+
+        assert names.index("routing") < names.index("token") < names.index("confidence")
+        assert events[names.index("routing")][1]["agent_type"] == "MEDICAL"
+        assert {"node": "execute", "path": ["execute"]} in [data for name, data in events if name == "node_start"]
+        assert names[-1] == "state"
+        assert events[-1][1]["agent_decision"] == "MEDICAL"
+
+    def test_specialist_fan_out(self):
+        """Test independent specialist nodes run concurrently unless limited"""
+        llm = SimulatedChatModel(reply="analysis", latency=0.2)
+        bill = {"ocr_text": "HOSPITAL BILL", "company": "General Hospital", "amount": 100.0}
+        
+        def timed(graph):
+            started = time.perf_counter()
+            result = asyncio.run(graph.ainvoke(dict(bill)))
+            return result, time.perf_counter() - started
+        
+        result, parallel = timed(MedicalNegotiationGraph(llm).build_graph())
+        _, sequential = timed(MedicalNegotiationGraph(llm, max_concurrency=1).build_graph())
+        
+        assert {"errors", "settlement_options", "negotiation_plan"} <= set(result)
+        assert parallel < 0.55 < sequential
+
+class TestGraphRegistry:
+    
+    @pytest.fixture(autouse=True)
+    def stub_clients(self, monkeypatch):
+        """Build the registry's graphs on offline stub clients"""
+        monkeypatch.setattr("llm.clients._factory", ClientFactory(backend="stub"))
+    
+    def test_graphs_compiled_once(self):
+        """Test repeated lookups share the same compiled graphs"""
+        registry = GraphRegistry()
+        registry.warm_up()
+        
+        orchestrator = registry.get("orchestrator")
+        
+        assert registry.get("orchestrator") is orchestrator
+        assert registry.get("TELECOM") is registry.get("TELECOM")
+        assert registry.stats()["version"] == 1
+    
+    def test_reload_swaps_graphs(self):
+        """Test hot reload installs a freshly compiled set"""
+        registry = GraphRegistry()
+        before = registry.get("orchestrator")
+        
+        stats = registry.reload()
+        
+        assert stats["version"] == 2
+        assert registry.get("orchestrator") is not before
+    
+    def test_unknown_graph(self):
+        """Test unknown graph names are rejected"""
+        with pytest.raises(KeyError):
+            GraphRegistry().get("BANKING")
+
+class TestBillClassifier:
+    
+    def test_keyword_matcher_whole_words(self):
+        """Test the keyword automaton finds every pattern but not inside other words"""
+        matcher = KeywordMatcher({"he": 1, "she": 2, "at&t": 3})
+        
+        assert sorted(matcher.find("She pays AT&T; the ushers do not")) == [("at&t", 3), ("she", 2)]
+    
+    def test_fixture_accuracy(self):
+        """Test the fast tiers are accurate on the labeled fixture set"""
+        classifier = BillClassifier.trained(load_examples(SEED_EXAMPLES_PATH))
+        fixture = load_examples(os.path.join(os.path.dirname(__file__), "fixtures", "labeled_bills.jsonl"))
+        
+        decisions = [(classifier.classify(text), label) for text, label in fixture]
+        decided = [(decision, label) for decision, label in decisions if decision]
+        
+        assert len(decided) >= 0.8 * len(fixture)
+        assert sum(decision["bill_type"] == label for decision, label in decided) >= 0.95 * len(decided)
+        assert classifier.stats()["total"] == len(fixture)
+    
+    def test_abstains_without_evidence(self):
+        """Test uninformative bills are left to the LLM router"""
+        classifier = BillClassifier.trained(load_examples(SEED_EXAMPLES_PATH))
+        
+        assert classifier.classify("Invoice 1123\nAmount due $50.00\nThank you") is None
+        assert classifier.stats()["llm"] == 1
+    
+    def test_orchestrator_skips_llm_router(self):
+        """Test obvious bills are routed without calling the router LLM"""
+        orchestrator = create_master_orchestrator(
+            router=create_router_graph(llm=FakeListChatModel(responses=["TELECOM"])),
+            specialists=build_specialist_graphs(llm=FakeListChatModel(responses=["Plan"])),
+            classifier=BillClassifier.trained(load_examples(SEED_EXAMPLES_PATH))
+        )
+        
+        result = orchestrator.invoke({
+            "bill_data": {"text": "ELECTRIC BILL\nUsage: 902 kWh\nAmount Due: $124.58", "amount": 124.58},
+            "messages": []
+        })
+        
+        assert result["agent_decision"] == "UTILITY"
+        assert result["routing_tier"] == "keyword"
+    
+    def test_async_routing_never_trains(self, monkeypatch):
+        """Test ainvoke routes with the LLM until the process-wide classifier is trained, then uses it"""
+        import agents.bill_classifier as bill_classifier
+        monkeypatch.setattr(bill_classifier, "_classifier", None)
+        trained = BillClassifier.trained(load_examples(SEED_EXAMPLES_PATH))
+        calls = []
+        monkeypatch.setattr(BillClassifier, "trained", classmethod(lambda cls, *args: calls.append(args) or trained))
+        orchestrator = create_master_orchestrator(
+            router=create_router_graph(llm=FakeListChatModel(responses=["UTILITY"])),
+            specialists=build_specialist_graphs(llm=FakeListChatModel(responses=["Plan"]))
+        )
+        bill = {"bill_data": {"text": "ELECTRIC BILL\nUsage: 902 kWh\nAmount Due: $124.58", "amount": 124.58},
+                "messages": []}
+        
+        assert asyncio.run(orchestrator.ainvoke(bill))["routing_tier"] == "llm"
+        assert calls == []
+        bill_classifier.get_bill_classifier()
+        assert asyncio.run(orchestrator.ainvoke(bill))["routing_tier"] == "keyword"
+        assert len(calls) == 1
+
+class TestBillAnalytics:
+    
+    def test_batch_matches_single_account(self):
+        """Test one batch call over many accounts matches analyzing each history"""
+        months = [2023 * 12 + m for m in range(24)]
+        winter = [1.3 if m % 12 in (0, 1, 11) else 1.0 for m in months]
+        accounts = ["a"] * 24 + ["b"] * 24
+        amounts = [100 * w + 2 * i for i, w in enumerate(winter)] + [50.0] * 23 + [150.0]
+        
+        result = analyze_bill_histories(accounts, months + months, amounts, ["UTILITY"] * 48)
+        history = [{"month": f"{m // 12}-{m % 12 + 1:02d}", "amount": a} for m, a in zip(months, amounts[:24])]
+        single = analyze_bill_patterns(history)
+        
+        assert single["average_monthly"] == round(result["average"][0], 2)
+        assert single["trend"] == "increasing"
+        assert single["seasonal_index"]["Jan"] > 1.1 > single["seasonal_index"]["Jul"]
+        assert "Jan" in single["seasonal_patterns"]
+        assert result["anomalies"][1] == 1 and result["spikes"][1] == 1
+        assert list(result["peer_percentile"]) == [75.0, 25.0]
+        assert analyze_bill_patterns([]) == {"error": "No bill history provided"}
+
+    def test_month_formats(self):
+        """Test ISO, numeric and named month strings index the same month; others are errors"""
+        january = 2024 * 12
+        for value in ("2024-01", "2024-01-15", "2024-01-15T08:00:00", "01/2024", "1/15/2024",
+                      "Jan 2024", "January 2024", "jan. 2024", date(2024, 1, 15), january):
+            assert month_index(value) == january, value
+        for value in ("2024-13", "13/2024", "Foo 2024", "last month", ""):
+            with pytest.raises(ValueError):
+                month_index(value)
+        
+        history = [{"month": month, "amount": 100.0} for month in ("Nov 2023", "12/2023", "2024-01")]
+        assert analyze_bill_patterns(history)["average_monthly"] == 100.0
+        assert analyze_bill_patterns([{"month": "sometime", "amount": 100.0}]) == {
+            "error": "Unrecognized bill month: 'sometime'"
+        }
+    
+    def test_rejects_mixed_dated_and_undated_bills(self):
+        """Test a history mixing dated and undated bills is an error, not list positions mixed with months"""
+        history = [{"amount": 100.0}, {"month": "2024-01", "amount": 110.0}, {"amount": 120.0}]
+        assert analyze_bill_patterns(history) == {"error": "Bill history mixes dated and undated bills"}
+        undated = analyze_bill_patterns([{"amount": 100.0}, {"amount": 110.0}, {"amount": 120.0}])
+        assert undated["monthly_change"] == 10.0
+
+class TestCompetitorRates:
+    
+    RATES = [
+        "service_type,region,tier,provider,plan,price,promo_price,unit",
+        "TELECOM,US,mobile,Verizon,Unlimited,65,,month",
+        "TELECOM,US,mobile,Visible,Basic,25,,month",
+        "TELECOM,US,mobile,Mint Mobile,Unlimited,30,15,month",
+        "TELECOM,US,internet,Xfinity,Connect 300,55,35,month",
+        "TELECOM,TX,mobile,Cricket Wireless,Unlimited,55,,month"
+    ]
+    
+    def write(self, path, lines):
+        path.write_text("\n".join(lines) + "\n")
+        return str(path)
+    
+    def test_indexed_range_queries_and_reload(self, tmp_path):
+        """Test price range lookups, memory-mapped indexes and hot reload"""
+        path = self.write(tmp_path / "rates.csv", self.RATES)
+        store = CompetitorRateStore(path, check_seconds=0.01)
+        
+        assert [rate["provider"] for rate in store.query("telecom", "us", "mobile", min_price=26, max_price=65)] \
+            == ["Mint Mobile", "Verizon"]
+        assert store.region_for("TELECOM", "ZZ") == "US"
+        leverage = store.leverage("TELECOM", 70.0, "US", text="Verizon Wireless", company="Verizon")
+        assert leverage["tier"] == "mobile" and leverage["cheaper_offers"] == 2
+        assert [offer["provider"] for offer in leverage["offers"]] == ["Visible", "Mint Mobile"]
+        
+        save_index(store.index, str(tmp_path / "index"))
+        mapped = load_index(str(tmp_path / "index"))
+        assert mapped.query("TELECOM", "US", "mobile") == store.index.query("TELECOM", "US", "mobile")
+        
+        self.write(tmp_path / "rates.csv", self.RATES + ["TELECOM,US,mobile,US Mobile,Starter,20,,month"])
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        # The background checker swaps the new table in; lookups never reload it themselves
+        deadline = time.monotonic() + 2
+        while store.stats()["reloads"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.query("TELECOM", "US", "mobile", limit=1)[0]["provider"] == "US Mobile"
+        assert store.stats()["reloads"] == 2
+        store.close()
+    
+    def test_refresh_off_the_lookup_path(self, tmp_path, monkeypatch):
+        """Test lookups never stat the table and a refresh during a load does not load it again"""
+        import tools.competitor_rates as competitor_rates
+        path = self.write(tmp_path / "rates.csv", self.RATES)
+        store = CompetitorRateStore(path, check_seconds=0)
+        assert store.load()["reloads"] == 1 and store.loaded
+        
+        def no_stat(path):
+            raise AssertionError("lookup checked the rate table")
+        monkeypatch.setattr(competitor_rates, "_modified", no_stat)
+        assert store.query("TELECOM", "US", "mobile", limit=1)[0]["provider"] == "Visible"
+        monkeypatch.undo()
+        
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        with store._load_lock:
+            assert store.refresh() is False
+        assert store.refresh() is True and store.refresh() is False
+        assert store.stats()["reloads"] == 2
+        
+        store.path = str(tmp_path / "missing.csv")
+        assert store.refresh() is False and store.stats()["last_error"]
+        assert store.query("TELECOM", "US", "mobile", limit=1)[0]["provider"] == "Visible"
+    
+    def test_telecom_research_without_llm(self, tmp_path):
+        """Test the telecom graph takes competitor research from the rate store"""
+        store = CompetitorRateStore(self.write(tmp_path / "rates.csv", self.RATES), check_seconds=0)
+        graphs = build_specialist_graphs(llm=FakeListChatModel(responses=["Plan"]), recall=StrategyRecall(),
+                                         rates=store)
+        
+        result = graphs["TELECOM"].invoke({
+            "ocr_text": "VERIZON WIRELESS\nUnlimited data\nAmount Due: $89.99",
+            "company": "Verizon",
+            "amount": 89.99,
+            "region": "",
+            "bill_summary": ""
+        })
+        
+        assert "Visible Basic: $25/month" in result["competitor_research"]
+        assert "Verizon Unlimited" not in result["competitor_research"]
+        assert result["plan_analysis"] == "Plan"
+
+class TestScriptTemplates:
+    
+    def test_render_and_personalization(self):
+        """Test scripts render from fields and skip lines with missing values"""
+        leverage = {"offers": [{"provider": "Visible", "plan": "Basic", "price": 25.0, "unit": "month"}],
+                    "cheaper_offers": 2}
+        fields = script_fields("TELECOM", "Verizon", 89.99, leverage, analysis="1. Data usage is under 5GB a month\n")
+        opening, fallbacks = parse_personalization("OPENING: Hi, I've been with Verizon for 6 years.\n"
+                                                   "FALLBACK: Can you waive the fees?\nFALLBACK: Any loyalty credit?")
+        script = get_script_template("TELECOM").render(fields, opening, fallbacks)
+        
+        assert script.startswith("Opening:\n- Hi, I've been with Verizon for 6 years.")
+        assert "Visible is offering Basic for $25/month" in script
+        assert "- Data usage is under 5GB a month" in script
+        assert "about $71.99" in script and "- Any loyalty credit?" in script
+        
+        bare = get_script_template("UTILITY").render(script_fields("UTILITY", "City Power", 120))
+        assert "Competitor comparison" not in bare and "Key points" not in bare
+        assert parse_personalization("") == (None, [])
+    
+    def test_graph_without_script_llm_call(self):
+        """Test a zero token cap renders the script without calling the LLM"""
+        graphs = build_specialist_graphs(llm=FakeListChatModel(responses=["1. Usage dropped 20% this year"]),
+                                         recall=StrategyRecall(), script_tokens=0)
+        
+        result = graphs["UTILITY"].invoke({
+            "ocr_text": "ELECTRIC BILL\nCity Power\nAmount Due: $150.00",
+            "company": "City Power",
+            "amount": 150.0,
+            "region": "",
+            "bill_summary": ""
+        })
+        
+        assert "City Power account. My latest bill is $150.00" in result["script"]
+        assert "- Usage dropped 20% this year" in result["script"]
+
+class TestTracing:
+    
+    def test_graph_nodes_and_llm_calls_are_traced(self):
+        """Test every node and LLM call of a graph is recorded and exported"""
+        previous, tracer = get_tracer(), Tracer(enabled=True, exporter="")
+        set_tracer(tracer)
+        try:
+            graphs = build_specialist_graphs(llm=FakeListChatModel(responses=["1. Usage dropped 20% this year"]),
+                                             recall=StrategyRecall())
+        finally:
+            set_tracer(previous)
+        
+        graphs["UTILITY"].invoke({
+            "ocr_text": "ELECTRIC BILL\nCity Power\nAmount Due: $150.00",
+            "company": "City Power",
+            "amount": 150.0,
+            "region": "",
+            "bill_summary": ""
+        })
+        stats = tracer.stats()
+        
+        assert set(stats["nodes"]) == {"UTILITY/recall", "UTILITY/analyze", "UTILITY/script"}
+        analyze = stats["llm"]["UTILITY/analyze/fake-list-chat-model:default"]
+        assert analyze["calls"] == 1 and analyze["prompt_tokens"] > 0 and analyze["completion_tokens"] > 0
+        assert "UTILITY/script/fake-list-chat-model:default" in stats["llm"]
+        metrics = tracer.prometheus()
+        assert 'hagglz_node_duration_seconds_count{graph="UTILITY",node="analyze"} 1' in metrics
+        assert 'hagglz_llm_calls_total{graph="UTILITY",node="analyze",model="fake-list-chat-model:default",cache="off"} 1' \
+            in metrics
+    
+    def test_llm_call_cost_queue_and_cache_hits(self):
+        """Test cost estimates, queue time and cache hits per model"""
+        tracer = Tracer(enabled=True, exporter="", prices={"custom-model": (1.0, 2.0)})
+        
+        with tracer.measure_queue() as queued:
+            note_queue_wait(0.25)
+        tracer.llm_call("openai-chat:gpt-4", "generate_script", 2.0, 1000, 500, "miss", queued[0])
+        tracer.llm_call("openai-chat:gpt-4", "generate_script", cache="hit")
+        note_queue_wait(5.0)
+        
+        llm = tracer.stats()["llm"]["generate_script/openai-chat:gpt-4"]
+        assert queued == [0.25] and llm["avg_queue_seconds"] == 0.25
+        assert llm["calls"] == 1 and llm["cache_hits"] == 1
+        assert llm["cost_usd"] == 0.06
+        assert tracer.cost("stub:custom-model", 1000000, 1000000) == 3.0
+        assert 'hagglz_llm_queue_seconds_bucket{graph="",node="generate_script",model="openai-chat:gpt-4",le="0.5"} 1' \
+            in tracer.prometheus()
 
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main([__file__])
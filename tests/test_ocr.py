@@ -0,0 +1,230 @@
+import pytest
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from ocr.executor import OCRExecutor, OCRBusyError, OCRTimeoutError
+from ocr.cache import OCRCache
+from ocr.preprocess import preprocess, downscale
+from ocr.extraction import extract_bill_amount, extract_bill_data, format_bill_data
+from PIL import Image, ImageDraw
+
+def echo_job(image_data: bytes, timeout: float) -> str:
+    """Stand-in OCR job that decodes the bytes as text"""
+    return image_data.decode()
+
+def slow_job(image_data: bytes, timeout: float) -> str:
+    """Stand-in OCR job that takes longer than the tests allow"""
+    time.sleep(float(image_data.decode()))
+    return "done"
+
+class TestOCRExecutor:
+    
+    def test_submit_runs_on_pool(self):
+        """Test OCR jobs run in worker processes and are counted"""
+        executor = OCRExecutor(max_workers=2, max_queue=2, job=echo_job)
+        try:
+            text = asyncio.run(executor.submit(b"Amount Due: $42.00"))
+        finally:
+            executor.shutdown()
+        
+        assert text == "Amount Due: $42.00"
+        assert executor.metrics()["completed"] == 1
+        assert executor.metrics()["in_flight"] == 0
+    
+    def test_rejects_when_saturated(self):
+        """Test submissions beyond workers + queue fail fast with a retry hint"""
+        executor = OCRExecutor(max_workers=1, max_queue=0, job=slow_job)
+        
+        async def burst():
+            first = asyncio.ensure_future(executor.submit(b"0.5"))
+            await asyncio.sleep(0)
+            with pytest.raises(OCRBusyError) as excinfo:
+                await executor.submit(b"0")
+            await first
+            return excinfo.value
+        
+        try:
+            error = asyncio.run(burst())
+        finally:
+            executor.shutdown()
+        
+        assert error.retry_after >= 1
+        assert executor.metrics()["rejected"] == 1
+    
+    def test_job_timeout(self):
+        """Test jobs exceeding the per-job timeout are abandoned"""
+        executor = OCRExecutor(max_workers=1, max_queue=1, timeout=0.2, job=slow_job)
+        try:
+            with pytest.raises(OCRTimeoutError):
+                asyncio.run(executor.submit(b"2"))
+        finally:
+            executor.shutdown()
+        
+        assert executor.metrics()["timed_out"] == 1
+    
+    def test_timed_out_job_keeps_its_slot(self):
+        """Test a timed-out job counts as in flight until its worker finishes it"""
+        executor = OCRExecutor(max_workers=1, max_queue=0, timeout=0.2, job=slow_job)
+        try:
+            with pytest.raises(OCRTimeoutError):
+                asyncio.run(executor.submit(b"1"))
+            assert executor.metrics()["in_flight"] == 1
+            with pytest.raises(OCRBusyError):
+                asyncio.run(executor.submit(b"0"))
+            
+            deadline = time.time() + 30
+            while executor.metrics()["in_flight"] and time.time() < deadline:
+                time.sleep(0.05)
+            assert executor.metrics()["in_flight"] == 0
+            assert asyncio.run(executor.submit(b"0")) == "done"
+        finally:
+            executor.shutdown()
+
+class TestOCRCache:
+    
+    def test_memory_hit_and_miss(self):
+        """Test identical image bytes hit the cache and others miss"""
+        cache = OCRCache(max_entries=8, path="")
+        cache.put(b"bill-image", {"text": "Amount Due: $42.00", "amount": 42.0})
+        
+        assert cache.get(b"bill-image") == {"text": "Amount Due: $42.00", "amount": 42.0}
+        assert cache.get(b"other-image") is None
+        
+        stats = cache.stats()
+        assert stats["memory_hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+    
+    def test_lru_eviction(self):
+        """Test the memory tier drops the least recently used entry"""
+        cache = OCRCache(max_entries=2, path="")
+        cache.put(b"a", {"text": "a", "amount": 1.0})
+        cache.put(b"b", {"text": "b", "amount": 2.0})
+        cache.get(b"a")
+        cache.put(b"c", {"text": "c", "amount": 3.0})
+        
+        assert cache.get(b"b") is None
+        assert cache.get(b"a") is not None
+    
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """Test results persist in the SQLite tier across cache instances"""
+        path = str(tmp_path / "ocr.sqlite3")
+        cache = OCRCache(max_entries=4, path=path)
+        cache.put(b"bill-image", {"text": "Total: $10.00", "amount": 10.0})
+        cache.close()
+        
+        reopened = OCRCache(max_entries=4, path=path)
+        
+        assert reopened.get(b"bill-image")["amount"] == 10.0
+        assert reopened.stats()["disk_hits"] == 1
+    
+    def test_disk_tier_size_eviction(self, tmp_path):
+        """Test the SQLite tier stays under its byte budget"""
+        cache = OCRCache(max_entries=1, path=str(tmp_path / "ocr.sqlite3"), max_bytes=400)
+        for i in range(10):
+            cache.put(str(i).encode(), {"text": "x" * 100, "amount": float(i)})
+        
+        assert cache.stats()["disk_bytes"] <= 400
+        assert cache.get(b"9") is not None
+        assert cache.get(b"0") is None
+    
+    def test_reads_tables_without_creation_times(self, tmp_path):
+        """Test a disk tier written before entries carried a creation time still serves them"""
+        path = str(tmp_path / "ocr.sqlite3")
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE ocr_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                   "size INTEGER NOT NULL, accessed REAL NOT NULL)")
+        db.execute("INSERT INTO ocr_cache VALUES (?, ?, ?, ?)",
+                   (OCRCache.make_key(b"bill-image"), '{"text": "Total: $10.00", "amount": 10.0}', 42, 0.0))
+        db.commit()
+        db.close()
+        
+        cache = OCRCache(max_entries=4, path=path)
+        assert cache.get(b"bill-image")["amount"] == 10.0
+        cache.put(b"other-image", {"text": "Total: $5.00", "amount": 5.0})
+        cache.close()
+
+class TestOCRPreprocessing:
+    
+    def create_photo(self):
+        """A large photo of a light bill with text on a dark background"""
+        photo = Image.new("RGB", (3000, 4000), (80, 60, 50))
+        page = Image.new("RGB", (2400, 3200), (245, 245, 240))
+        draw = ImageDraw.Draw(page)
+        for i in range(6):
+            draw.text((200, 300 + i * 120), f"Amount Due: ${i}24.58", fill=(20, 20, 20), font_size=60)
+        photo.paste(page, (300, 400))
+        return photo
+    
+    def test_stages_and_timings(self):
+        """Test preprocessing outputs grayscale and times every stage"""
+        image, timings = preprocess(self.create_photo(), binarize_image=True, crop=True)
+        
+        assert image.mode == "L"
+        assert set(timings) == {"exif_transpose", "grayscale", "downscale", "crop", "binarize"}
+        assert set(image.histogram()[1:255]) == {0}
+    
+    def test_crop_shrinks_to_text(self):
+        """Test cropping removes the background and empty page area"""
+        raw = self.create_photo()
+        image, _ = preprocess(raw, crop=True)
+        
+        assert image.width * image.height < raw.width * raw.height / 4
+    
+    def test_downscale_never_upscales(self):
+        """Test low resolution images are left untouched"""
+        small = Image.new("L", (850, 1100), 255)
+        
+        assert downscale(small, 300) is small
+        assert downscale(Image.new("L", (3400, 4400), 255), 300).size == (2550, 3300)
+
+class TestBillExtraction:
+    
+    def load_fixtures(self):
+        path = os.path.join(os.path.dirname(__file__), "fixtures", "extraction_bills.jsonl")
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    
+    def test_fixture_accuracy(self):
+        """Test every labeled field of the extraction fixtures is recovered"""
+        for fixture in self.load_fixtures():
+            bill = extract_bill_data(fixture["text"])
+            expected = fixture["expected"]
+            period = bill["service_period"]
+            
+            assert bill["amount"] == expected["amount"], fixture["text"]
+            assert bill["due_date"] == expected["due_date"], fixture["text"]
+            assert bill["account_number"] == expected["account_number"], fixture["text"]
+            assert ([period["start"], period["end"]] if period else None) == expected["service_period"], fixture["text"]
+            assert bill["company"] == expected["company"], fixture["text"]
+            assert len(bill["line_items"]) == expected["line_items"], fixture["text"]
+    
+    def test_amount_due_beats_first_dollar_figure(self):
+        """Test comma amounts parse and the labelled total wins over earlier figures"""
+        bill = extract_bill_data("Room charge $3,100.00\nInsurance paid -$650.00\nAmount Due: $2,450.00")
+        
+        assert bill["amount"] == 2450.00
+        assert bill["confidence"]["amount"] == 0.95
+        assert extract_bill_amount("Copay $30.00 and a fee of $4.50") == 30.00
+        assert extract_bill_data("Copay $30.00 and a fee of $4.50")["confidence"]["amount"] == 0.4
+    
+    def test_whole_dollar_amount_after_label(self):
+        """Test a bare integer after an amount due label is the amount, as before the scanner"""
+        assert extract_bill_amount("Amount Due: 124") == 124.0
+        assert extract_bill_amount("Amount Due\n1,240") == 1240.0
+        assert extract_bill_amount("Balance due: 124 USD\nLate fee $5.00") == 124.0
+        # Dates and loosely labelled counts are not amounts
+        assert extract_bill_amount("Amount due 12/2024") == 0.0
+        assert extract_bill_amount("Total 3 items\nCharges $45.00") == 45.0
+    
+    def test_missing_fields_have_zero_confidence(self):
+        """Test absent fields are None with confidence 0 and the summary falls back"""
+        bill = extract_bill_data("Thanks for being a customer")
+        
+        assert bill["amount"] == 0.0
+        assert bill["due_date"] is None
+        assert bill["confidence"]["due_date"] == 0.0
+        assert format_bill_data(bill) == ""
+        assert "Amount due: $124.58" in format_bill_data(extract_bill_data(self.load_fixtures()[0]["text"]))
@@ -0,0 +1,168 @@
+"""
+Two-tier (in-memory LRU + SQLite) key-value store behind the OCR and LLM caches
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+class TieredCache:
+    """LRU of JSON-serializable dicts, optionally backed by a SQLite table
+
+    Callers hash their own keys; each use gets its own table. The in-memory
+    tier is bounded by entry count (0 disables it); the SQLite tier, used
+    when path is set, is bounded by total stored bytes and evicts the least
+    recently used rows. Entries older than ttl seconds are treated as
+    misses (0 disables expiry). Values are copied in and out, so callers
+    may mutate what they get back.
+    """
+
+    def __init__(self, table: str, max_entries: int, path: str = "", max_bytes: int = 0, ttl: float = 0):
+        self.table = table
+        self.max_entries = max_entries
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._db = None
+        self._disk_bytes = 0
+
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL DEFAULT 0, accessed REAL NOT NULL)"
+            )
+            # Tables written before entries carried a creation time
+            columns = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            if "created" not in columns:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN created REAL NOT NULL DEFAULT 0")
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    @property
+    def persistent(self) -> bool:
+        """Whether lookups may touch SQLite (and so should stay off the event loop)"""
+        return self._db is not None
+
+    def _fresh(self, created: float) -> bool:
+        return not self.ttl or time.time() - created < self.ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a copy of the value stored under key, if any"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._fresh(entry[0]):
+                del self._entries[key]
+                self._counters["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return dict(entry[1])
+
+            if self._db is not None:
+                row = self._db.execute(
+                    f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if self._fresh(row[1]):
+                        self._db.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self._counters["disk_hits"] += 1
+                        return dict(value)
+                    self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._counters["expired"] += 1
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Dict):
+        """Store a copy of value under key in both tiers"""
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, dict(value))
+            if self._db is not None:
+                self._write_disk(key, created, value)
+
+    def _remember(self, key: str, created: float, value: Dict):
+        """Insert into the memory tier; caller must hold the lock"""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _write_disk(self, key: str, created: float, value: Dict):
+        """Insert into the disk tier and evict down to max_bytes; caller must hold the lock"""
+        payload = json.dumps(value)
+        size = len(payload.encode())
+        previous = self._db.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        self._db.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, payload, size, created, time.time())
+        )
+        self._disk_bytes += size - (previous[0] if previous else 0)
+
+        # Evict least recently used rows in small batches until under budget
+        while self._disk_bytes > self.max_bytes:
+            rows = self._db.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for old_key, old_size in rows:
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (old_key,))
+                self._disk_bytes -= old_size
+                self._counters["evictions"] += 1
+                if self._disk_bytes <= self.max_bytes:
+                    break
+        self._db.commit()
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "disk_enabled": self._db is not None,
+                "disk_bytes": self._disk_bytes
+            }
+
+    def close(self):
+        """Close the disk tier"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,270 @@
+"""
+Vectorized bill-history analytics behind the analyze_patterns tool
+
+Histories are columnar: one row per bill with an account, a month index
+(year * 12 + month - 1, see month_index) and an amount. analyze_bill_histories
+analyzes every account in one pass of NumPy group sums over rows sorted by
+account and month, so a million bills cost a handful of array operations
+instead of a Python loop per customer.
+"""
+
+import re
+from datetime import date
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+MONTH_NAMES = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# Annual trend (share of the average bill) beyond which bills are rising or falling
+TREND_THRESHOLD = 0.05
+# Seasonal index deviation worth pointing out, and the bills a trend residual needs
+SEASONAL_THRESHOLD = 0.10
+MIN_ANOMALY_BILLS = 4
+
+# Month strings month_index reads: "2024-01[-15]", "01/2024", "01/15/2024" and "Jan[uary] 2024"
+ISO_MONTH = re.compile(r"(\d{4})-(\d{1,2})(?:-\d{1,2})?(?:[T ].*)?")
+SLASH_MONTH = re.compile(r"(\d{1,2})/(?:\d{1,2}/)?(\d{4})")
+NAMED_MONTH = re.compile(r"([A-Za-z]{3})[A-Za-z]*\.?,? +(\d{4})")
+
+def month_index(value) -> int:
+    """Month index of a date, a month string (see ISO_MONTH etc.) or an index already
+
+    Raises ValueError for anything else.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, date):
+        return value.year * 12 + value.month - 1
+    text = str(value).strip()
+    if match := ISO_MONTH.fullmatch(text):
+        year, month = int(match[1]), int(match[2])
+    elif match := SLASH_MONTH.fullmatch(text):
+        year, month = int(match[2]), int(match[1])
+    elif (match := NAMED_MONTH.fullmatch(text)) and match[1].title() in MONTH_NAMES:
+        year, month = int(match[2]), MONTH_NAMES.index(match[1].title()) + 1
+    else:
+        raise ValueError(f"Unrecognized bill month: {value!r}")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Unrecognized bill month: {value!r}")
+    return year * 12 + month - 1
+
+def month_label(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def analyze_bill_histories(accounts: Sequence, months: Sequence[int], amounts: Sequence[float],
+                           bill_types: Sequence[str] = None, window: int = 3, anomaly_z: float = 2.5,
+                           spike_ratio: float = 0.3) -> Dict:
+    """Analytics for every account's bill history in one vectorized call
+
+    Bills of an account in the same month are summed. Per account (in the
+    order of the returned "accounts") this returns the bill count, average,
+    latest bill, average of the last `window` bills, least-squares trend
+    slope (per month) and annual trend (share of the average), month-of-year
+    seasonality indices (detrended, mean 1, NaN for months never billed),
+    anomaly and spike counts, and the percentile rank of the average
+    against accounts of the same bill type. "rows" holds the per-bill
+    rolling averages, trend residual z-scores and anomaly (|z| > anomaly_z)
+    and spike (over the previous `window` bills' average by spike_ratio)
+    flags; anomalous bills are left out of the seasonality indices.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    months = np.asarray(months, dtype=np.int64)
+    ids, account = np.unique(np.asarray(accounts), return_inverse=True)
+    n = len(ids)
+
+    # One row per account and month, sorted by account then month
+    base = months.min()
+    span = int(months.max() - base) + 1
+    keys, row = np.unique(account.astype(np.int64) * span + (months - base), return_inverse=True)
+    amount = np.bincount(row, amounts, len(keys))
+    row_account = keys // span
+    row_month = keys % span + base
+
+    counts = np.bincount(row_account, minlength=n)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    position = np.arange(len(keys))
+    start = starts[row_account]
+
+    sums = np.bincount(row_account, amount, n)
+    mean = sums / counts
+
+    # Least-squares line through each account's bills over months since its first
+    t = (row_month - row_month[starts][row_account]).astype(np.float64)
+    st = np.bincount(row_account, t, n)
+    stt = np.bincount(row_account, t * t, n)
+    sta = np.bincount(row_account, t * amount, n)
+    denominator = counts * stt - st * st
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denominator > 0, (counts * sta - st * sums) / denominator, 0.0)
+        intercept = (sums - slope * st) / counts
+        fitted = intercept[row_account] + slope[row_account] * t
+        residual = amount - fitted
+        sigma = np.sqrt(np.bincount(row_account, residual * residual, n) / np.maximum(counts - 2, 1))
+        zscore = np.where(sigma[row_account] > 0, residual / sigma[row_account], 0.0)
+    anomaly = (np.abs(zscore) > anomaly_z) & (counts[row_account] >= MIN_ANOMALY_BILLS)
+
+    # Rolling averages from one cumulative sum, clipped at each account's first bill
+    cumulative = np.concatenate(([0.0], np.cumsum(amount)))
+    low = np.maximum(position - window + 1, start)
+    rolling = (cumulative[position + 1] - cumulative[low]) / (position - low + 1)
+    previous_low = np.maximum(position - window, start)
+    previous = position - previous_low
+    with np.errstate(divide="ignore", invalid="ignore"):
+        baseline = (cumulative[position] - cumulative[previous_low]) / previous
+    spike = (previous == window) & (amount > (1 + spike_ratio) * baseline)
+
+    # Month-of-year indices from bills relative to the trend line; one-off
+    # anomalies are left out so they do not read as seasons
+    with np.errstate(divide="ignore", invalid="ignore"):
+        usual = ~anomaly
+        ratio = amount / np.where(fitted > 0, fitted, mean[row_account])
+        season_keys = row_account * 12 + row_month % 12
+        seasonal = (np.bincount(season_keys, ratio * usual, n * 12)
+                    / np.bincount(season_keys, usual, n * 12)).reshape(n, 12)
+        seasonal /= np.nanmean(seasonal, axis=1, keepdims=True)
+
+    if bill_types is None:
+        account_type = np.full(n, "", dtype=object)
+    else:
+        account_type = np.empty(n, dtype=object)
+        account_type[account] = np.asarray(bill_types, dtype=object)
+
+    return {
+        "accounts": ids,
+        "bill_type": account_type,
+        "bills": counts,
+        "first_month": row_month[starts],
+        "last_month": row_month[ends - 1],
+        "average": mean,
+        "latest": amount[ends - 1],
+        "recent_average": rolling[ends - 1],
+        "slope": slope,
+        "annual_trend": np.where(mean != 0, slope * 12 / np.where(mean != 0, mean, 1), 0.0),
+        "seasonal_index": seasonal,
+        "anomalies": np.bincount(row_account, anomaly, n).astype(np.int64),
+        "spikes": np.bincount(row_account, spike, n).astype(np.int64),
+        "peer_percentile": peer_percentiles(mean, account_type),
+        "rows": {
+            "account": row_account,
+            "month": row_month,
+            "amount": amount,
+            "rolling_average": rolling,
+            "zscore": zscore,
+            "anomaly": anomaly,
+            "spike": spike
+        }
+    }
+
+def peer_percentiles(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Mid-rank percentile (0-100) of each value among the values of its group"""
+    _, group = np.unique(groups.astype(str), return_inverse=True)
+    order = np.lexsort((values, group))
+    sorted_values, sorted_groups = values[order], group[order]
+    size = len(values)
+    index = np.arange(size)
+
+    group_changes = np.concatenate(([True], sorted_groups[1:] != sorted_groups[:-1]))
+    group_start = np.maximum.accumulate(np.where(group_changes, index, 0))
+    group_size = np.bincount(group)[sorted_groups]
+    tie_changes = group_changes | np.concatenate(([True], sorted_values[1:] != sorted_values[:-1]))
+    tie_start = np.maximum.accumulate(np.where(tie_changes, index, 0))
+    tie_size = np.diff(np.append(np.flatnonzero(tie_changes), size))[np.cumsum(tie_changes) - 1]
+
+    percentile = np.empty(size)
+    percentile[order] = 100 * (tie_start - group_start + 0.5 * tie_size) / group_size
+    return percentile
+
+def _seasonal_summary(index: np.ndarray) -> str:
+    if np.isnan(index).any():
+        return "Not enough history for seasonality (needs every month of the year)"
+    high = [i for i in np.argsort(-index) if index[i] - 1 > SEASONAL_THRESHOLD][:2]
+    low = [i for i in np.argsort(index) if 1 - index[i] > SEASONAL_THRESHOLD][:2]
+    if not high and not low:
+        return "No clear seasonal pattern"
+    parts = []
+    if high:
+        parts.append(f"highest in {', '.join(MONTH_NAMES[i] for i in high)} (+{index[high[0]] - 1:.0%})")
+    if low:
+        parts.append(f"lowest in {', '.join(MONTH_NAMES[i] for i in low)} (-{1 - index[low[0]]:.0%})")
+    return "Bills are " + "; ".join(parts)
+
+def analyze_bill_patterns(bill_history: List[Dict], peer_averages: Sequence[float] = None, window: int = 3) -> Dict:
+    """Analyze historical bill patterns for negotiation insights
+
+    Bills carry an amount and a date (or month) and are taken as
+    consecutive months when none has one; a history mixing dated and
+    undated bills, or with a month month_index cannot read, is an error.
+    peer_averages are the average bills of similar customers, for the
+    percentile rank.
+    """
+    if not bill_history:
+        return {"error": "No bill history provided"}
+
+    dates = [bill.get("date") or bill.get("month") for bill in bill_history]
+    dated = any(dates)
+    if dated and not all(dates):
+        return {"error": "Bill history mixes dated and undated bills"}
+    try:
+        months = [month_index(value) for value in dates] if dated else list(range(len(bill_history)))
+    except ValueError as e:
+        return {"error": str(e)}
+    result = analyze_bill_histories(np.zeros(len(bill_history), dtype=np.int64), months,
+                                    [bill.get("amount", 0) for bill in bill_history], window=window)
+    rows = result["rows"]
+    average = float(result["average"][0])
+    annual_trend = float(result["annual_trend"][0])
+    bills = int(result["bills"][0])
+    seasonal = result["seasonal_index"][0]
+
+    percentile = None
+    if peer_averages is not None and len(peer_averages):
+        peers = np.asarray(peer_averages, dtype=np.float64)
+        percentile = 100 * ((peers < average).sum() + 0.5 * (peers == average).sum() + 0.5) / (len(peers) + 1)
+
+    trend = "stable"
+    if bills >= 3 and annual_trend > TREND_THRESHOLD:
+        trend = "increasing"
+    elif bills >= 3 and annual_trend < -TREND_THRESHOLD:
+        trend = "decreasing"
+
+    spikes = [
+        {"month": month_label(int(month)) if dated else int(month), "amount": round(float(amount), 2)}
+        for month, amount in zip(rows["month"][rows["spike"]], rows["amount"][rows["spike"]])
+    ]
+    leverage_points = []
+    if trend == "increasing":
+        leverage_points.append(f"Bills rising {annual_trend:.0%} per year")
+    if spikes:
+        leverage_points.append(f"{len(spikes)} bill spike(s), e.g. ${spikes[0]['amount']:.2f} in {spikes[0]['month']}")
+    if percentile is not None and percentile >= 75:
+        leverage_points.append(f"Paying more than {percentile:.0f}% of similar customers")
+    if bills >= 12:
+        leverage_points.append(f"Long-term customer loyalty ({bills} months of bills)")
+    if not leverage_points:
+        leverage_points.append("Usage pattern stability")
+
+    peak = None if np.isnan(seasonal).any() else int(np.argmax(seasonal))
+    if bills < 12:
+        timing = "Best to negotiate after 12+ months of service"
+    elif peak is not None and seasonal[peak] - 1 > SEASONAL_THRESHOLD:
+        timing = f"Negotiate before the {MONTH_NAMES[peak]} peak"
+    else:
+        timing = "Negotiate now: 12+ months of service history"
+
+    return {
+        "average_monthly": round(average, 2),
+        "recent_average": round(float(result["recent_average"][0]), 2),
+        "trend": trend,
+        "monthly_change": round(float(result["slope"][0]), 2),
+        "annual_trend_pct": round(annual_trend * 100, 1),
+        "rolling_average": [round(float(value), 2) for value in rows["rolling_average"]],
+        "seasonal_patterns": _seasonal_summary(seasonal),
+        "seasonal_index": None if peak is None else {MONTH_NAMES[i]: round(float(seasonal[i]), 3) for i in range(12)},
+        "anomalies": int(result["anomalies"][0]),
+        "spikes": spikes,
+        "peer_percentile": None if percentile is None else round(float(percentile), 1),
+        "negotiation_timing": timing,
+        "leverage_points": leverage_points
+    }
@@ -0,0 +1,459 @@
+"""
+Local competitor-rate store that answers competitor research without an LLM
+
+Rates come from a CSV or Parquet table with the columns in COLUMNS and are
+kept in a RateIndex: rows sorted by (service_type, region, tier) and then by
+price, in flat NumPy columns, with a dict from each key to its row range. A
+price range query is two binary searches inside that range. save_index
+writes the columns as .npy files that load_index memory-maps, so a large
+table opens without parsing and only the pages a query touches are read.
+"""
+
+import csv
+import json
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+COLUMNS = ("service_type", "region", "tier", "provider", "plan", "price", "promo_price", "unit")
+
+DEFAULT_RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "competitor_rates.csv")
+
+# Region whose rates are used when a bill's region has none
+NATIONAL_REGION = "US"
+
+# Bill text hinting at a tier, checked in order (specific tiers first)
+TIER_HINTS = {
+    "gigabit": ("gigabit", "1 gig", "1000 mbps"),
+    "family": ("family plan", "4 lines", "3 lines", "multi-line"),
+    "internet": ("internet", "broadband", "mbps", "fiber", "modem"),
+    "mobile": ("wireless", "mobile", "cell phone", "unlimited data", "text messages"),
+    "electric": ("electric", "kwh", "kilowatt"),
+    "gas": ("natural gas", "therm"),
+    "music": ("music", "spotify", "audible"),
+    "software": ("software", "microsoft 365", "creative cloud", "cloud storage", "icloud", "dropbox"),
+    "fitness": ("gym", "fitness"),
+    "streaming": ("streaming", "netflix", "hulu", "disney+", "peacock", "paramount+")
+}
+
+INDEX_META = "meta.json"
+INDEX_ARRAYS = ("price", "promo_price", "provider", "plan", "unit")
+
+Key = Tuple[str, str, str]
+
+def rate_key(service_type: str, region: str, tier: str) -> Key:
+    return (service_type or "").strip().upper(), (region or "").strip().upper(), (tier or "").strip().lower()
+
+def _price(value) -> float:
+    """A price cell as a float, NaN when empty"""
+    if value is None or value == "":
+        return math.nan
+    return float(value)
+
+class RateIndex:
+    """Immutable, price-sorted competitor rates keyed by (service_type, region, tier)
+
+    provider, plan and unit are int32 codes into strings; promo_price is NaN
+    where a plan has no promotional price.
+    """
+
+    def __init__(self, keys: Dict[Key, Tuple[int, int]], price: np.ndarray, promo_price: np.ndarray,
+                 provider: np.ndarray, plan: np.ndarray, unit: np.ndarray, strings: Sequence[str]):
+        self.keys = keys
+        self.price = price
+        self.promo_price = promo_price
+        self.provider = provider
+        self.plan = plan
+        self.unit = unit
+        self.strings = list(strings)
+        self._tiers: Dict[Tuple[str, str], List[str]] = {}
+        for service_type, region, tier in sorted(keys):
+            self._tiers.setdefault((service_type, region), []).append(tier)
+        self._providers = None
+        self._codes = None
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    @classmethod
+    def from_columns(cls, service_type: Sequence[str], region: Sequence[str], tier: Sequence[str],
+                     provider: Sequence[str], plan: Sequence[str], price: Sequence[float],
+                     promo_price: Sequence[float] = None, unit: Sequence[str] = None) -> "RateIndex":
+        """Build an index from equally long columns"""
+        price = np.asarray(price, dtype=np.float64)
+        size = len(price)
+        promo_price = np.full(size, np.nan) if promo_price is None else np.asarray(promo_price, dtype=np.float64)
+        unit = ["month"] * size if unit is None else unit
+
+        labels = np.array(["\x1f".join(rate_key(*key)) for key in zip(service_type, region, tier)], dtype=object)
+        key_labels, key_code = np.unique(labels, return_inverse=True)
+        order = np.lexsort((price, key_code))
+        counts = np.bincount(key_code, minlength=len(key_labels))
+        ends = np.cumsum(counts)
+        keys = {
+            tuple(label.split("\x1f")): (int(end - count), int(end))
+            for label, count, end in zip(key_labels, counts, ends)
+        }
+
+        strings, codes = np.unique(
+            np.concatenate([np.asarray(column, dtype=object).astype(str) for column in (provider, plan, unit)]),
+            return_inverse=True
+        )
+        codes = codes.astype(np.int32).reshape(3, size)[:, order]
+        return cls(keys, price[order], promo_price[order], codes[0], codes[1], codes[2], strings.tolist())
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict]) -> "RateIndex":
+        """Build an index from dicts with the keys in COLUMNS (promo_price and unit optional)"""
+        columns = {column: [] for column in COLUMNS}
+        for row in rows:
+            for column in ("service_type", "region", "tier", "provider", "plan"):
+                columns[column].append(row[column])
+            columns["price"].append(_price(row["price"]))
+            columns["promo_price"].append(_price(row.get("promo_price")))
+            columns["unit"].append(row.get("unit") or "month")
+        return cls.from_columns(**columns)
+
+    def code(self, value: str) -> Optional[int]:
+        """The code of a provider, plan or unit string (case-insensitive), None if absent"""
+        if self._codes is None:
+            self._codes = {string.lower(): code for code, string in enumerate(self.strings)}
+        return self._codes.get((value or "").strip().lower())
+
+    def _row(self, i: int) -> Dict:
+        promo = float(self.promo_price[i])
+        return {
+            "provider": self.strings[self.provider[i]],
+            "plan": self.strings[self.plan[i]],
+            "price": float(self.price[i]),
+            "promo_price": None if math.isnan(promo) else promo,
+            "unit": self.strings[self.unit[i]]
+        }
+
+    def _range(self, service_type: str, region: str, tier: str, min_price: float = None,
+               max_price: float = None) -> Tuple[int, int]:
+        start, end = self.keys.get(rate_key(service_type, region, tier), (0, 0))
+        prices = self.price[start:end]
+        low = start + (int(np.searchsorted(prices, min_price, "left")) if min_price is not None else 0)
+        high = start + (int(np.searchsorted(prices, max_price, "right")) if max_price is not None else end - start)
+        return low, max(high, low)
+
+    def query(self, service_type: str, region: str, tier: str, min_price: float = None,
+              max_price: float = None, limit: int = None, exclude_provider: str = None) -> List[Dict]:
+        """Rates of a key with min_price <= price <= max_price, cheapest first"""
+        low, high = self._range(service_type, region, tier, min_price, max_price)
+        excluded = self.code(exclude_provider) if exclude_provider else None
+        rates = []
+        for i in range(low, high):
+            if limit is not None and len(rates) >= limit:
+                break
+            if excluded is None or self.provider[i] != excluded:
+                rates.append(self._row(i))
+        return rates
+
+    def count(self, service_type: str, region: str, tier: str, min_price: float = None,
+              max_price: float = None, exclude_provider: str = None) -> int:
+        """Number of rates query() would return without a limit, without building them"""
+        low, high = self._range(service_type, region, tier, min_price, max_price)
+        excluded = self.code(exclude_provider) if exclude_provider else None
+        if excluded is None:
+            return high - low
+        return high - low - int(np.count_nonzero(self.provider[low:high] == excluded))
+
+    def tiers(self, service_type: str, region: str) -> List[str]:
+        service_type, region, _ = rate_key(service_type, region, "")
+        return self._tiers.get((service_type, region), [])
+
+    def median(self, key: Key) -> float:
+        start, end = self.keys[key]
+        return float(self.price[(start + end - 1) // 2] + self.price[(start + end) // 2]) / 2
+
+    def unit_of(self, key: Key) -> str:
+        return self.strings[self.unit[self.keys[key][0]]]
+
+    def provider_keys(self, provider: str) -> List[Key]:
+        """Keys offering rates from a provider (matched case-insensitively)"""
+        if self._providers is None:
+            providers = {}
+            for key, (start, end) in self.keys.items():
+                for code in np.unique(self.provider[start:end]):
+                    providers.setdefault(self.strings[code].lower(), []).append(key)
+            self._providers = providers
+        return self._providers.get((provider or "").strip().lower(), [])
+
+def save_index(index: RateIndex, path: str):
+    """Write an index as a directory of .npy columns that load_index can memory-map"""
+    os.makedirs(path, exist_ok=True)
+    for name in INDEX_ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(index, name)))
+    meta = {
+        "keys": [[*key, start, end] for key, (start, end) in sorted(index.keys.items())],
+        "strings": index.strings
+    }
+    # meta.json goes last: its mtime marks a complete index for hot reload
+    with open(os.path.join(path, INDEX_META), "w") as f:
+        json.dump(meta, f)
+
+def load_index(path: str, mmap: bool = True) -> RateIndex:
+    """Open an index written by save_index, memory-mapping its columns unless mmap=False"""
+    with open(os.path.join(path, INDEX_META)) as f:
+        meta = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in INDEX_ARRAYS
+    }
+    keys = {(service_type, region, tier): (start, end) for service_type, region, tier, start, end in meta["keys"]}
+    return RateIndex(keys, strings=meta["strings"], **arrays)
+
+def load_rates(path: str) -> RateIndex:
+    """Load a rate table: a save_index directory, a .parquet file or a CSV file"""
+    if os.path.isdir(path):
+        return load_index(path)
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet competitor rates need the pyarrow package") from e
+        table = pq.read_table(path).to_pydict()
+        return RateIndex.from_columns(**{column: table[column] for column in COLUMNS if column in table})
+    with open(path, newline="") as f:
+        return RateIndex.from_rows(csv.DictReader(f))
+
+def _modified(path: str) -> Optional[float]:
+    target = os.path.join(path, INDEX_META) if os.path.isdir(path) else path
+    try:
+        return os.stat(target).st_mtime
+    except OSError:
+        return None
+
+def format_competitor_research(leverage: Dict) -> str:
+    """Competitor research prompt section for the rates found by CompetitorRateStore.leverage"""
+    unit = leverage["unit"]
+    scope = f"{leverage['tier']} plans" if leverage["tier"] else "plans"
+    lines = [f"Competitor rates for {scope} in {leverage['region']} (lowest ${leverage['lowest_rate']:g}/{unit}, "
+             f"median ${leverage['median_rate']:g}/{unit}):"]
+    for offer in leverage["offers"]:
+        promo = f" (promo ${offer['promo_price']:g})" if offer["promo_price"] is not None else ""
+        lines.append(f"- {offer['provider']} {offer['plan']}: ${offer['price']:g}/{offer['unit']}{promo}")
+    if leverage["cheaper_offers"]:
+        lines.append(f"{leverage['cheaper_offers']} competitor plans cost less than the current bill; "
+                     f"the cheapest would save ${leverage['max_savings']:g}/{unit}.")
+    return "\n".join(lines)
+
+class CompetitorRateStore:
+    """Competitor rates loaded from path and hot-reloaded when the file changes
+
+    The index is loaded by load() (the API calls it at startup) or else on
+    first use. After that a background thread compares the file's
+    modification time with the loaded one every check_seconds and rebuilds
+    the index when it changed, so lookups never stat or parse the file; the
+    new index is swapped in whole, so lookups never see a partial table. A
+    failed reload keeps the previous index and is reported under last_error.
+    Bills are looked up in their region, falling back to the national rates
+    when the region has none.
+    """
+
+    def __init__(self, path: str = None, check_seconds: float = None, region: str = None):
+        self.path = path or os.getenv("COMPETITOR_RATES_PATH") or DEFAULT_RATES_PATH
+        self.check_seconds = (
+            check_seconds if check_seconds is not None else float(os.getenv("COMPETITOR_RATES_CHECK_SECONDS", 30))
+        )
+        self.region = (region or os.getenv("COMPETITOR_RATES_REGION") or NATIONAL_REGION).upper()
+        self._lock = threading.Lock()
+        # Held while a table is parsed, so concurrent reloads do not duplicate the work
+        self._load_lock = threading.Lock()
+        self._index: Optional[RateIndex] = None
+        self._modified = None
+        self._checker = None
+        self._closed = threading.Event()
+        self._counters = {"lookups": 0, "hits": 0, "reloads": 0}
+        self.loaded_at = None
+        self.load_seconds = 0.0
+        self.last_error = None
+
+    def _load(self):
+        """Parse the rate table and swap it in; caller must hold the load lock"""
+        started = time.perf_counter()
+        modified = _modified(self.path)
+        index = load_rates(self.path)
+        with self._lock:
+            self._index, self._modified = index, modified
+            self._counters["reloads"] += 1
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - started
+            self.last_error = None
+
+    def reload(self) -> Dict:
+        """Load the rate table now and swap it in"""
+        with self._load_lock:
+            self._load()
+        return self.stats()
+
+    def load(self) -> Dict:
+        """Load the rate table unless it is loaded and start watching it for changes"""
+        with self._load_lock:
+            if self._index is None:
+                self._load()
+        with self._lock:
+            if self.check_seconds and self._checker is None and not self._closed.is_set():
+                self._checker = threading.Thread(target=self._check_loop, name="competitor-rates", daemon=True)
+                self._checker.start()
+        return self.stats()
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def refresh(self) -> bool:
+        """Reload the table if its file changed since it was loaded; True when it was reloaded
+
+        A refresh while another load is running does nothing.
+        """
+        if not self._load_lock.acquire(blocking=False):
+            return False
+        try:
+            if _modified(self.path) == self._modified:
+                return False
+            self._load()
+            return True
+        except Exception as e:
+            with self._lock:
+                self.last_error = f"{type(e).__name__}: {e}"
+            return False
+        finally:
+            self._load_lock.release()
+
+    def _check_loop(self):
+        while not self._closed.wait(self.check_seconds):
+            self.refresh()
+
+    def close(self):
+        """Stop watching the rate table"""
+        self._closed.set()
+        if self._checker is not None:
+            self._checker.join()
+
+    @property
+    def index(self) -> RateIndex:
+        """The current index, loaded on first use"""
+        index = self._index
+        if index is None:
+            self.load()
+            index = self._index
+        return index
+
+    def region_for(self, service_type: str, region: str = None) -> str:
+        """The bill's region when it has rates for the service, otherwise the national region"""
+        region = (region or self.region).upper()
+        return region if self.index.tiers(service_type, region) else NATIONAL_REGION
+
+    def match_tier(self, service_type: str, region: str, amount: float = None, text: str = None,
+                   company: str = None) -> Optional[str]:
+        """The bill's tier: among the company's own tiers (all tiers if it has none), the
+        one the bill text hints at, else the monthly tier priced closest to the amount"""
+        index = self.index
+        tiers = index.tiers(service_type, region)
+        scope = rate_key(service_type, region, "")[:2]
+        own = {key[2] for key in index.provider_keys(company) if key[:2] == scope}
+        candidates = [tier for tier in tiers if tier in own] or tiers
+        if len(candidates) == 1:
+            return candidates[0]
+        if text:
+            lowered = text.lower()
+            for tier, hints in TIER_HINTS.items():
+                if tier in candidates and any(hint in lowered for hint in hints):
+                    return tier
+        monthly = [tier for tier in candidates if index.unit_of(rate_key(service_type, region, tier)) == "month"]
+        if amount and monthly:
+            return min(monthly, key=lambda tier: abs(index.median(rate_key(service_type, region, tier)) - amount))
+        return None
+
+    def query(self, service_type: str, region: str = None, tier: str = None, min_price: float = None,
+              max_price: float = None, limit: int = None, exclude_provider: str = None) -> List[Dict]:
+        """Rates for a service, cheapest first; every tier of the region without a tier"""
+        index = self.index
+        region = self.region_for(service_type, region)
+        tiers = [tier] if tier else index.tiers(service_type, region)
+        rates = []
+        for name in tiers:
+            rates.extend(
+                dict(rate, tier=name)
+                for rate in index.query(service_type, region, name, min_price, max_price, limit, exclude_provider)
+            )
+        rates.sort(key=lambda rate: rate["price"])
+        with self._lock:
+            self._counters["lookups"] += 1
+            self._counters["hits"] += bool(rates)
+        return rates[:limit] if limit is not None else rates
+
+    def leverage(self, service_type: str, amount: float = None, region: str = None, tier: str = None,
+                 text: str = None, company: str = None, limit: int = 5) -> Optional[Dict]:
+        """The cheapest competitor offers for a bill and how many undercut it, None without rates
+
+        The company's own plans are left out of the offers.
+        """
+        index = self.index
+        region = self.region_for(service_type, region)
+        tier = tier or self.match_tier(service_type, region, amount, text, company)
+        offers = self.query(service_type, region, tier, limit=limit, exclude_provider=company)
+        if not offers:
+            return None
+        unit = offers[0]["unit"]
+        if tier:
+            median = index.median(rate_key(service_type, region, tier))
+        else:
+            prices = [offer["price"] for offer in offers]
+            median = (prices[(len(prices) - 1) // 2] + prices[len(prices) // 2]) / 2
+        result = {
+            "service_type": service_type.upper(),
+            "region": region,
+            "tier": tier,
+            "unit": unit,
+            "offers": offers,
+            "competitors": list(dict.fromkeys(offer["provider"] for offer in offers)),
+            "lowest_rate": offers[0]["price"],
+            "median_rate": round(median, 4),
+            "cheaper_offers": 0,
+            "max_savings": 0.0
+        }
+        if tier and amount and unit == "month":
+            result["cheaper_offers"] = index.count(service_type, region, tier, max_price=amount - 0.01,
+                                                   exclude_provider=company)
+            result["max_savings"] = round(max(amount - offers[0]["price"], 0.0), 2)
+        return result
+
+    def stats(self) -> Dict:
+        index = self._index
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            **counters,
+            "path": self.path,
+            "rates": len(index) if index is not None else 0,
+            "keys": len(index.keys) if index is not None else 0,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4),
+            "hit_ratio": round(counters["hits"] / counters["lookups"], 4) if counters["lookups"] else 0.0,
+            "last_error": self.last_error
+        }
+
+_store: Optional[CompetitorRateStore] = None
+_store_lock = threading.Lock()
+
+def get_competitor_rate_store() -> CompetitorRateStore:
+    """Process-wide competitor rate store (COMPETITOR_RATES_PATH, loaded at API startup or first lookup)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CompetitorRateStore()
+        return _store
+
+def set_competitor_rate_store(store: CompetitorRateStore):
+    """Replace the process-wide competitor rate store (affects graphs built afterwards)"""
+    global _store
+    with _store_lock:
+        _store = store
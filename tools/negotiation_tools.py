@@ -1,19 +1,41 @@
 from langchain.tools import Tool
-from langchain_openai import ChatOpenAI
+from llm.clients import get_chat_model
+from llm.cache import describe_llm
 import requests
+import time
 from typing import Dict, List
 import json
 
+from tools.bill_analytics import analyze_bill_patterns
+from tools.competitor_rates import get_competitor_rate_store
+from agents.scripts import get_script_template, parse_personalization, script_fields, script_max_tokens
+from tracing import get_tracer, usage_tokens
+
+# Medical bills are negotiated against assistance programs, not competitor rates
+MEDICAL_LEVERAGE = {
+    "average_discount": "30-60%",
+    "payment_plans": "Available",
+    "charity_programs": "Income-based assistance"
+}
+
 def create_negotiation_tools():
     """Create a suite of negotiation tools for the agents"""
     tools = []
+    tracer = get_tracer()
     
     def research_company(company_name: str) -> str:
         """Research company policies and competitor rates"""
-        # In production, this would integrate with real data sources
+        rates = get_competitor_rate_store()
+        keys = rates.index.provider_keys(company_name)
+        competitors = []
+        for service_type, region, tier in keys:
+            competitors.extend(rate["provider"] for rate in rates.query(
+                service_type, region, tier, limit=3, exclude_provider=company_name
+            ))
         company_data = {
             "policies": f"Researched negotiation policies for {company_name}",
-            "competitors": ["Competitor A", "Competitor B", "Competitor C"],
+            "services": sorted({f"{service_type} {tier} ({region})" for service_type, region, tier in keys}),
+            "competitors": list(dict.fromkeys(competitors))[:5],
             "average_discount": "15-25%",
             "best_contact_method": "Retention department",
             "peak_negotiation_times": "End of quarter, end of year"
@@ -38,80 +60,42 @@ def create_negotiation_tools():
         }
     
     def generate_script(context: Dict) -> str:
-        """Generate negotiation script based on context"""
-        llm = ChatOpenAI(model="gpt-4", temperature=0.3)
-        
-        prompt = f"""
-        Generate a professional negotiation script for:
-        Company: {context.get('company', 'Unknown')}
-        Bill Type: {context.get('bill_type', 'Unknown')}
-        Amount: ${context.get('amount', 0)}
-        Customer History: {context.get('history', 'Long-term customer')}
+        """Generate negotiation script based on context
         
-        Create a conversational script that includes:
-        1. Professional opening
-        2. Loyalty emphasis
-        3. Specific negotiation points
-        4. Competitor comparisons
-        5. Fallback positions
-        6. Professional closing
-        
-        Make it natural and persuasive.
+        The script is rendered from the bill type's template; the LLM only
+        writes the opening and fallback lines, capped at script_max_tokens.
         """
+        bill_type = str(context.get('bill_type') or "GENERAL").upper()
+        template = get_script_template(bill_type)
+        leverage = None
+        if bill_type in ("UTILITY", "TELECOM", "SUBSCRIPTION"):
+            leverage = get_competitor_rate_store().leverage(bill_type, context.get('amount'),
+                                                            context.get('region'), company=context.get('company'))
+        fields = script_fields(bill_type, context.get('company', 'Unknown'), context.get('amount', 0),
+                               leverage=leverage, analysis=context.get('history', ''))
         
-        response = llm.invoke(prompt)
-        return response.content
+        max_tokens = script_max_tokens(bill_type)
+        if not max_tokens:
+            return template.render(fields)
+        llm = get_chat_model("openai", "gpt-4", 0.3)
+        prompt = template.personalization_prompt(fields)
+        started = time.perf_counter()
+        with tracer.measure_queue() as queued:
+            response = llm.invoke(prompt, max_tokens=max_tokens)
+        tracer.llm_call(describe_llm(llm)[0], "generate_script", time.perf_counter() - started,
+                        *usage_tokens(prompt, response), cache="off", queue_seconds=queued[0])
+        return template.render(fields, *parse_personalization(response.content))
     
-    def analyze_bill_patterns(bill_history: List[Dict]) -> Dict:
-        """Analyze historical bill patterns for negotiation insights"""
-        if not bill_history:
-            return {"error": "No bill history provided"}
-        
-        # Calculate trends and patterns
-        amounts = [bill.get('amount', 0) for bill in bill_history]
-        avg_amount = sum(amounts) / len(amounts) if amounts else 0
-        
-        analysis = {
-            "average_monthly": round(avg_amount, 2),
-            "trend": "increasing" if amounts[-1] > amounts[0] else "stable",
-            "seasonal_patterns": "Higher usage in summer/winter months",
-            "negotiation_timing": "Best to negotiate after 12+ months of service",
-            "leverage_points": [
-                "Consistent payment history",
-                "Long-term customer loyalty",
-                "Usage pattern stability"
-            ]
-        }
-        
-        return analysis
-    
-    def get_competitor_rates(service_type: str, location: str = "US") -> Dict:
-        """Get competitor rates for comparison"""
-        # Mock competitor data - in production, integrate with real APIs
-        competitor_data = {
-            "UTILITY": {
-                "average_rate": "$0.12/kWh",
-                "competitors": ["Green Energy Co", "Power Plus", "City Electric"],
-                "typical_savings": "10-20%"
-            },
-            "TELECOM": {
-                "average_rate": "$65/month",
-                "competitors": ["Verizon", "AT&T", "T-Mobile"],
-                "typical_savings": "15-30%"
-            },
-            "SUBSCRIPTION": {
-                "average_rate": "$12/month",
-                "competitors": ["Netflix", "Hulu", "Disney+"],
-                "typical_savings": "20-40%"
-            },
-            "MEDICAL": {
-                "average_discount": "30-60%",
-                "payment_plans": "Available",
-                "charity_programs": "Income-based assistance"
-            }
-        }
-        
-        return competitor_data.get(service_type, {"error": "Service type not found"})
+    def get_competitor_rates(service_type: str, location: str = "US", amount: float = None,
+                             tier: str = None) -> Dict:
+        """Get competitor rates for comparison from the local rate store"""
+        if service_type.upper() == "MEDICAL":
+            return dict(MEDICAL_LEVERAGE)
+        leverage = get_competitor_rate_store().leverage(service_type, amount, location, tier)
+        if leverage is None:
+            return {"error": "Service type not found"}
+        leverage["average_rate"] = f"${leverage['median_rate']:g}/{leverage['unit']}"
+        return leverage
     
     def validate_negotiation_outcome(original_amount: float, final_amount: float, strategy_used: str) -> Dict:
         """Validate and score negotiation outcomes"""
@@ -0,0 +1,352 @@
+"""
+Per-node and per-LLM-call latency, token and cost metrics for every graph
+
+compile_graph wraps each node of a named graph in a TracedNode, which times
+the node without adding a callback run of its own. llm_node reports each LLM
+call: wall time, time spent queued for a provider concurrency slot, prompt
+and completion tokens, cache status and estimated cost. The counters and
+histograms are exported in the Prometheus text format on /metrics and, with
+TRACING_EXPORTER set, as OpenTelemetry spans to an OTLP collector or a file.
+"""
+
+import dataclasses
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+
+from llm.prompts import count_tokens
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per million (prompt, completion) tokens; LLM_PRICES (JSON) adds or overrides models
+MODEL_PRICES = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo-preview": (10.0, 30.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "claude-3-opus-20240229": (15.0, 75.0)
+}
+
+# (graph, node) of the traced node running in this context, and the queue
+# wait of the LLM call in progress
+_current_node: ContextVar[Optional[Tuple[str, str]]] = ContextVar("traced_node", default=None)
+_queue_wait: ContextVar[Optional[list]] = ContextVar("llm_queue_wait", default=None)
+
+def note_queue_wait(seconds: float):
+    """Add time spent waiting for a concurrency slot to the LLM call in progress"""
+    wait = _queue_wait.get()
+    if wait is not None:
+        wait[0] += seconds
+
+def usage_tokens(prompt: str, response) -> Tuple[int, int]:
+    """(prompt, completion) tokens from the response usage, counted locally without one"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("input_tokens") is not None:
+        return usage["input_tokens"], usage.get("output_tokens") or 0
+    content = getattr(response, "content", response)
+    return count_tokens(prompt), count_tokens(content if isinstance(content, str) else str(content))
+
+class Histogram:
+    """Latency histogram with Prometheus-style cumulative buckets"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the largest bound past the last bucket)"""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def cumulative(self):
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), seen
+
+class TracedNode(Runnable):
+    """A graph node's runnable, timed by the tracer
+
+    invoke/ainvoke call the wrapped runnable directly instead of going
+    through a callback run, so node events and streaming are unchanged.
+    """
+
+    def __init__(self, tracer: "Tracer", graph: str, node: str, bound: Runnable):
+        self.tracer = tracer
+        self.graph = graph
+        self.node = node
+        self.bound = bound
+        self.name = node
+
+    def invoke(self, input, config=None, **kwargs):
+        token = _current_node.set((self.graph, self.node))
+        started = time.perf_counter()
+        error = False
+        try:
+            with self.tracer.span(f"{self.graph}.{self.node}", graph=self.graph, node=self.node):
+                return self.bound.invoke(input, config, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.tracer.node_finished(self.graph, self.node, time.perf_counter() - started, error)
+            _current_node.reset(token)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        token = _current_node.set((self.graph, self.node))
+        started = time.perf_counter()
+        error = False
+        try:
+            with self.tracer.span(f"{self.graph}.{self.node}", graph=self.graph, node=self.node):
+                return await self.bound.ainvoke(input, config, **kwargs)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.tracer.node_finished(self.graph, self.node, time.perf_counter() - started, error)
+            _current_node.reset(token)
+
+def _span_tracer(exporter: str, endpoint: str, path: str):
+    """An OpenTelemetry tracer and its provider exporting spans in batches"""
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    except ImportError as e:
+        raise ImportError("TRACING_EXPORTER needs the opentelemetry-sdk package") from e
+
+    if exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError as e:
+            raise ImportError("TRACING_EXPORTER=otlp needs the opentelemetry-exporter-otlp package") from e
+        span_exporter = OTLPSpanExporter(endpoint=endpoint, insecure=True)
+    elif exporter == "file":
+        span_exporter = ConsoleSpanExporter(out=open(path, "a"),
+                                            formatter=lambda span: span.to_json(indent=None) + "\n")
+    else:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {exporter}")
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "hagglz-agent"}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    return provider.get_tracer("hagglz"), provider
+
+class Tracer:
+    """Node and LLM call metrics, plus optional OpenTelemetry spans
+
+    Metrics are kept per (graph, node) and per (graph, node, model); the
+    node of an LLM call is the traced node it runs in. Recording is a dict
+    lookup and a bisect under a lock, so tracing stays on in production.
+    """
+
+    def __init__(self, enabled: bool = None, exporter: str = None, otlp_endpoint: str = None,
+                 span_file: str = None, prices: Dict[str, Tuple[float, float]] = None):
+        self.enabled = (enabled if enabled is not None
+                        else os.getenv("TRACING_ENABLED", "true").lower() == "true")
+        self.exporter = exporter if exporter is not None else os.getenv("TRACING_EXPORTER", "")
+        self.prices = dict(MODEL_PRICES)
+        self.prices.update(prices if prices is not None else json.loads(os.getenv("LLM_PRICES") or "{}"))
+
+        self._lock = threading.Lock()
+        self._nodes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._llm: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._spans = self._provider = None
+        if self.enabled and self.exporter:
+            self._spans, self._provider = _span_tracer(
+                self.exporter,
+                otlp_endpoint or os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4317"),
+                span_file or os.getenv("TRACING_FILE", "traces.jsonl")
+            )
+
+    def trace_nodes(self, workflow, graph: str):
+        """Wrap every node of an uncompiled StateGraph in a TracedNode"""
+        if not self.enabled:
+            return
+        for node, spec in list(workflow.nodes.items()):
+            workflow.nodes[node] = dataclasses.replace(spec, runnable=TracedNode(self, graph, node, spec.runnable))
+
+    def span(self, name: str, **attributes):
+        """Context manager for an OpenTelemetry span (a no-op without an exporter)"""
+        if self._spans is None:
+            return nullcontext()
+        return self._spans.start_as_current_span(name, attributes=attributes)
+
+    @contextmanager
+    def measure_queue(self):
+        """Collect the concurrency slot wait of the LLM call made inside the block"""
+        wait = [0.0]
+        token = _queue_wait.set(wait)
+        try:
+            yield wait
+        finally:
+            _queue_wait.reset(token)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimated USD cost of a call (0 for models without a price)"""
+        prompt_price, completion_price = self.prices.get(model.split(":", 1)[-1], (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+    def node_finished(self, graph: str, node: str, seconds: float, error: bool = False):
+        with self._lock:
+            stats = self._nodes.get((graph, node))
+            if stats is None:
+                stats = self._nodes[(graph, node)] = {"latency": Histogram(), "errors": 0}
+            stats["latency"].observe(seconds)
+            stats["errors"] += error
+
+    def llm_call(self, model: str, name: str, seconds: float = 0.0, prompt_tokens: int = 0,
+                 completion_tokens: int = 0, cache: str = "miss", queue_seconds: float = 0.0):
+        """Record one LLM call made (or answered from the cache) by the node running in this context
+
+        name is the caller's own name, used as the node outside traced graphs.
+        cache is "hit", "miss" or "off" (calls that are never cached).
+        """
+        if not self.enabled:
+            return
+        graph, node = _current_node.get() or ("", name)
+        cost = 0.0 if cache == "hit" else self.cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            stats = self._llm.get((graph, node, model))
+            if stats is None:
+                stats = self._llm[(graph, node, model)] = {
+                    "latency": Histogram(), "queue": Histogram(), "hit": 0, "miss": 0, "off": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0
+                }
+            stats[cache] += 1
+            if cache != "hit":
+                stats["latency"].observe(seconds)
+                stats["queue"].observe(queue_seconds)
+                stats["prompt_tokens"] += prompt_tokens
+                stats["completion_tokens"] += completion_tokens
+                stats["cost"] += cost
+        if self._spans is not None:
+            end = time.time_ns()
+            span = self._spans.start_span(f"llm {model}", start_time=end - int(seconds * 1e9), attributes={
+                "graph": graph, "node": node, "llm.model": model, "llm.cache": cache,
+                "llm.prompt_tokens": prompt_tokens, "llm.completion_tokens": completion_tokens,
+                "llm.queue_seconds": queue_seconds, "llm.cost_usd": cost
+            })
+            span.end(end_time=end)
+
+    def prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            nodes = {key: (stats["latency"], stats["errors"]) for key, stats in self._nodes.items()}
+            llm = {key: dict(stats) for key, stats in self._llm.items()}
+
+        lines = []
+
+        def sample(name, labels, value):
+            text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{name}{{{text}}} {value}")
+
+        def metric(name, kind, help_text, samples):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+            for labels, value in samples:
+                sample(name, labels, value)
+
+        def histogram(name, help_text, series):
+            metric(name, "histogram", help_text, [])
+            for labels, hist in series:
+                for bound, count in hist.cumulative():
+                    sample(f"{name}_bucket", {**labels, "le": bound}, count)
+                sample(f"{name}_sum", labels, round(hist.sum, 6))
+                sample(f"{name}_count", labels, hist.count)
+
+        node_labels = {key: {"graph": key[0], "node": key[1]} for key in nodes}
+        llm_labels = {key: {"graph": key[0], "node": key[1], "model": key[2]} for key in llm}
+        histogram("hagglz_node_duration_seconds", "Wall time of graph node runs",
+                  [(node_labels[key], hist) for key, (hist, _) in nodes.items()])
+        metric("hagglz_node_errors_total", "counter", "Graph node runs that raised",
+               [(node_labels[key], errors) for key, (_, errors) in nodes.items()])
+        histogram("hagglz_llm_duration_seconds", "Wall time of LLM calls, including queue time",
+                  [(llm_labels[key], stats["latency"]) for key, stats in llm.items()])
+        histogram("hagglz_llm_queue_seconds", "Time LLM calls waited for a provider concurrency slot",
+                  [(llm_labels[key], stats["queue"]) for key, stats in llm.items()])
+        metric("hagglz_llm_calls_total", "counter", "LLM calls by response cache status",
+               [({**llm_labels[key], "cache": cache}, stats[cache])
+                for key, stats in llm.items() for cache in ("hit", "miss", "off")])
+        metric("hagglz_llm_tokens_total", "counter", "Tokens sent and received by LLM calls",
+               [({**llm_labels[key], "kind": kind}, stats[f"{kind}_tokens"])
+                for key, stats in llm.items() for kind in ("prompt", "completion")])
+        metric("hagglz_llm_cost_usd_total", "counter", "Estimated LLM cost in USD",
+               [(llm_labels[key], round(stats["cost"], 6)) for key, stats in llm.items()])
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict:
+        """Per-node and per-model summaries for /api/v1/stats"""
+        with self._lock:
+            nodes = {
+                f"{graph}/{node}": {
+                    "runs": stats["latency"].count,
+                    "errors": stats["errors"],
+                    "avg_seconds": round(stats["latency"].sum / stats["latency"].count, 4),
+                    "p95_seconds": stats["latency"].quantile(0.95)
+                }
+                for (graph, node), stats in self._nodes.items()
+            }
+            llm = {}
+            for (graph, node, model), stats in self._llm.items():
+                calls = stats["latency"].count
+                llm["/".join(filter(None, (graph, node, model)))] = {
+                    "calls": calls,
+                    "cache_hits": stats["hit"],
+                    "avg_seconds": round(stats["latency"].sum / calls, 4) if calls else 0.0,
+                    "avg_queue_seconds": round(stats["queue"].sum / calls, 4) if calls else 0.0,
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "cost_usd": round(stats["cost"], 4)
+                }
+        return {
+            "enabled": self.enabled,
+            "exporter": self.exporter or None,
+            "cost_usd": round(sum(stats["cost_usd"] for stats in llm.values()), 4),
+            "nodes": nodes,
+            "llm": llm
+        }
+
+    def clear(self):
+        with self._lock:
+            self._nodes.clear()
+            self._llm.clear()
+
+    def close(self):
+        """Flush and stop the span exporter"""
+        if self._provider is not None:
+            self._provider.shutdown()
+            self._provider = self._spans = None
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer configured from the environment"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+def set_tracer(tracer: Tracer):
+    """Replace the process-wide tracer (affects graphs built afterwards)"""
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer